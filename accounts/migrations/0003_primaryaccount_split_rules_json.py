@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_alter_member_primary_account_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='primaryaccount',
+            name='split_rules_json',
+            field=models.JSONField(blank=True, default=dict, help_text='How bills are split, e.g. {"method": "PERCENTAGE", "percentages": {"1": 60, "2": 40}}'),
+        ),
+    ]
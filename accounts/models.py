@@ -21,6 +21,11 @@ class PrimaryAccount(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
+    split_rules_json = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text='How bills are split, e.g. {"method": "PERCENTAGE", "percentages": {"1": 60, "2": 40}}'
+    )
 
     class Meta:
         verbose_name = "Family Account"
@@ -0,0 +1,127 @@
+# billing/allocation.py
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal('0.01')
+
+# Relationships that carry the bill under the DEFAULT split rule: the adult
+# Member.RELATIONSHIP_CHOICES, plus 'PRIMARY', which registration stores for
+# the account holder's own member
+ADULT_RELATIONSHIPS = ('PRIMARY', 'WIFE', 'PARENT')
+
+
+def to_cents(amount):
+    """Convert a money amount to integer cents, rounding half up"""
+    return int(Decimal(str(amount)).quantize(CENT, ROUND_HALF_UP) * 100)
+
+
+def from_cents(cents):
+    """Convert integer cents back to a 2-place Decimal"""
+    return Decimal(cents).scaleb(-2)
+
+
+def allocate(total, weights, weight_sum=None):
+    """
+    Split integer cents proportionally to integer weights
+
+    Every part gets the floor of its exact share; the cents left over go
+    one each to the parts with the largest remainders (earlier parts win
+    ties), so the parts always sum exactly to the total.
+
+    Usage Example:
+    --------------
+    allocate(10000, [1, 1, 1])   # [3334, 3333, 3333]
+    allocate(999, [6000, 4000])  # [599, 400]
+
+    :param total: Amount to split in cents (may be negative)
+    :param weights: Non-negative integer weights, at least one positive
+    :param weight_sum: sum(weights), when the caller already knows it
+    :return: List of cents, one per weight
+    """
+    if weight_sum is None:
+        weight_sum = sum(weights)
+    if weight_sum <= 0:
+        raise ValueError("Allocation weights must not all be zero")
+    if total < 0:
+        return [-part for part in allocate(-total, weights, weight_sum)]
+
+    parts = []
+    remainders = []
+    for weight in weights:
+        part, remainder = divmod(total * weight, weight_sum)
+        parts.append(part)
+        remainders.append(remainder)
+
+    leftover = total - sum(parts)
+    if leftover:
+        # Stable sort: equal remainders keep their input order
+        ranked = sorted(range(len(parts)), key=remainders.__getitem__, reverse=True)
+        for index in ranked[:leftover]:
+            parts[index] += 1
+    return parts
+
+
+def allocate_many(totals, weights):
+    """
+    Split many totals with the same weights (batch runs)
+
+    :param totals: Iterable of amounts in cents
+    :param weights: Integer weights shared by every total
+    :return: List of allocate() results, one per total
+    """
+    weights = list(weights)
+    weight_sum = sum(weights)
+    return [allocate(total, weights, weight_sum) for total in totals]
+
+
+def rule_weights(split_rules, members):
+    """
+    Integer weights of an account's split rules for its members
+
+    Rules:
+    - EQUAL: every member weighs 1
+    - PERCENTAGE: percentages in hundredths of a percent, e.g. 33.5 → 3350;
+      members without a percentage weigh 0, percentages of anyone else
+      are rejected
+    - DEFAULT: adults weigh 1, everyone else 0
+
+    :param split_rules: PrimaryAccount.split_rules_json
+    :param members: Members of the account, in share order
+    :return: List of weights, one per member
+    :raises ValueError: If the rules cannot split the bill
+    """
+    method = (split_rules or {}).get('method')
+
+    if method == 'EQUAL':
+        if not members:
+            raise ValueError("No members found for equal split")
+        return [1] * len(members)
+
+    if method == 'PERCENTAGE':
+        percentages = split_rules.get('percentages')
+        if not percentages:
+            raise ValueError("No percentages provided for split")
+        if not isinstance(percentages, dict):
+            raise ValueError("Percentages must map member ids to percentages")
+        hundredths = {str(key): _hundredths(value) for key, value in percentages.items()}
+        unknown = hundredths.keys() - {str(member.id) for member in members}
+        if unknown:
+            raise ValueError(f"Percentages given for unknown members: {', '.join(sorted(unknown))}")
+        weights = [hundredths.get(str(member.id), 0) for member in members]
+        if sum(weights) != 10000:
+            raise ValueError("Percentages must sum to 100")
+        return weights
+
+    weights = [1 if member.relationship in ADULT_RELATIONSHIPS else 0 for member in members]
+    if not any(weights):
+        raise ValueError("No adults found for default split")
+    return weights
+
+
+def _hundredths(percentage):
+    try:
+        value = Decimal(str(percentage)) * 100
+    except ArithmeticError:
+        raise ValueError(f"Invalid split percentage: {percentage}")
+    if not value.is_finite() or value != value.to_integral_value() or value < 0:
+        raise ValueError(f"Invalid split percentage: {percentage}")
+    return int(value)
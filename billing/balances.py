@@ -0,0 +1,295 @@
+# billing/balances.py
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Q, F, Min, Sum, Case, When, Value, OuterRef, Subquery, DecimalField, DateField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from accounts.models import Member
+from .models import BillShare, MemberBalance, PaymentHistory
+
+BALANCE_FIELDS = ['primary_account', 'billed', 'paid', 'outstanding', 'disputed', 'overdue', 'next_due_date']
+AMOUNT_FIELDS = ['billed', 'paid', 'outstanding', 'disputed', 'overdue']
+
+_batch = threading.local()
+
+
+def compute_balances(member_ids, today=None):
+    """
+    Aggregate the shares and completed payments of some members
+
+    One query over the members' shares, each annotated with what was
+    paid on it. A share's remaining amount (never below zero, zero once
+    PAID) counts as disputed for DISPUTED shares, as outstanding
+    otherwise, and as overdue once its bill is past due.
+
+    :param member_ids: Members to aggregate
+    :param today: Date overdue amounts are computed for (default today)
+    :return: Dict of member_id → unsaved MemberBalance
+    """
+    today = today or timezone.localdate()
+    balances = {
+        member_id: MemberBalance(member_id=member_id, primary_account_id=account_id)
+        for member_id, account_id in Member.objects.filter(
+            id__in=member_ids
+        ).values_list('id', 'primary_account_id')
+    }
+    for share in share_rows(BillShare.objects.filter(member_id__in=balances)).values():
+        add_share(balances[share['member_id']], share, today)
+    return balances
+
+
+def share_rows(shares):
+    """
+    Rows of a BillShare queryset as add_share() takes them, each with what
+    was paid on it
+
+    :return: Dict of share_id → row
+    """
+    rows = shares.values(
+        'id', 'member_id', 'personal_responsibility', 'status', 'bill__due_date'
+    ).annotate(paid=Coalesce(
+        Sum('payments__amount', filter=Q(payments__status='COMPLETED')),
+        Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2)
+    ))
+    return {row['id']: row for row in rows}
+
+
+def add_share(balance, share, today):
+    """Add one share row (see compute_balances) to an unsaved balance"""
+    owed = share['personal_responsibility']
+    remaining = max(owed - share['paid'], Decimal('0')) if share['status'] != 'PAID' else Decimal('0')
+    balance.billed += owed
+    balance.paid += share['paid']
+    if share['status'] == 'DISPUTED':
+        balance.disputed += remaining
+        return
+    balance.outstanding += remaining
+    due = share['bill__due_date']
+    if remaining and due < today:
+        balance.overdue += remaining
+    elif remaining and (balance.next_due_date is None or due < balance.next_due_date):
+        balance.next_due_date = due
+
+
+def save_balances(balances):
+    """Upsert computed balances, one statement for all of them"""
+    MemberBalance.objects.bulk_create(
+        balances, update_conflicts=True, unique_fields=['member'],
+        update_fields=BALANCE_FIELDS + ['updated_at']
+    )
+
+
+def refresh_balances(member_ids, today=None):
+    """
+    Recompute and store the balances of some members from their full
+    share and payment history
+
+    Only for rebuilds and stale rows: writes go through record_change() /
+    balance_changes(), which apply deltas instead. Members that no longer
+    exist are skipped.
+    """
+    member_ids = set(member_ids)
+    if not member_ids:
+        return []
+    balances = list(compute_balances(member_ids, today).values())
+    save_balances(balances)
+    return balances
+
+
+def refresh_stale_balances(queryset, today=None):
+    """
+    Refresh the rows of a MemberBalance queryset whose overdue amount
+    went stale because a due date has passed since they were written
+
+    :return: True if any row was refreshed
+    """
+    today = today or timezone.localdate()
+    stale = list(queryset.filter(next_due_date__lt=today).values_list('member_id', flat=True))
+    if stale:
+        refresh_balances(stale, today)
+    return bool(stale)
+
+
+def next_due_dates(member_ids, today=None):
+    """
+    Earliest due date, per member, among shares with an amount still
+    outstanding and not yet overdue (members without one are omitted)
+    """
+    today = today or timezone.localdate()
+    paid = PaymentHistory.objects.filter(
+        bill_share=OuterRef('pk'), status='COMPLETED'
+    ).order_by().values('bill_share').annotate(total=Sum('amount')).values('total')
+    return dict(
+        BillShare.objects.filter(member_id__in=member_ids, bill__due_date__gte=today)
+        .exclude(status__in=['PAID', 'DISPUTED'])
+        .annotate(paid=Coalesce(
+            Subquery(paid), Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2)
+        ))
+        .filter(personal_responsibility__gt=F('paid'))
+        .order_by().values('member_id').annotate(due=Min('bill__due_date'))
+        .values_list('member_id', 'due')
+    )
+
+
+def create_balances(member_ids):
+    """Create zero balance rows for members that have none"""
+    MemberBalance.objects.bulk_create([
+        MemberBalance(member_id=member_id, primary_account_id=account_id)
+        for member_id, account_id in Member.objects.filter(
+            id__in=member_ids
+        ).values_list('id', 'primary_account_id')
+    ], ignore_conflicts=True)
+
+
+def record_change(member_ids, shares, before, create=True):
+    """
+    Apply one write's change to the balances of its shares' members
+
+    Called by the share / payment / bill signals after the write. The
+    members' balance rows are locked first, so writes for the same member
+    apply their deltas one after another instead of overwriting each
+    other. Does nothing inside balance_changes(), which accounts for
+    every write of its block.
+
+    :param member_ids: Members whose balances the write can change
+    :param shares: BillShare queryset of the shares the write changed
+    :param before: Function mapping the shares' current rows (see
+                   share_rows) to their rows before the write
+    :param create: Create missing balance rows (False for deletes, which
+                   may be part of deleting the member)
+    """
+    if batching():
+        return
+    with transaction.atomic():
+        locked = _lock(member_ids, create)
+        after = share_rows(shares)
+        _apply(locked, before(after), after)
+
+
+@contextmanager
+def balance_changes(shares, member_ids=()):
+    """
+    Apply what a block changes in some shares as one delta, at its end
+
+    For bulk writes (bulk_create, bulk_update, queryset deletes), which
+    send no signals, and to apply many writes at once. The block runs in
+    a transaction holding the members' balance rows locked; share and
+    payment signals inside it are ignored, so every share it writes must
+    be in shares.
+
+    Usage Example:
+    --------------
+    with balance_changes(bill.shares.all(), new_member_ids):
+        bill.shares.all().delete()
+        BillShare.objects.bulk_create(shares)
+
+    :param shares: BillShare queryset, evaluated before and after the block
+    :param member_ids: Members whose shares the block may create
+    """
+    if batching():
+        # Nested: the outermost block applies the change
+        yield
+        return
+    with transaction.atomic():
+        locked = _lock(set(member_ids) | set(shares.values_list('member_id', flat=True)))
+        before = share_rows(shares.all())
+        _batch.active = True
+        try:
+            yield
+        finally:
+            _batch.active = False
+        after = share_rows(shares.all())
+        locked.update(_lock({row['member_id'] for row in after.values()} - locked.keys()))
+        _apply(locked, before, after)
+
+
+def batching():
+    """True inside balance_changes(), where signals leave balances alone"""
+    return getattr(_batch, 'active', False)
+
+
+def _lock(member_ids, create=True):
+    """Lock the balance rows of some members (creating missing ones), in member order"""
+    member_ids = set(member_ids)
+    if not member_ids:
+        return {}
+    locked = {
+        balance.member_id: balance
+        for balance in MemberBalance.objects.select_for_update().filter(
+            member_id__in=member_ids
+        ).order_by('member_id')
+    }
+    missing = member_ids - locked.keys()
+    if missing and create:
+        create_balances(missing)
+        locked.update({
+            balance.member_id: balance
+            for balance in MemberBalance.objects.select_for_update().filter(
+                member_id__in=missing
+            ).order_by('member_id')
+        })
+    return locked
+
+
+def _apply(locked, before, after, today=None):
+    """
+    Add the difference between share rows to locked balance rows
+
+    One UPDATE for all members, amounts as F() increments. Rows whose
+    overdue amount went stale are recomputed in full instead; the next due
+    date is looked up again when a changed share may have set it.
+    """
+    today = today or timezone.localdate()
+    deltas = {member_id: MemberBalance(member_id=member_id) for member_id in locked}
+    old = {member_id: MemberBalance(member_id=member_id) for member_id in locked}
+    for row in after.values():
+        if row['member_id'] in deltas:
+            add_share(deltas[row['member_id']], row, today)
+    for row in before.values():
+        if row['member_id'] in old:
+            add_share(old[row['member_id']], row, today)
+
+    stale = {
+        member_id for member_id, balance in locked.items()
+        if balance.next_due_date is not None and balance.next_due_date < today
+    }
+    recheck = set()
+    next_due = {}
+    for member_id, balance in locked.items():
+        delta = deltas[member_id]
+        for field in AMOUNT_FIELDS:
+            setattr(delta, field, getattr(delta, field) - getattr(old[member_id], field))
+        old_due = old[member_id].next_due_date
+        if old_due is not None and (balance.next_due_date is None or old_due <= balance.next_due_date):
+            # A changed share may have set the stored next due date
+            recheck.add(member_id)
+        else:
+            candidates = [due for due in (balance.next_due_date, delta.next_due_date) if due is not None]
+            next_due[member_id] = min(candidates) if candidates else None
+    if stale:
+        refresh_balances(stale, today)
+    if recheck - stale:
+        dues = next_due_dates(recheck - stale, today)
+        next_due.update({member_id: dues.get(member_id) for member_id in recheck - stale})
+
+    changed = [
+        member_id for member_id in locked.keys() - stale
+        if any(getattr(deltas[member_id], field) for field in AMOUNT_FIELDS)
+        or next_due.get(member_id) != locked[member_id].next_due_date
+    ]
+    if not changed:
+        return
+    updates = {
+        field: F(field) + Case(
+            *[When(member_id=member_id, then=Value(getattr(deltas[member_id], field))) for member_id in changed],
+            default=Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+        for field in AMOUNT_FIELDS
+    }
+    updates['next_due_date'] = Case(
+        *[When(member_id=member_id, then=Value(next_due.get(member_id))) for member_id in changed],
+        output_field=DateField()
+    )
+    MemberBalance.objects.filter(member_id__in=changed).update(updated_at=timezone.now(), **updates)
@@ -1,7 +1,20 @@
 # billing/calculators.py
+import hashlib
 from decimal import Decimal
-from billing.models import BillShare
+from django.db import transaction
+from billing.models import BillShare, LineItem
+from insuranceprofile.accumulators import posted_amounts, set_postings
 from insuranceprofile.calculators import InsuranceCalculator
+from .allocation import CENT, from_cents, to_cents
+from .balances import balance_changes
+from .rules import CompiledSplitRule, split_rule_cache
+from .status import batched_status_update
+
+
+def accumulator_source(bill_id):
+    """AccumulatorEntry.source of what a bill's split posted"""
+    return f"bill:{bill_id}"
+
 
 class BillSplitter:
     """
@@ -13,12 +26,20 @@ class BillSplitter:
     - Supports multiple split methods (equal, percentage, default)
     - Integrates with InsuranceCalculator for coverage details
     - Tracks insurance-covered vs personal responsibility amounts
+    - Splits in a constant number of queries, whatever the family size
+    - Incremental mode re-adjudicates only added or changed line items
     
     Usage Example:
     --------------
     bill = Bill.objects.get(id=123)
     splitter = BillSplitter(bill)
     splitter.calculate_shares()
+    
+    # After adding / editing / removing line items
+    BillSplitter(bill).calculate_shares(incremental=True)
+    
+    # Proposed shares under other rules, nothing written
+    splitter.preview({"method": "EQUAL"})
     """
     
     def __init__(self, bill):
@@ -28,140 +49,232 @@ class BillSplitter:
         :param bill: Bill object to split
         """
         self.bill = bill
-        self.members = bill.primary_account.members.all()
+        self.members = list(bill.primary_account.members.all())
         self.total_insurance = Decimal('0.00')  # Total insurance coverage
         self.total_personal = Decimal('0.00')   # Total personal responsibility
+        self._adjudicated = None  # (line_items, changed) once adjudicated
 
-    def calculate_shares(self):
+    def calculate_shares(self, incremental=False):
         """
         Calculate and create bill shares for all members
         
         Steps:
-        1. Clear existing shares
-        2. Calculate insurance coverage per line item
-        3. Apply split rules to personal responsibility
-        4. Create BillShare records
+        1. Calculate insurance coverage for the line items in one batch
+           (only items added or changed since the last split if incremental)
+        2. Total the per-item results stored on every line item
+        3. Apply split rules to personal responsibility (in memory)
+        4. In one transaction: save line item coverage, post the applied
+           deductible and patient share to the policies' accumulators
+           (replacing what the last split posted), then update the existing
+           shares in place (or replace them if the members changed)
         
         Edge Cases Handled:
         - No members in account
         - Zero personal responsibility
         - Missing split rules
-        """
-        # Clear existing shares to avoid duplicates
-        self.bill.shares.all().delete()
         
-        # Calculate insurance coverage for each line item
-        for line_item in self.bill.line_items.all():
-            self._process_line_item(line_item)
+        :param incremental: Reuse the stored adjudication of unchanged line
+                            items. Policy or coverage changes made since then
+                            are only picked up by a full split.
+        :return: Saved BillShare instances
+        """
+        line_items, changed = self.adjudicate(incremental)
         
         # Apply split rules to personal responsibility
-        self._apply_split_rules()
-
-    def _process_line_item(self, line_item):
-        """
-        Calculate insurance coverage for a single line item
+        shares = self._apply_split_rules()
         
-        :param line_item: LineItem instance to process
+        # Share writes update the bill's status once, not per row
+        with transaction.atomic(), batched_status_update([self.bill.id]):
+            LineItem.objects.bulk_update(changed, [
+                'insurance_coverage', 'covered_service', 'covered_amount',
+                'patient_amount', 'adjudication_key', 'accumulations'
+            ])
+            set_postings(accumulator_source(self.bill.id), self._accumulations(line_items))
+            return self._save_shares(shares)
+
+    def preview(self, split_rules=None):
         """
-        calculator = InsuranceCalculator(
-            member_id=line_item.member.id,
-            service_type=line_item.procedure_code,
-            provider_npi=self.bill.provider_npi,
-            service_date=self.bill.service_date,
-            billed_amount=line_item.amount
-        )
-        result = calculator.calculate()
+        Compute the shares a split would create, without writing anything
         
-        # Update totals
-        self.total_insurance += result['total_covered']
-        self.total_personal += result['patient_responsibility']
+        Line items are adjudicated once per splitter, so previewing several
+        rule sets costs a single adjudication. It is always a full one:
+        stored results may predate policy or coverage changes, and the
+        preview must match what a full split would write.
         
-        # Update line item with coverage details
-        line_item.insurance_coverage = result['primary_policy']
-        line_item.covered_service = result['total_covered'] > 0
-        line_item.save()
+        :param split_rules: Rules shaped like PrimaryAccount.split_rules_json,
+                            defaults to the account's own rules
+        :return: Unsaved BillShare instances
+        """
+        self.adjudicate()
+        return self._apply_split_rules(split_rules)
 
-    def _apply_split_rules(self):
+    def adjudicate(self, incremental=False):
         """
-        Apply account split rules to personal responsibility
+        Calculate insurance coverage of the bill's line items (in memory)
         
-        Rules:
-        - EQUAL: Split equally among all members
-        - PERCENTAGE: Split based on predefined percentages
-        - DEFAULT: Split equally among adults only
+        Runs once per splitter; later calls return the first result.
+        
+        :param incremental: Only adjudicate items added or changed since
+                            the last split
+        :return: (all line items, line items that were adjudicated)
         """
-        split_rules = self.bill.primary_account.split_rules_json
+        if self._adjudicated is not None:
+            return self._adjudicated
         
-        if split_rules.get('method') == 'EQUAL':
-            self._split_equal(self.total_personal)
-        elif split_rules.get('method') == 'PERCENTAGE':
-            self._split_by_percentage(self.total_personal, split_rules['percentages'])
-        else:
-            self._split_default(self.total_personal)
+        line_items = list(self.bill.line_items.all())
+        changed = line_items
+        if incremental:
+            changed = [
+                item for item in line_items
+                if item.adjudication_key != self._adjudication_key(item)
+            ]
+        
+        # Calculate insurance coverage for the changed line items at once
+        self._process_line_items(changed)
+        
+        # Removed items simply no longer count towards the totals
+        for line_item in line_items:
+            self.total_insurance += line_item.covered_amount
+            self.total_personal += line_item.patient_amount
+        
+        self._adjudicated = (line_items, changed)
+        return self._adjudicated
 
-    def _split_default(self, total_personal):
+    def _process_line_items(self, line_items):
         """
-        Default split: Equal among adults only
+        Calculate insurance coverage for line items with a single batch
+        adjudication (see InsuranceCalculator.calculate_many)
+        
+        Line items without a patient member are not adjudicated and count
+        fully towards personal responsibility. Results are stored on each
+        item together with the adjudication key of its inputs. What the
+        bill itself posted to the accumulators is left out, so re-splitting
+        a bill never counts it against itself.
         
-        :param total_personal: Total personal responsibility amount
+        :param line_items: LineItem instances of the bill
         """
-        adults = self.members.filter(relationship__in=['PRIMARY', 'SPOUSE'])
-        if not adults.exists():
-            raise ValueError("No adults found for default split")
+        adjudicated = [item for item in line_items if item.member_id is not None]
+        offsets = posted_amounts(
+            accumulator_source(self.bill.id), counted_only=True
+        ) if adjudicated else {}
+        results = InsuranceCalculator.calculate_many([
+            {
+                'member_id': line_item.member_id,
+                'service_type': line_item.procedure_code,
+                'provider_npi': self.bill.provider_npi,
+                'service_date': self.bill.service_date,
+                'billed_amount': line_item.amount,
+                'accumulated_offsets': offsets,
+            }
+            for line_item in adjudicated
+        ])
+        results = dict(zip((item.pk for item in adjudicated), results))
+        
+        for line_item in line_items:
+            line_item.adjudication_key = self._adjudication_key(line_item)
+            result = results.get(line_item.pk)
+            if result is None:
+                line_item.covered_amount = Decimal('0.00')
+                line_item.patient_amount = line_item.amount
+                line_item.insurance_coverage = None
+                line_item.covered_service = False
+                line_item.accumulations = {}
+                continue
+            total_covered = result['total_billed'] - result['patient_responsibility']
+            
+            # Store the item's results, quantized like the database column
+            line_item.covered_amount = total_covered.quantize(CENT)
+            line_item.patient_amount = result['patient_responsibility'].quantize(CENT)
+            
+            # Update line item with coverage details (primary paying policy)
+            coverages = result['coverages']
+            line_item.insurance_coverage_id = coverages[0]['policy_id'] if coverages else None
+            line_item.covered_service = total_covered > 0
             
-        share = total_personal / adults.count()
-        
-        for member in adults:
-            BillShare.objects.create(
-                bill=self.bill,
-                member=member,
-                original_amount=share,
-                insurance_covered=self.total_insurance,
-                personal_responsibility=share
-            )
+            # What counts towards each paying policy's deductible / OOP max
+            line_item.accumulations = {}
+            for coverage in coverages:
+                applied = coverage['deductible_applied'] + coverage['patient_responsibility']
+                if applied:
+                    line_item.accumulations[str(coverage['policy_id'])] = str(applied.quantize(CENT))
 
-    def _split_equal(self, total_personal):
+    def _accumulations(self, line_items):
+        """Total stored accumulations of line items, per policy_id"""
+        totals = {}
+        for line_item in line_items:
+            for policy_id, amount in line_item.accumulations.items():
+                totals[int(policy_id)] = totals.get(int(policy_id), Decimal('0')) + Decimal(amount)
+        return totals
+
+    def _adjudication_key(self, line_item):
+        """Digest of everything a line item's adjudication depends on"""
+        inputs = '|'.join(str(value) for value in (
+            line_item.member_id,
+            line_item.procedure_code,
+            Decimal(line_item.amount).quantize(CENT),
+            self.bill.provider_npi,
+            self.bill.service_date,
+        ))
+        return hashlib.sha1(inputs.encode()).hexdigest()
+
+    def _save_shares(self, shares):
         """
-        Equal split: Divide equally among all members
+        Write computed shares, updating existing rows in place
         
-        :param total_personal: Total personal responsibility amount
+        Shares keep their ids, status and payments when the same members
+        split the bill again; otherwise they are replaced. Member balances
+        take the whole write as one delta.
         """
-        if not self.members.exists():
-            raise ValueError("No members found for equal split")
+        existing = {share.member_id: share for share in self.bill.shares.all()}
+        with balance_changes(self.bill.shares.all(), {s.member_id for s in shares}):
+            if len(existing) == len(shares) and existing.keys() == {s.member_id for s in shares}:
+                for share in shares:
+                    current = existing[share.member_id]
+                    current.original_amount = share.original_amount
+                    current.insurance_covered = share.insurance_covered
+                    current.personal_responsibility = share.personal_responsibility
+                updated = list(existing.values())
+                BillShare.objects.bulk_update(updated, [
+                    'original_amount', 'insurance_covered', 'personal_responsibility'
+                ])
+                return updated
             
-        share = total_personal / self.members.count()
-        
-        for member in self.members:
-            BillShare.objects.create(
-                bill=self.bill,
-                member=member,
-                original_amount=share,
-                insurance_covered=self.total_insurance,
-                personal_responsibility=share
-            )
+            # Clear existing shares to avoid duplicates
+            self.bill.shares.all().delete()
+            return BillShare.objects.bulk_create(shares)
 
-    def _split_by_percentage(self, total_personal, percentages):
+    def _apply_split_rules(self, split_rules=None):
         """
-        Percentage-based split: Divide based on predefined percentages
+        Apply split rules (the account's by default) to personal responsibility
+        
+        Rules:
+        - EQUAL: Split equally among all members
+        - PERCENTAGE: Split based on predefined percentages
+        - DEFAULT: Split equally among adults only
+        
+        Amounts are allocated in integer cents with largest-remainder
+        rounding (see billing.allocation), so shares always sum to the total.
+        The account's own rules come compiled from the split rule cache.
         
-        :param total_personal: Total personal responsibility amount
-        :param percentages: Dict of member_id → percentage (e.g., {"1": 60, "2": 40})
+        :return: Unsaved BillShare instances
         """
-        if not percentages:
-            raise ValueError("No percentages provided for split")
-            
-        total_percentage = sum(percentages.values())
-        if total_percentage != 100:
-            raise ValueError("Percentages must sum to 100")
-            
-        for member in self.members:
-            percentage = percentages.get(str(member.id), 0) / 100
-            share = total_personal * Decimal(percentage)
-            
-            BillShare.objects.create(
-                bill=self.bill,
-                member=member,
-                original_amount=share,
-                insurance_covered=self.total_insurance,
-                personal_responsibility=share
-            )
\ No newline at end of file
+        if split_rules is None:
+            rule = split_rule_cache.get(self.bill.primary_account, self.members)
+        else:
+            rule = CompiledSplitRule(split_rules, self.members)
+        
+        members = {member.id: member for member in self.members}
+        return [
+            self._share(members[member_id], from_cents(part))
+            for member_id, part in rule.allocate(to_cents(self.total_personal))
+        ]
+
+    def _share(self, member, amount):
+        """Build an unsaved BillShare of the bill for a member"""
+        return BillShare(
+            bill=self.bill,
+            member=member,
+            original_amount=amount,
+            insurance_covered=self.total_insurance,
+            personal_responsibility=amount
+        )
@@ -0,0 +1,109 @@
+# billing/exporters.py
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from .models import Bill, BillShare, PaymentHistory
+
+# Exportable tables: queryset and the columns written, in order
+EXPORTS = {
+    'bills': (
+        Bill.objects.all(),
+        ['id', 'primary_account_id', 'provider_name', 'provider_npi', 'total_amount',
+         'status', 'service_date', 'due_date', 'created_at', 'updated_at'],
+    ),
+    'shares': (
+        BillShare.objects.all(),
+        ['id', 'bill_id', 'member_id', 'original_amount', 'insurance_covered',
+         'personal_responsibility', 'status'],
+    ),
+    'payments': (
+        PaymentHistory.objects.all(),
+        ['id', 'bill_share_id', 'bill_share__bill_id', 'amount', 'payment_method',
+         'transaction_id', 'payment_date', 'status'],
+    ),
+}
+
+# Path from each exported table to its PrimaryAccount
+ACCOUNT_LOOKUPS = {
+    'bills': 'primary_account',
+    'shares': 'bill__primary_account',
+    'payments': 'bill_share__bill__primary_account',
+}
+
+OUTPUTS = ('ndjson', 'csv')
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_rows(kind, queryset=None, after=None, chunk_size=2000):
+    """
+    Stream the rows of an export as dicts, in id order
+
+    Rows are read with values() through QuerySet.iterator(), so only one
+    chunk is in memory at a time whatever the number of rows. Each row
+    carries its id: an interrupted export resumes with after=<last id>.
+
+    Usage Example:
+    --------------
+    queryset = Bill.objects.filter(primary_account=account)
+    for row in export_rows('bills', queryset, after=1200):
+        ...
+
+    :param kind: Key of EXPORTS
+    :param queryset: Rows to export, already scoped (default: all)
+    :param after: Only export rows with a greater id (keyset cursor)
+    :param chunk_size: Rows fetched from the database at a time
+    """
+    default, fields = EXPORTS[kind]
+    queryset = default if queryset is None else queryset
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    return queryset.order_by('id').values(*fields).iterator(chunk_size=chunk_size)
+
+
+def for_accounts(kind, queryset, **account_filter):
+    """
+    Restrict an export queryset to some PrimaryAccounts
+
+    Usage Example:
+    --------------
+    for_accounts('payments', queryset, user=request.user)
+    for_accounts('shares', queryset, id__in=[12, 40])
+    """
+    prefix = ACCOUNT_LOOKUPS[kind]
+    return queryset.filter(**{
+        f'{prefix}__{lookup}': value for lookup, value in account_filter.items()
+    })
+
+
+def render(rows, kind, output):
+    """
+    Encode export rows as text lines, one generator step per row
+
+    :param output: 'ndjson' (one JSON object per line) or 'csv' (with header)
+    """
+    if output == 'csv':
+        return _csv_lines(rows, EXPORTS[kind][1])
+    return _ndjson_lines(rows)
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+class _Echo:
+    """File-like object handing back what csv.writer writes to it"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows, fields):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row[field] for field in fields])
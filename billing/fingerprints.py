@@ -0,0 +1,89 @@
+# billing/fingerprints.py
+import hashlib
+from decimal import Decimal
+from django.db.models import Q
+from .allocation import CENT
+from .models import Bill
+
+
+def bill_keys(bill, line_items):
+    """
+    Normalized content keys of a bill
+
+    - match_key: provider NPI, service date and total
+    - fingerprint: the same plus every line item's procedure code and
+      amount, sorted so item order does not matter
+
+    Descriptions, due dates and provider name spellings are left out:
+    they are what differs between a paper copy and a portal upload.
+
+    :return: (fingerprint, match_key), hex SHA-1 digests
+    """
+    head = [
+        ''.join(ch for ch in str(bill.provider_npi) if ch.isalnum()),
+        str(bill.service_date),
+        str(Decimal(str(bill.total_amount)).quantize(CENT)),
+    ]
+    items = sorted(
+        f"{item.procedure_code.strip().upper()}:{Decimal(str(item.amount)).quantize(CENT)}"
+        for item in line_items
+    )
+    match_key = hashlib.sha1('|'.join(head).encode()).hexdigest()
+    fingerprint = hashlib.sha1('|'.join(head + items).encode()).hexdigest()
+    return fingerprint, match_key
+
+
+def flag_duplicates(bills):
+    """
+    Fingerprint unsaved bills and flag copies of bills the account has
+
+    One indexed query for the whole batch. A bill with the fingerprint
+    of an earlier bill of its account is an EXACT duplicate of it; one
+    with only its match key a NEAR duplicate. Copies within the batch
+    cannot point at bills not saved yet: they are returned for
+    link_batch_duplicates() to flag once everything is saved.
+
+    Usage Example:
+    --------------
+    later = flag_duplicates([(bill, line_items)])
+    bill.save()
+    link_batch_duplicates(later)
+
+    :param bills: List of (unsaved Bill, its LineItems)
+    :return: List of (bill, earlier bill of the same batch, match)
+    """
+    for bill, line_items in bills:
+        bill.fingerprint, bill.match_key = bill_keys(bill, line_items)
+
+    exact, near = {}, {}
+    for bill_id, account_id, fingerprint, match_key in Bill.objects.filter(
+        Q(fingerprint__in={bill.fingerprint for bill, _ in bills})
+        | Q(match_key__in={bill.match_key for bill, _ in bills}),
+        primary_account_id__in={bill.primary_account_id for bill, _ in bills},
+    ).order_by('id').values_list('id', 'primary_account_id', 'fingerprint', 'match_key'):
+        exact.setdefault((account_id, fingerprint), bill_id)
+        near.setdefault((account_id, match_key), bill_id)
+
+    later = []
+    batch_exact, batch_near = {}, {}
+    for bill, _ in bills:
+        fingerprint_key = (bill.primary_account_id, bill.fingerprint)
+        match_key = (bill.primary_account_id, bill.match_key)
+        if fingerprint_key in exact:
+            bill.duplicate_of_id, bill.duplicate_match = exact[fingerprint_key], 'EXACT'
+        elif match_key in near:
+            bill.duplicate_of_id, bill.duplicate_match = near[match_key], 'NEAR'
+        elif fingerprint_key in batch_exact:
+            later.append((bill, batch_exact[fingerprint_key], 'EXACT'))
+        elif match_key in batch_near:
+            later.append((bill, batch_near[match_key], 'NEAR'))
+        batch_exact.setdefault(fingerprint_key, bill)
+        batch_near.setdefault(match_key, bill)
+    return later
+
+
+def link_batch_duplicates(later):
+    """Flag the in-batch copies returned by flag_duplicates(), once saved"""
+    for bill, original, match in later:
+        bill.duplicate_of_id, bill.duplicate_match = original.id, match
+    Bill.objects.bulk_update([bill for bill, _, _ in later], ['duplicate_of', 'duplicate_match'])
@@ -0,0 +1,304 @@
+# billing/importers.py
+import csv
+import json
+import logging
+from datetime import datetime, timedelta
+from itertools import groupby, islice
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from accounts.models import PrimaryAccount, Member
+from insuranceprofile.models import InsuranceProfile
+from .models import Bill, LineItem
+from .fingerprints import flag_duplicates, link_batch_duplicates
+from .x12 import X12Reader, element
+
+logger = logging.getLogger(__name__)
+
+CSV_COLUMNS = [
+    'account_id', 'bill_reference', 'provider_name', 'provider_npi',
+    'total_amount', 'service_date', 'due_date', 'member_id',
+    'procedure_code', 'description', 'amount',
+]
+
+
+def read_csv(fileobj):
+    """
+    Stream bill records out of a CSV file, one line item per row
+
+    Consecutive rows with the same account_id and bill_reference form one
+    bill; bill columns are read from its first row. An empty total_amount
+    defaults to the sum of the bill's line items. See CSV_COLUMNS.
+
+    :param fileobj: Text file opened with newline=''
+    :return: Generator of records (see BillImporter)
+    """
+    rows = csv.DictReader(fileobj)
+    numbered = enumerate(rows, start=2)  # Line 1 is the header
+    for _, group in groupby(numbered, key=lambda row: (row[1].get('account_id'), row[1].get('bill_reference'))):
+        group = list(group)
+        line, first = group[0]
+        yield {
+            'line': line,
+            'reference': first.get('bill_reference') or '',
+            'account_id': first.get('account_id') or None,
+            'policy_number': None,
+            'bill': {
+                'provider_name': first.get('provider_name'),
+                'provider_npi': first.get('provider_npi'),
+                'total_amount': first.get('total_amount') or None,
+                'service_date': first.get('service_date'),
+                'due_date': first.get('due_date'),
+            },
+            'line_items': [
+                {
+                    'member_id': row.get('member_id') or None,
+                    'procedure_code': row.get('procedure_code'),
+                    'description': row.get('description'),
+                    'amount': row.get('amount'),
+                }
+                for _, row in group
+            ],
+        }
+
+
+def read_837(fileobj, due_days=30, block_size=65536):
+    """
+    Stream bill records out of an X12 837 (professional) claim file
+
+    One record per CLM loop. The billing provider comes from NM1*85, the
+    account from the subscriber id of NM1*IL (matched against
+    InsuranceProfile.policy_number), line items from SV1 and the service
+    date from DTP*472. Due dates are the service date plus due_days.
+
+    :param fileobj: Text file of the interchange
+    :return: Generator of records (see BillImporter)
+    """
+    reader = X12Reader(fileobj, block_size)
+    provider = {'name': '', 'npi': ''}
+    subscriber = None
+    claim = None
+
+    def finish(claim):
+        if claim is None:
+            return None
+        service_date = claim.pop('service_date')
+        claim['bill']['service_date'] = service_date
+        if service_date:
+            due = datetime.strptime(service_date, '%Y-%m-%d').date() + timedelta(days=due_days)
+            claim['bill']['due_date'] = due.isoformat()
+        return claim
+
+    for number, elements in reader:
+        tag = elements[0]
+
+        if tag in ('CLM', 'HL', 'SE', 'IEA'):
+            record = finish(claim)
+            claim = None
+            if record is not None:
+                yield record
+
+        if tag == 'NM1' and element(elements, 1) == '85':
+            provider = {'name': element(elements, 3), 'npi': element(elements, 9)}
+        elif tag == 'NM1' and element(elements, 1) == 'IL':
+            subscriber = element(elements, 9)
+        elif tag == 'CLM':
+            claim = {
+                'line': number,
+                'reference': element(elements, 1),
+                'account_id': None,
+                'policy_number': subscriber,
+                'service_date': None,
+                'bill': {
+                    'provider_name': provider['name'],
+                    'provider_npi': provider['npi'],
+                    'total_amount': element(elements, 2) or None,
+                    'due_date': None,
+                },
+                'line_items': [],
+            }
+        elif claim is not None and tag == 'SV1':
+            procedure = element(elements, 1).split(reader.component)
+            code = procedure[1] if len(procedure) > 1 else procedure[0]
+            claim['line_items'].append({
+                'member_id': None,
+                'procedure_code': code,
+                'description': code,
+                'amount': element(elements, 2),
+            })
+        elif claim is not None and tag == 'NTE' and claim['line_items']:
+            claim['line_items'][-1]['description'] = element(elements, 2)
+        elif claim is not None and tag == 'DTP' and element(elements, 1) == '472':
+            if claim['service_date'] is None and element(elements, 2) == 'D8':
+                value = element(elements, 3)
+                claim['service_date'] = f"{value[:4]}-{value[4:6]}-{value[6:8]}"
+
+    record = finish(claim)
+    if record is not None:
+        yield record
+
+
+class BillImporter:
+    """
+    Validates and writes streamed bill records in chunks
+
+    Records (from read_csv / read_837) are dicts of:
+    - line: Position in the source file, for error reports
+    - reference: Source bill / claim reference
+    - account_id or policy_number: PrimaryAccount, directly or through
+      the InsuranceProfile whose member received the services
+    - bill: Bill field values
+    - line_items: List of LineItem field values (member_id optional)
+
+    Each chunk is validated against the Bill / LineItem field constraints
+    with a handful of lookup queries, then written per PrimaryAccount with
+    bulk_create inside one transaction. Invalid records are written to the
+    reject file as JSON lines instead of stopping the import. Copies of
+    bills already imported are flagged (see billing.fingerprints).
+
+    Usage Example:
+    --------------
+    with open('claims.csv', newline='') as source, open('rejects.jsonl', 'a') as rejects:
+        importer = BillImporter(chunk_size=1000, rejects=rejects)
+        importer.run(read_csv(source), skip=0, on_chunk=save_checkpoint)
+    """
+
+    def __init__(self, chunk_size=1000, rejects=None):
+        """
+        :param chunk_size: Records validated and written per transaction
+        :param rejects: Writable text file receiving rejected records
+        """
+        self.chunk_size = chunk_size
+        self.rejects = rejects
+        self.imported = 0
+        self.rejected = 0
+
+    def run(self, records, skip=0, on_chunk=None):
+        """
+        Import records, skipping the first `skip` (already imported)
+
+        :param on_chunk: Called with the number of records consumed so far
+                         after each chunk has been committed
+        :return: Number of records consumed
+        """
+        consumed = skip
+        records = islice(records, skip, None)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                return consumed
+            self.import_chunk(chunk)
+            consumed += len(chunk)
+            if on_chunk is not None:
+                on_chunk(consumed)
+
+    def import_chunk(self, records):
+        """Validate one chunk of records and write the valid ones"""
+        accounts, policies, members = self._lookups(records)
+        valid = []
+        for record in records:
+            try:
+                valid.append(self._build(record, accounts, policies, members))
+            except ValidationError as e:
+                self._reject(record, e)
+
+        if not valid:
+            return
+        valid.sort(key=lambda built: built[0].primary_account_id)
+        batch_size = getattr(settings, 'BILL_LINE_ITEM_BATCH_SIZE', 500)
+        with transaction.atomic():
+            later = flag_duplicates(valid)
+            for _, group in groupby(valid, key=lambda built: built[0].primary_account_id):
+                group = list(group)
+                bills = Bill.objects.bulk_create([bill for bill, _ in group])
+                line_items = []
+                for bill, items in group:
+                    for item in items:
+                        item.bill = bill
+                    line_items.extend(items)
+                LineItem.objects.bulk_create(line_items, batch_size=batch_size)
+                self.imported += len(bills)
+            link_batch_duplicates(later)
+
+    def _lookups(self, records):
+        account_ids = {r['account_id'] for r in records if r['account_id']}
+        policy_numbers = {r['policy_number'] for r in records if r['policy_number']}
+        member_ids = {
+            item['member_id'] for r in records for item in r['line_items'] if item['member_id']
+        }
+        accounts = set(PrimaryAccount.objects.filter(
+            id__in=[_int(value) for value in account_ids if _int(value) is not None]
+        ).values_list('id', flat=True))
+        policies = {
+            number: (member_id, account_id)
+            for number, member_id, account_id in InsuranceProfile.objects.filter(
+                policy_number__in=policy_numbers
+            ).values_list('policy_number', 'member_id', 'member__primary_account_id')
+        }
+        members = dict(Member.objects.filter(
+            id__in=[_int(value) for value in member_ids if _int(value) is not None]
+        ).values_list('id', 'primary_account_id'))
+        return accounts, policies, members
+
+    def _build(self, record, accounts, policies, members):
+        """Turn a record into unsaved, validated Bill and LineItem instances"""
+        patient_id = None
+        if record['policy_number']:
+            if record['policy_number'] not in policies:
+                raise ValidationError({'policy_number': "No insurance profile with this policy number."})
+            patient_id, account_id = policies[record['policy_number']]
+        else:
+            account_id = _int(record['account_id'])
+            if account_id not in accounts:
+                raise ValidationError({'account_id': "No such account."})
+        if not record['line_items']:
+            raise ValidationError({'line_items': "A bill needs at least one line item."})
+
+        errors = {}
+        line_items = []
+        for position, values in enumerate(record['line_items']):
+            member_id = _int(values['member_id']) if values['member_id'] else patient_id
+            if values['member_id'] and members.get(member_id) != account_id:
+                errors[f'line_items[{position}].member_id'] = ["No such member in this account."]
+            item = LineItem(
+                member_id=member_id,
+                procedure_code=values['procedure_code'],
+                description=values['description'],
+                amount=values['amount'],
+            )
+            try:
+                item.full_clean(exclude=['bill', 'member', 'insurance_coverage'])
+            except ValidationError as e:
+                for field, messages in e.message_dict.items():
+                    errors[f'line_items[{position}].{field}'] = messages
+            line_items.append(item)
+
+        bill_values = dict(record['bill'])
+        if bill_values['total_amount'] is None and not errors:
+            bill_values['total_amount'] = sum(item.amount for item in line_items)
+        bill = Bill(primary_account_id=account_id, status='PENDING', **bill_values)
+        try:
+            bill.full_clean(exclude=['primary_account'])
+        except ValidationError as e:
+            errors.update(e.message_dict)
+        if errors:
+            raise ValidationError(errors)
+        return bill, line_items
+
+    def _reject(self, record, error):
+        self.rejected += 1
+        if self.rejects is None:
+            logger.warning("Rejected bill %s (line %s): %s", record['reference'], record['line'], error)
+            return
+        self.rejects.write(json.dumps({
+            'line': record['line'],
+            'reference': record['reference'],
+            'errors': error.message_dict if hasattr(error, 'error_dict') else error.messages,
+        }) + '\n')
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,108 @@
+# billing/jobs.py
+import logging
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Bill, SplitJob
+from .calculators import BillSplitter
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_split(bill, incremental=False):
+    """
+    Queue a split of a bill for the split_worker command
+
+    A bill already waiting in the queue is not queued twice; its pending
+    job is returned instead (turned into a full split if one is asked for).
+    """
+    pending = SplitJob.objects.filter(bill=bill, status='QUEUED').first()
+    if pending is None:
+        return SplitJob.objects.create(bill=bill, incremental=incremental)
+    if pending.incremental and not incremental:
+        pending.incremental = False
+        pending.save(update_fields=['incremental'])
+    return pending
+
+
+def claim_jobs(worker, limit=1, lease=600):
+    """
+    Claim the oldest runnable jobs for a worker
+
+    Rows are locked with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent
+    workers never claim the same job and never wait on each other. Jobs
+    left RUNNING longer than the lease (a crashed worker) are claimed
+    again.
+
+    :param worker: Name recorded on the claimed jobs
+    :param limit: Maximum number of jobs to claim
+    :param lease: Seconds after which a RUNNING job counts as abandoned
+    :return: List of claimed SplitJob instances
+    """
+    now = timezone.now()
+    runnable = Q(status='QUEUED') | Q(
+        status='RUNNING', started_at__lt=now - timedelta(seconds=lease)
+    )
+    with transaction.atomic():
+        jobs = list(
+            SplitJob.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('bill__primary_account')
+            .filter(runnable)
+            .order_by('created_at')[:limit]
+        )
+        for job in jobs:
+            job.status = 'RUNNING'
+            job.worker = worker
+            job.started_at = now
+            job.attempts += 1
+        SplitJob.objects.bulk_update(jobs, ['status', 'worker', 'started_at', 'attempts'])
+    return jobs
+
+
+def run_job(job):
+    """
+    Split the bill of a claimed job and record the outcome
+
+    :return: True if the split succeeded
+    """
+    try:
+        BillSplitter(job.bill).calculate_shares(incremental=job.incremental)
+    except Exception as e:
+        logger.exception("Split job %s failed", job.id)
+        job.status = 'FAILED'
+        job.error = str(e)
+    else:
+        job.status = 'SUCCEEDED'
+        job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job.status == 'SUCCEEDED'
+
+
+def split_bills(bill_ids, incremental=False):
+    """
+    Split several bills one after the other, collecting failures
+
+    A failing bill is logged and skipped; it never stops the others.
+
+    :param bill_ids: Ids of the bills to split
+    :param incremental: See BillSplitter.calculate_shares
+    :return: (number of bills split, list of (bill_id, error message))
+    """
+    succeeded = 0
+    failures = []
+    bills = Bill.objects.select_related('primary_account').in_bulk(bill_ids)
+    for bill_id in bill_ids:
+        bill = bills.get(bill_id)
+        if bill is None:
+            failures.append((bill_id, "Bill does not exist"))
+            continue
+        try:
+            BillSplitter(bill).calculate_shares(incremental=incremental)
+        except Exception as e:
+            logger.warning("Splitting bill %s failed: %s", bill_id, e)
+            failures.append((bill_id, str(e)))
+        else:
+            succeeded += 1
+    return succeeded, failures
@@ -0,0 +1,54 @@
+# billing/management/commands/fingerprint_bills.py
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+from billing.models import Bill, LineItem
+from billing.fingerprints import bill_keys
+
+
+class Command(BaseCommand):
+    """
+    Fingerprint bills created before duplicate detection existed
+
+    Walks bills without a fingerprint by primary key in chunks (keyset
+    iteration) and stores their fingerprint and match key with one
+    bulk_update per chunk, so new uploads are checked against them.
+    Existing bills are not flagged as duplicates of each other.
+
+    Usage Example:
+    --------------
+    python manage.py fingerprint_bills --chunk-size 2000
+    """
+    help = "Store the content fingerprint of bills that have none"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help="Bills read and written per query"
+        )
+
+    def handle(self, *args, **options):
+        bills = Bill.objects.filter(fingerprint='').order_by('id').only(
+            'id', 'provider_npi', 'service_date', 'total_amount'
+        ).prefetch_related(
+            Prefetch('line_items', queryset=LineItem.objects.only('bill_id', 'procedure_code', 'amount'))
+        )
+
+        started = time.monotonic()
+        last_id = 0
+        processed = 0
+        while True:
+            chunk = list(bills.filter(id__gt=last_id)[:options['chunk_size']])
+            if not chunk:
+                break
+            for bill in chunk:
+                bill.fingerprint, bill.match_key = bill_keys(bill, bill.line_items.all())
+            Bill.objects.bulk_update(chunk, ['fingerprint', 'match_key'])
+            last_id = chunk[-1].id
+            processed += len(chunk)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Fingerprinted {processed} bills in {elapsed:.1f}s "
+            f"({processed / elapsed if elapsed else 0:.0f} bills/s)"
+        ))
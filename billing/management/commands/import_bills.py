@@ -0,0 +1,110 @@
+# billing/management/commands/import_bills.py
+import json
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from billing.importers import BillImporter, read_csv, read_837
+
+
+class Command(BaseCommand):
+    """
+    Import provider bills from a CSV or X12 837 batch file
+
+    The file is parsed as a stream (never loaded whole) and written in
+    chunks, one transaction per chunk. Rejected bills go to the reject
+    file as JSON lines; the import carries on without them. With
+    --checkpoint the number of records already committed is saved after
+    every chunk, so an interrupted import resumes where it stopped.
+
+    Usage Example:
+    --------------
+    # CSV, one line item per row (see billing.importers.CSV_COLUMNS)
+    python manage.py import_bills bills.csv --rejects bills.rejects.jsonl
+
+    # Resumable import of a large 837 file
+    python manage.py import_bills claims.837 --format 837 --checkpoint claims.json
+    """
+    help = "Stream-import bills from a CSV or X12 837 file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import")
+        parser.add_argument(
+            '--format', choices=['csv', '837'],
+            help="File format (default: from the file extension, csv otherwise)"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help="Bills validated and written per transaction"
+        )
+        parser.add_argument(
+            '--rejects',
+            help="JSON lines file receiving rejected bills (appended to)"
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help="JSON file recording the records already imported, resumed from if present"
+        )
+        parser.add_argument(
+            '--due-days', type=int, default=30,
+            help="Days after the service date 837 bills fall due"
+        )
+
+    def handle(self, *args, **options):
+        source = Path(options['path'])
+        if not source.exists():
+            raise CommandError(f"{source} does not exist")
+        file_format = options['format'] or ('837' if source.suffix.lower() in ('.837', '.x12', '.edi') else 'csv')
+
+        checkpoint = Path(options['checkpoint']) if options['checkpoint'] else None
+        skip = self._load_checkpoint(checkpoint, source)
+
+        rejects = open(options['rejects'], 'a') if options['rejects'] else None
+        importer = BillImporter(chunk_size=options['chunk_size'], rejects=rejects)
+        started = time.monotonic()
+
+        def on_chunk(consumed):
+            if rejects is not None:
+                rejects.flush()
+            self._save_checkpoint(checkpoint, source, consumed)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{consumed} records: {importer.imported} imported, {importer.rejected} rejected "
+                f"({importer.imported / elapsed if elapsed else 0:.0f} bills/s)"
+            )
+
+        try:
+            with open(source, newline='') as stream:
+                if file_format == '837':
+                    records = read_837(stream, due_days=options['due_days'])
+                else:
+                    records = read_csv(stream)
+                importer.run(records, skip=skip, on_chunk=on_chunk)
+        finally:
+            if rejects is not None:
+                rejects.close()
+
+        elapsed = time.monotonic() - started
+        style = self.style.SUCCESS if not importer.rejected else self.style.WARNING
+        self.stdout.write(style(
+            f"Imported {importer.imported} bills, {importer.rejected} rejected in {elapsed:.1f}s "
+            f"({importer.imported / elapsed if elapsed else 0:.0f} bills/s)"
+        ))
+
+    def _load_checkpoint(self, checkpoint, source):
+        if checkpoint is None or not checkpoint.exists():
+            return 0
+        state = json.loads(checkpoint.read_text())
+        if state.get('source') != str(source.resolve()):
+            raise CommandError(
+                f"Checkpoint {checkpoint} is for {state.get('source')}, not {source}"
+            )
+        self.stdout.write(f"Resuming after record {state['records']}")
+        return state['records']
+
+    def _save_checkpoint(self, checkpoint, source, records):
+        if checkpoint is None:
+            return
+        # Write then rename so a crash never leaves a truncated checkpoint
+        temporary = checkpoint.with_suffix(checkpoint.suffix + '.tmp')
+        temporary.write_text(json.dumps({'source': str(source.resolve()), 'records': records}))
+        temporary.replace(checkpoint)
@@ -0,0 +1,89 @@
+# billing/management/commands/rebuild_balances.py
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from accounts.models import Member
+from billing.models import MemberBalance
+from billing.balances import BALANCE_FIELDS, compute_balances, save_balances
+
+
+class Command(BaseCommand):
+    """
+    Recompute every MemberBalance from the full share / payment history
+
+    Walks members by primary key in chunks (keyset iteration), one
+    aggregate query and one upsert per chunk. With --check nothing is
+    written: rows that differ from the history are reported instead,
+    to verify the incremental maintenance.
+
+    Usage Example:
+    --------------
+    # Backfill or repair every balance
+    python manage.py rebuild_balances
+
+    # Verify, e.g. nightly
+    python manage.py rebuild_balances --check
+    """
+    help = "Rebuild (or with --check verify) member balances from BillShare and PaymentHistory"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only report balances that differ from the history"
+        )
+        parser.add_argument(
+            '--account', type=int, action='append', dest='accounts',
+            help="Only rebuild members of this PrimaryAccount id (repeatable)"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help="Members recomputed per transaction"
+        )
+
+    def handle(self, *args, **options):
+        members = Member.objects.order_by('id')
+        if options['accounts']:
+            members = members.filter(primary_account_id__in=options['accounts'])
+
+        started = time.monotonic()
+        last_id = 0
+        processed = mismatched = 0
+        while True:
+            member_ids = list(
+                members.filter(id__gt=last_id).values_list('id', flat=True)[:options['chunk_size']]
+            )
+            if not member_ids:
+                break
+            last_id = member_ids[-1]
+            processed += len(member_ids)
+
+            with transaction.atomic():
+                balances = compute_balances(member_ids)
+                stored = MemberBalance.objects.in_bulk(member_ids, field_name='member_id')
+                differing = [
+                    balance for member_id, balance in balances.items()
+                    if self._differs(stored.get(member_id), balance)
+                ]
+                mismatched += len(differing)
+                if options['check']:
+                    for balance in differing[:50]:
+                        self.stderr.write(f"member {balance.member_id}: balance differs from history")
+                else:
+                    save_balances(list(balances.values()))
+
+        elapsed = time.monotonic() - started
+        style = self.style.SUCCESS if not (options['check'] and mismatched) else self.style.WARNING
+        verb = "differ" if options['check'] else "corrected"
+        self.stdout.write(style(
+            f"Checked {processed} members, {mismatched} balances {verb} in {elapsed:.1f}s "
+            f"({processed / elapsed if elapsed else 0:.0f} members/s)"
+        ))
+
+    def _differs(self, stored, balance):
+        if stored is None:
+            return True
+        return any(
+            getattr(stored, f'{field}_id' if field == 'primary_account' else field)
+            != getattr(balance, f'{field}_id' if field == 'primary_account' else field)
+            for field in BALANCE_FIELDS
+        )
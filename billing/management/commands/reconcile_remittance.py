@@ -0,0 +1,74 @@
+# billing/management/commands/reconcile_remittance.py
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from billing.remittance import RemittanceReconciler, read_835
+
+APPLIED = ('completed', 'failed', 'reversed')
+
+
+class Command(BaseCommand):
+    """
+    Reconcile a payer remittance (X12 835) file against PaymentHistory
+
+    The file is streamed and matched in chunks (see
+    billing.remittance.RemittanceReconciler). Lines that could not be
+    applied are written to the exceptions report for manual follow-up.
+
+    Usage Example:
+    --------------
+    python manage.py reconcile_remittance remit.835 --exceptions remit.exceptions.csv
+
+    # See what would change first
+    python manage.py reconcile_remittance remit.835 --exceptions - --dry-run
+    """
+    help = "Match an X12 835 remittance file to payments and apply the results"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="835 file to reconcile")
+        parser.add_argument(
+            '--exceptions',
+            help="CSV report of the lines that could not be applied ('-' for standard output)"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help="Remittance lines matched per transaction"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Match and report without changing any payment"
+        )
+
+    def handle(self, *args, **options):
+        source = Path(options['path'])
+        if not source.exists():
+            raise CommandError(f"{source} does not exist")
+
+        report = None
+        if options['exceptions'] == '-':
+            report = self.stdout
+        elif options['exceptions']:
+            report = open(options['exceptions'], 'w', newline='')
+
+        started = time.monotonic()
+        try:
+            reconciler = RemittanceReconciler(
+                chunk_size=options['chunk_size'], exceptions=report, dry_run=options['dry_run']
+            )
+            with open(source) as stream:
+                counts = reconciler.run(read_835(stream))
+        finally:
+            if report is not None and report is not self.stdout:
+                report.close()
+
+        lines = sum(counts.values())
+        applied = sum(counts[outcome] for outcome in APPLIED)
+        elapsed = time.monotonic() - started
+        for outcome, count in sorted(counts.items()):
+            self.stderr.write(f"{outcome}: {count}")
+        style = self.style.SUCCESS if applied == lines else self.style.WARNING
+        self.stderr.write(style(
+            f"{'Matched' if options['dry_run'] else 'Applied'} {applied} of {lines} remittance lines, "
+            f"{lines - applied} exceptions in {elapsed:.1f}s "
+            f"({lines / elapsed if elapsed else 0:.0f} lines/s)"
+        ))
@@ -0,0 +1,157 @@
+# billing/management/commands/split_bills.py
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from billing.models import Bill
+from billing.jobs import split_bills
+
+
+def _init_worker():
+    # Spawned / forkserver children start without the app registry
+    django.setup()
+    # Forked children must never reuse a connection inherited from the parent
+    connections.close_all()
+
+
+def _pool_context():
+    """Fork where available: children inherit settings as changed at runtime"""
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def _split_chunk(bill_ids, incremental):
+    """Process pool task: split one chunk of bills"""
+    started = time.monotonic()
+    succeeded, failures = split_bills(bill_ids, incremental=incremental)
+    return os.getpid(), succeeded, failures, time.monotonic() - started
+
+
+class Command(BaseCommand):
+    """
+    Split many bills at once, e.g. after a bulk claims import
+
+    Bills are grouped by PrimaryAccount into chunks (an account's bills
+    always land in the same chunk) and fanned out to a process pool.
+    Every worker process opens its own database connection. Failing
+    bills are reported at the end and never abort the run. Bills flagged
+    as copies of another bill are skipped unless --include-duplicates.
+
+    Usage Example:
+    --------------
+    # Every bill that has no shares yet, 8 processes
+    python manage.py split_bills --unsplit --workers 8
+
+    # Two accounts, only re-adjudicating changed line items
+    python manage.py split_bills --account 12 --account 40 --incremental
+    """
+    help = "Split bills in parallel across a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--account', type=int, action='append', dest='accounts',
+            help="Only split bills of this PrimaryAccount id (repeatable)"
+        )
+        parser.add_argument(
+            '--unsplit', action='store_true',
+            help="Only split bills that have no shares yet"
+        )
+        parser.add_argument(
+            '--include-duplicates', action='store_true',
+            help="Also split bills flagged as copies of another bill"
+        )
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help="Only adjudicate line items added or changed since the last split"
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Worker processes (1 splits in this process)"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=200,
+            help="Bills handed to a worker at a time"
+        )
+
+    def handle(self, *args, **options):
+        bills = Bill.objects.order_by('primary_account_id', 'id')
+        if options['accounts']:
+            bills = bills.filter(primary_account_id__in=options['accounts'])
+        if options['unsplit']:
+            bills = bills.filter(shares__isnull=True)
+        if not options['include_duplicates']:
+            bills = bills.filter(duplicate_of__isnull=True)
+        chunks = self._chunks(
+            bills.values_list('primary_account_id', 'id'), options['chunk_size']
+        )
+
+        started = time.monotonic()
+        per_worker = defaultdict(lambda: {'bills': 0, 'seconds': 0.0})
+        failures = []
+
+        if options['workers'] <= 1:
+            results = (_split_chunk(chunk, options['incremental']) for chunk in chunks)
+            for result in results:
+                self._collect(result, per_worker, failures)
+        else:
+            # Forked workers would otherwise inherit this process's connection
+            connections.close_all()
+            with ProcessPoolExecutor(
+                max_workers=options['workers'], mp_context=_pool_context(),
+                initializer=_init_worker
+            ) as pool:
+                futures = {
+                    pool.submit(_split_chunk, chunk, options['incremental']): chunk
+                    for chunk in chunks
+                }
+                for future in as_completed(futures):
+                    try:
+                        self._collect(future.result(), per_worker, failures)
+                    except Exception as e:
+                        # A worker died: count its whole chunk as failed
+                        failures.extend((bill_id, str(e)) for bill_id in futures[future])
+
+        for pid, stats in sorted(per_worker.items()):
+            rate = stats['bills'] / stats['seconds'] if stats['seconds'] else 0
+            self.stdout.write(
+                f"worker {pid}: {stats['bills']} bills in {stats['seconds']:.1f}s "
+                f"({rate:.0f} bills/s)"
+            )
+        for bill_id, error in failures[:50]:
+            self.stderr.write(f"bill {bill_id}: {error}")
+        if len(failures) > 50:
+            self.stderr.write(f"... and {len(failures) - 50} more failures")
+
+        succeeded = sum(stats['bills'] for stats in per_worker.values())
+        elapsed = time.monotonic() - started
+        style = self.style.SUCCESS if not failures else self.style.WARNING
+        self.stdout.write(style(
+            f"Split {succeeded} bills, {len(failures)} failed in {elapsed:.1f}s "
+            f"({succeeded / elapsed if elapsed else 0:.0f} bills/s)"
+        ))
+
+    def _chunks(self, account_bills, chunk_size):
+        """Group (account_id, bill_id) rows into chunks of whole accounts"""
+        chunks = []
+        chunk = []
+        current_account = None
+        for account_id, bill_id in account_bills:
+            if account_id != current_account and len(chunk) >= chunk_size:
+                chunks.append(chunk)
+                chunk = []
+            current_account = account_id
+            chunk.append(bill_id)
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def _collect(self, result, per_worker, failures):
+        pid, succeeded, chunk_failures, seconds = result
+        per_worker[pid]['bills'] += succeeded
+        per_worker[pid]['seconds'] += seconds
+        failures.extend(chunk_failures)
@@ -0,0 +1,107 @@
+# billing/management/commands/split_worker.py
+import os
+import socket
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from billing.jobs import claim_jobs, run_job
+
+
+class Command(BaseCommand):
+    """
+    Run queued bill splits (see BillViewSet.split with ?async=true)
+
+    Starts a pool of worker threads, each with its own database
+    connection, that claim jobs with SELECT ... FOR UPDATE SKIP LOCKED.
+    Any number of these processes can run side by side. With a single
+    worker the jobs run in the main thread.
+
+    Usage Example:
+    --------------
+    # Four threads, polling every 2 seconds until stopped
+    python manage.py split_worker --workers 4
+
+    # Drain the queue once and exit (cron style)
+    python manage.py split_worker --workers 4 --once
+    """
+    help = "Process queued bill split jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help="Worker threads in this process"
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0,
+            help="Seconds an idle worker waits before looking for jobs again"
+        )
+        parser.add_argument(
+            '--lease', type=int, default=600,
+            help="Seconds after which a job left RUNNING is claimed again"
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit once the queue is empty instead of polling"
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.succeeded = self.failed = 0
+        name = f"{socket.gethostname()}:{os.getpid()}"
+
+        started = time.monotonic()
+        if options['workers'] == 1:
+            self._work(f"{name}:0", options)
+        else:
+            self._run_threads(name, options)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Split {self.succeeded} bills, {self.failed} failed "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
+
+    def _run_threads(self, name, options):
+        threads = [
+            threading.Thread(
+                target=self._work_in_thread,
+                args=(f"{name}:{number}", options),
+                daemon=True
+            )
+            for number in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the running jobs finish...")
+            self.stopping.set()
+            for thread in threads:
+                thread.join()
+
+    def _work_in_thread(self, worker, options):
+        try:
+            self._work(worker, options)
+        finally:
+            # Each thread opened its own connection
+            connection.close()
+
+    def _work(self, worker, options):
+        while not self.stopping.is_set():
+            jobs = claim_jobs(worker, lease=options['lease'])
+            if not jobs:
+                if options['once']:
+                    return
+                self.stopping.wait(options['poll_interval'])
+                continue
+            for job in jobs:
+                succeeded = run_job(job)
+                with self.lock:
+                    if succeeded:
+                        self.succeeded += 1
+                    else:
+                        self.failed += 1
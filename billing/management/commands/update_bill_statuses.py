@@ -0,0 +1,39 @@
+# billing/management/commands/update_bill_statuses.py
+import time
+from django.core.management.base import BaseCommand
+from billing.models import Bill
+from billing.status import update_bill_statuses
+
+
+class Command(BaseCommand):
+    """
+    Bring Bill.status in line with shares, payments and disputes
+
+    Statuses are kept current on every write; this fixes bills changed
+    behind the application's back (raw SQL, data imports, old rows) with
+    one set-based UPDATE over every bill of the selected accounts.
+
+    Usage Example:
+    --------------
+    python manage.py update_bill_statuses
+    python manage.py update_bill_statuses --account 12 --account 40
+    """
+    help = "Recompute the status of every bill from its shares and disputes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--account', type=int, action='append', dest='accounts',
+            help="Only update bills of this PrimaryAccount id (repeatable)"
+        )
+
+    def handle(self, *args, **options):
+        bills = Bill.objects.all()
+        if options['accounts']:
+            bills = bills.filter(primary_account_id__in=options['accounts'])
+
+        started = time.monotonic()
+        changed = update_bill_statuses(bills)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated the status of {changed} bills in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,96 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0003_primaryaccount_split_rules_json'),
+        ('insuranceprofile', '0004_insuranceprofile_accumulator_period_start'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Bill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider_name', models.CharField(max_length=255)),
+                ('provider_npi', models.CharField(max_length=15)),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('DRAFT', 'Draft'), ('PENDING', 'Pending Payment'), ('PARTIAL', 'Partially Paid'), ('PAID', 'Fully Paid'), ('DISPUTED', 'Under Dispute')], default='DRAFT', max_length=20)),
+                ('service_date', models.DateField()),
+                ('due_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('primary_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bills', to='accounts.primaryaccount')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BillShare',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('insurance_covered', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('personal_responsibility', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PAID', 'Paid'), ('DISPUTED', 'Disputed')], default='PENDING', max_length=20)),
+                ('bill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shares', to='billing.bill')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shares', to='accounts.member')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Dispute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.TextField()),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('UNDER_REVIEW', 'Under Review'), ('RESOLVED', 'Resolved')], default='OPEN', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('bill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disputes', to='billing.bill')),
+                ('initiator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='disputes', to='accounts.member')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LineItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('procedure_code', models.CharField(max_length=20)),
+                ('description', models.TextField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('covered_service', models.BooleanField(default=False)),
+                ('requires_preauth', models.BooleanField(default=False)),
+                ('bill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='line_items', to='billing.bill')),
+                ('insurance_coverage', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='insuranceprofile.insuranceprofile')),
+                ('member', models.ForeignKey(blank=True, help_text='Patient who received the service, adjudicated against their policies', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='line_items', to='accounts.member')),
+            ],
+            options={
+                'ordering': ['-amount'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PaymentHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('payment_method', models.CharField(max_length=50)),
+                ('transaction_id', models.CharField(max_length=255)),
+                ('payment_date', models.DateTimeField(auto_now_add=True)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('bill_share', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='billing.billshare')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CharityRoundUp',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('charity_name', models.CharField(max_length=255)),
+                ('tax_deductible', models.BooleanField(default=True)),
+                ('donation_receipt', models.URLField(blank=True, null=True)),
+                ('payment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='charity_roundup', to='billing.paymenthistory')),
+            ],
+        ),
+    ]
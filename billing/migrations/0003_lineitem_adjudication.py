@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_splitjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lineitem',
+            name='adjudication_key',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='lineitem',
+            name='covered_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='lineitem',
+            name='patient_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='splitjob',
+            name='incremental',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_primaryaccount_split_rules_json'),
+        ('billing', '0003_lineitem_adjudication'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['primary_account', '-created_at', '-id'], name='bill_account_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['primary_account', 'status', 'due_date'], name='bill_account_status_due_idx'),
+        ),
+    ]
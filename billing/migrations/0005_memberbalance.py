@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_primaryaccount_split_rules_json'),
+        ('billing', '0004_bill_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('billed', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('disputed', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('overdue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('next_due_date', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='balance', to='accounts.member')),
+                ('primary_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='member_balances', to='accounts.primaryaccount')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0005_memberbalance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='paymenthistory',
+            name='transaction_id',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_primaryaccount_split_rules_json'),
+        ('billing', '0006_paymenthistory_transaction_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='duplicate_match',
+            field=models.CharField(blank=True, choices=[('EXACT', 'Same provider, date, total and line items'), ('NEAR', 'Same provider, date and total')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='billing.bill'),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='bill',
+            name='match_key',
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['primary_account', 'fingerprint'], name='bill_account_fingerprint_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bill',
+            index=models.Index(fields=['primary_account', 'match_key'], name='bill_account_match_key_idx'),
+        ),
+    ]
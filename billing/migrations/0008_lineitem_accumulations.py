@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0007_bill_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lineitem',
+            name='accumulations',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
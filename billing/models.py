@@ -32,6 +32,48 @@ class Bill(models.Model):
     due_date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set on creation by billing.fingerprints to flag uploads of a bill
+    # the account already has
+    fingerprint = models.CharField(max_length=40, blank=True, editable=False)
+    match_key = models.CharField(max_length=40, blank=True, editable=False)
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates'
+    )
+    duplicate_match = models.CharField(
+        max_length=10,
+        choices=[
+            ('EXACT', 'Same provider, date, total and line items'),
+            ('NEAR', 'Same provider, date and total')
+        ],
+        blank=True
+    )
+
+    class Meta:
+        indexes = [
+            # Duplicate lookups at ingest
+            models.Index(
+                fields=['primary_account', 'fingerprint'],
+                name='bill_account_fingerprint_idx'
+            ),
+            models.Index(
+                fields=['primary_account', 'match_key'],
+                name='bill_account_match_key_idx'
+            ),
+            # Cursor-paginated listing of an account's bills
+            models.Index(
+                fields=['primary_account', '-created_at', '-id'],
+                name='bill_account_created_idx'
+            ),
+            # Status and due date filters of the listing
+            models.Index(
+                fields=['primary_account', 'status', 'due_date'],
+                name='bill_account_status_due_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"Bill #{self.id} - {self.provider_name}"
@@ -42,6 +84,14 @@ class LineItem(models.Model):
         on_delete=models.CASCADE,
         related_name='line_items'
     )
+    member = models.ForeignKey(
+        Member,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='line_items',
+        help_text="Patient who received the service, adjudicated against their policies"
+    )
     procedure_code = models.CharField(max_length=20)
     description = models.TextField()
     amount = models.DecimalField(max_digits=12, decimal_places=2)
@@ -53,6 +103,12 @@ class LineItem(models.Model):
     )
     covered_service = models.BooleanField(default=False)
     requires_preauth = models.BooleanField(default=False)
+    # Last adjudication, reused by incremental splits while the key matches
+    covered_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    patient_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    adjudication_key = models.CharField(max_length=40, blank=True, editable=False)
+    # policy_id → deductible + patient share posted to its accumulator
+    accumulations = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         ordering = ['-amount']
@@ -89,7 +145,8 @@ class PaymentHistory(models.Model):
     )
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     payment_method = models.CharField(max_length=50)
-    transaction_id = models.CharField(max_length=255)
+    # Looked up when reconciling remittance files
+    transaction_id = models.CharField(max_length=255, db_index=True)
     payment_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(
         max_length=20,
@@ -134,4 +191,71 @@ class CharityRoundUp(models.Model):
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     charity_name = models.CharField(max_length=255)
     tax_deductible = models.BooleanField(default=True)
-    donation_receipt = models.URLField(null=True, blank=True)
\ No newline at end of file
+    donation_receipt = models.URLField(null=True, blank=True)
+
+class SplitJob(models.Model):
+    """
+    Queued bill split, run by the split_worker management command
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+
+    bill = models.ForeignKey(
+        Bill,
+        on_delete=models.CASCADE,
+        related_name='split_jobs'
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='QUEUED'
+    )
+    incremental = models.BooleanField(default=False)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Workers scan the oldest queued jobs
+            models.Index(fields=['status', 'created_at'], name='splitjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Split job #{self.id} for bill #{self.bill_id} ({self.status})"
+
+class MemberBalance(models.Model):
+    """
+    What a member owes and has paid, kept up to date on every BillShare
+    and PaymentHistory write (see billing.balances)
+    """
+    member = models.OneToOneField(
+        Member,
+        on_delete=models.CASCADE,
+        related_name='balance'
+    )
+    primary_account = models.ForeignKey(
+        PrimaryAccount,
+        on_delete=models.CASCADE,
+        related_name='member_balances'
+    )
+    billed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    disputed = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    overdue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Earliest due date of the outstanding amount not overdue yet; once it
+    # has passed, overdue is stale and the row is refreshed on read
+    next_due_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Balance of {self.member} - {self.outstanding}"
@@ -0,0 +1,19 @@
+# billing/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class BillCursorPagination(CursorPagination):
+    """
+    Cursor pagination over bills, newest first
+
+    DRF keys the cursor on the first ordering field only: a page starts
+    with a range filter on created_at (an index range scan on
+    bill_account_created_idx, however long the history) and skips the
+    bills sharing the cursor's created_at with a small OFFSET. '-id' just
+    orders those ties. Timestamps rarely collide, so that offset stays
+    close to zero.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
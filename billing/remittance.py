@@ -0,0 +1,171 @@
+# billing/remittance.py
+import csv
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.db import transaction
+from django.db.models import Q, Sum, Value, DecimalField
+from django.db.models.functions import Coalesce
+from .models import Bill, BillShare, PaymentHistory
+from .balances import balance_changes
+from .status import update_bill_statuses
+from .x12 import X12Reader, element
+
+# CLP02 claim status codes
+PAID_STATUS_CODES = {'1', '2', '3', '19', '20', '21'}
+DENIED_STATUS_CODES = {'4'}
+REVERSAL_STATUS_CODES = {'22'}
+
+EXCEPTION_COLUMNS = ['line', 'transaction_id', 'amount', 'status_code', 'trace', 'reason', 'payment_id']
+
+
+def read_835(fileobj, block_size=65536):
+    """
+    Stream remittance lines out of an X12 835 file, one per CLP segment
+
+    CLP01 (the claim reference we submitted) is matched against
+    PaymentHistory.transaction_id and CLP04 is the amount paid. The
+    check / EFT trace number of the enclosing TRN segment is kept for
+    the exceptions report.
+
+    :return: Generator of dicts with line, transaction_id, amount,
+             status_code and trace
+    """
+    trace = ''
+    for number, elements in X12Reader(fileobj, block_size):
+        tag = elements[0]
+        if tag == 'TRN':
+            trace = element(elements, 2)
+        elif tag == 'CLP':
+            yield {
+                'line': number,
+                'transaction_id': element(elements, 1),
+                'amount': element(elements, 4),
+                'status_code': element(elements, 2),
+                'trace': trace,
+            }
+
+
+class RemittanceReconciler:
+    """
+    Matches remittance lines to PaymentHistory in chunks
+
+    For each chunk the payments sharing a transaction id with any line
+    are loaded with one query into a hash index (transaction id → rows),
+    lines are matched in memory, then payment and share statuses are
+    written with bulk_update in one transaction per chunk:
+    - paid claims complete the PENDING payment of the same amount
+    - denied claims fail the PENDING payment
+    - reversals fail the COMPLETED payment they reverse
+    Shares paid in full become PAID (and PENDING again after a
+    reversal); member balances and bill statuses follow in the same
+    transaction. Every
+    line that cannot be applied goes to the exceptions report.
+
+    Usage Example:
+    --------------
+    with open('remit.835') as source, open('exceptions.csv', 'w', newline='') as report:
+        reconciler = RemittanceReconciler(chunk_size=5000, exceptions=report)
+        reconciler.run(read_835(source))
+        reconciler.counts  # Counter({'completed': 41230, 'unmatched': 12, ...})
+    """
+
+    def __init__(self, chunk_size=5000, exceptions=None, dry_run=False):
+        """
+        :param chunk_size: Remittance lines matched per transaction
+        :param exceptions: Writable text file receiving the CSV report
+        :param dry_run: Match and report without writing anything
+        """
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.counts = Counter()
+        self.writer = None
+        if exceptions is not None:
+            self.writer = csv.writer(exceptions)
+            self.writer.writerow(EXCEPTION_COLUMNS)
+
+    def run(self, lines):
+        """Reconcile every line of a stream"""
+        lines = iter(lines)
+        while True:
+            chunk = list(islice(lines, self.chunk_size))
+            if not chunk:
+                return self.counts
+            self.reconcile_chunk(chunk)
+
+    def reconcile_chunk(self, lines):
+        index = defaultdict(list)
+        for payment in PaymentHistory.objects.filter(
+            transaction_id__in={line['transaction_id'] for line in lines}
+        ).only('id', 'transaction_id', 'amount', 'status', 'bill_share_id').order_by('id'):
+            index[payment.transaction_id].append(payment)
+
+        changed = {}
+        for line in lines:
+            payment, outcome = self._match(line, index.get(line['transaction_id'], []))
+            self.counts[outcome] += 1
+            if payment is not None and outcome in ('completed', 'failed', 'reversed'):
+                changed[payment.id] = payment
+            else:
+                self._report(line, outcome, payment)
+
+        if changed and not self.dry_run:
+            share_ids = {payment.bill_share_id for payment in changed.values()}
+            with transaction.atomic(), balance_changes(BillShare.objects.filter(id__in=share_ids)):
+                PaymentHistory.objects.bulk_update(list(changed.values()), ['status'])
+                self._update_shares(share_ids)
+
+    def _match(self, line, payments):
+        """Return (payment, outcome) for a line, updating the payment in memory"""
+        try:
+            amount = Decimal(line['amount'])
+        except (InvalidOperation, TypeError):
+            return None, 'invalid_amount'
+        if not payments:
+            return None, 'unmatched'
+
+        code = line['status_code']
+        pending = [payment for payment in payments if payment.status == 'PENDING']
+        if code in PAID_STATUS_CODES:
+            for payment in pending:
+                if payment.amount == amount:
+                    payment.status = 'COMPLETED'
+                    return payment, 'completed'
+            if any(p.status == 'COMPLETED' and p.amount == amount for p in payments):
+                return None, 'already_completed'
+            return (pending or payments)[0], 'amount_mismatch'
+        if code in DENIED_STATUS_CODES:
+            if pending:
+                pending[0].status = 'FAILED'
+                return pending[0], 'failed'
+            return payments[0], 'not_pending'
+        if code in REVERSAL_STATUS_CODES:
+            for payment in payments:
+                if payment.status == 'COMPLETED' and payment.amount == -amount:
+                    payment.status = 'FAILED'
+                    return payment, 'reversed'
+            return payments[0], 'unmatched_reversal'
+        return None, 'unknown_status'
+
+    def _update_shares(self, share_ids):
+        """Mark shares paid in full as PAID, and reversed ones PENDING"""
+        shares = list(BillShare.objects.filter(id__in=share_ids).annotate(paid=Coalesce(
+            Sum('payments__amount', filter=Q(payments__status='COMPLETED')),
+            Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2)
+        )))
+        updated = []
+        for share in shares:
+            status = 'PAID' if share.paid >= share.personal_responsibility else 'PENDING'
+            if share.status != 'DISPUTED' and share.status != status:
+                share.status = status
+                updated.append(share)
+        BillShare.objects.bulk_update(updated, ['status'])
+        update_bill_statuses(Bill.objects.filter(id__in={share.bill_id for share in shares}))
+
+    def _report(self, line, reason, payment):
+        if self.writer is None:
+            return
+        self.writer.writerow([
+            line['line'], line['transaction_id'], line['amount'], line['status_code'],
+            line['trace'], reason, payment.id if payment is not None else '',
+        ])
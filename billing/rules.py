@@ -0,0 +1,112 @@
+# billing/rules.py
+import copy
+from django.conf import settings
+from insuranceprofile.cache import LRUCache
+from .allocation import allocate, rule_weights
+
+
+class CompiledSplitRule:
+    """
+    Split rules of an account parsed and validated once
+
+    Holds the member-id → integer weight vector the allocation kernel
+    needs, so splitting a bill is a single allocate() call. Rules that
+    cannot split a bill compile to the ValueError raised on allocation.
+    """
+
+    def __init__(self, split_rules, members):
+        """
+        :param split_rules: Rules shaped like PrimaryAccount.split_rules_json
+        :param members: Members of the account, in share order
+        """
+        self.split_rules = copy.deepcopy(split_rules or {})
+        self.membership = self._membership(members)
+        self.error = None
+        try:
+            weights = rule_weights(self.split_rules, members)
+        except ValueError as e:
+            self.error = e
+            weights = []
+
+        # Percentage splits keep a (zero) share for members without one
+        keep_zero = self.split_rules.get('method') == 'PERCENTAGE'
+        entries = [
+            (member.id, weight)
+            for member, weight in zip(members, weights)
+            if weight or keep_zero
+        ]
+        self.member_ids = [member_id for member_id, _ in entries]
+        self.weights = [weight for _, weight in entries]
+        self.weight_sum = sum(self.weights)
+
+    def matches(self, split_rules, members):
+        """True if compiled from these rules and this membership"""
+        return (
+            self.split_rules == (split_rules or {})
+            and self.membership == self._membership(members)
+        )
+
+    @staticmethod
+    def _membership(members):
+        # DEFAULT weights depend on relationships, not just on who is a member
+        return frozenset((member.id, member.relationship) for member in members)
+
+    def allocate(self, total_cents):
+        """
+        Split integer cents between the members
+
+        :return: List of (member_id, cents)
+        :raises ValueError: If the rules cannot split a bill
+        """
+        if self.error is not None:
+            raise self.error
+        return list(zip(
+            self.member_ids, allocate(total_cents, self.weights, self.weight_sum)
+        ))
+
+
+class SplitRuleCache:
+    """
+    Caches the CompiledSplitRule of each PrimaryAccount
+
+    An entry is only used while the account's split_rules_json and members
+    (ids and relationships) are the ones it was compiled from, so a stale entry (e.g. changed
+    in another process) is recompiled rather than applied. Signals drop
+    entries eagerly when rules or membership change.
+
+    Configured through settings.SPLIT_RULE_CACHE:
+
+    SPLIT_RULE_CACHE = {
+        'MAXSIZE': 10000,  # Accounts kept per process, 0 disables caching
+    }
+
+    Usage Example:
+    --------------
+    rule = split_rule_cache.get(account, members)
+    rule.allocate(to_cents(total_personal))
+    """
+
+    def __init__(self, maxsize=10000):
+        self._compiled = LRUCache(maxsize)
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'SPLIT_RULE_CACHE', {})
+        return cls(maxsize=config.get('MAXSIZE', 10000))
+
+    def get(self, account, members):
+        """Return the compiled split rules of an account"""
+        rule = self._compiled.get(account.id)
+        if rule is None or not rule.matches(account.split_rules_json, members):
+            rule = CompiledSplitRule(account.split_rules_json, members)
+            self._compiled.set(account.id, rule)
+        return rule
+
+    def invalidate(self, account_id):
+        self._compiled.pop(account_id)
+
+    def clear(self):
+        self._compiled.clear()
+
+
+split_rule_cache = SplitRuleCache.from_settings()
@@ -1,33 +1,105 @@
 # billing/serializers.py
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
-from .models import Bill, LineItem, BillShare, PaymentHistory, Dispute, CharityRoundUp
+from .models import Bill, LineItem, BillShare, PaymentHistory, Dispute, CharityRoundUp, SplitJob, MemberBalance
+from .fingerprints import flag_duplicates
 
 class LineItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = LineItem
         fields = '__all__'
-        read_only_fields = ['covered_service']
+        read_only_fields = ['bill', 'covered_service', 'covered_amount', 'patient_amount']
+
+class BillShareSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BillShare
+        fields = '__all__'
+        read_only_fields = ['original_amount', 'insurance_covered']
 
 class BillSerializer(serializers.ModelSerializer):
     line_items = LineItemSerializer(many=True)
+    shares = BillShareSerializer(many=True, read_only=True)
     
     class Meta:
         model = Bill
         fields = '__all__'
-        read_only_fields = ['status', 'created_at', 'updated_at']
+        read_only_fields = ['status', 'created_at', 'updated_at', 'duplicate_of', 'duplicate_match']
 
     def create(self, validated_data):
         line_items_data = validated_data.pop('line_items')
-        bill = Bill.objects.create(**validated_data)
-        for item_data in line_items_data:
-            LineItem.objects.create(bill=bill, **item_data)
+        bill = Bill(**validated_data)
+        line_items = [LineItem(bill=bill, **item_data) for item_data in line_items_data]
+        with transaction.atomic():
+            # Flag re-uploads before anyone pays for splitting them
+            flag_duplicates([(bill, line_items)])
+            bill.save()
+            line_items = LineItem.objects.bulk_create(
+                line_items,
+                batch_size=getattr(settings, 'BILL_LINE_ITEM_BATCH_SIZE', 500)
+            )
+
+        self._created_line_items = line_items
         return bill
 
-class BillShareSerializer(serializers.ModelSerializer):
+    def to_representation(self, instance):
+        line_items = getattr(self, '_created_line_items', None)
+        if line_items is None or instance is not self.instance:
+            return super().to_representation(instance)
+        # A bill created here: serve its line items from the created rows
+        # (in upload order) instead of reading them back; it has no shares yet
+        created = {'line_items': LineItemSerializer(line_items, many=True).data, 'shares': []}
+        data = {}
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name in created:
+                data[name] = created[name]
+                continue
+            attribute = field.get_attribute(instance)
+            data[name] = None if attribute is None else field.to_representation(attribute)
+        return data
+
+class SplitRulesSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=['EQUAL', 'PERCENTAGE', 'DEFAULT'])
+    percentages = serializers.DictField(
+        child=serializers.DecimalField(max_digits=5, decimal_places=2),
+        required=False
+    )
+
+class SplitPreviewSerializer(serializers.Serializer):
+    # Omitted: preview the account's own split rules
+    rules = SplitRulesSerializer(many=True, required=False)
+
+class ProposedShareSerializer(serializers.ModelSerializer):
+    member_name = serializers.CharField(source='member.name')
+
     class Meta:
         model = BillShare
-        fields = '__all__'
-        read_only_fields = ['original_amount', 'insurance_covered']
+        fields = [
+            'member', 'member_name', 'original_amount',
+            'insurance_covered', 'personal_responsibility'
+        ]
+
+class SplitJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SplitJob
+        fields = [
+            'id', 'bill', 'status', 'incremental', 'attempts', 'error',
+            'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+class MemberBalanceSerializer(serializers.ModelSerializer):
+    member_name = serializers.CharField(source='member.name', read_only=True)
+
+    class Meta:
+        model = MemberBalance
+        fields = [
+            'member', 'member_name', 'primary_account', 'billed', 'paid',
+            'outstanding', 'disputed', 'overdue', 'next_due_date', 'updated_at'
+        ]
+        read_only_fields = fields
 
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
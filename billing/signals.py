@@ -0,0 +1,142 @@
+# billing/signals.py
+from decimal import Decimal
+from django.db.models import Sum
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from accounts.models import PrimaryAccount, Member
+from insuranceprofile.accumulators import set_postings
+from .models import Bill, BillShare, PaymentHistory, Dispute
+from .balances import batching, create_balances, record_change
+from .calculators import accumulator_source
+from .rules import split_rule_cache
+from .status import schedule_status_update
+
+@receiver([post_save, post_delete], sender=PrimaryAccount)
+def invalidate_account_split_rules(sender, instance, **kwargs):
+    split_rule_cache.invalidate(instance.id)
+
+@receiver([post_save, post_delete], sender=Member)
+def invalidate_member_split_rules(sender, instance, **kwargs):
+    split_rule_cache.invalidate(instance.primary_account_id)
+
+@receiver(post_save, sender=Member)
+def create_member_balance(sender, instance, created, **kwargs):
+    if created:
+        create_balances([instance.id])
+
+@receiver(pre_save, sender=BillShare)
+def remember_previous_share(sender, instance, **kwargs):
+    """Keep the stored row around for the balance delta"""
+    instance._previous_share = None
+    if instance.pk and not batching():
+        instance._previous_share = BillShare.objects.filter(pk=instance.pk).values(
+            'member_id', 'personal_responsibility', 'status'
+        ).first()
+
+@receiver(post_save, sender=BillShare)
+def record_share_balance(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_share', None)
+    member_ids = {instance.member_id} | ({previous['member_id']} if previous else set())
+    record_change(
+        member_ids, BillShare.objects.filter(id=instance.id),
+        lambda rows: {instance.id: {**rows[instance.id], **previous}} if previous else {}
+    )
+
+@receiver(post_delete, sender=BillShare)
+def record_deleted_share_balance(sender, instance, **kwargs):
+    def before(rows):
+        # Payments were deleted (and accounted for) before their share
+        paid = PaymentHistory.objects.filter(
+            bill_share_id=instance.id, status='COMPLETED'
+        ).aggregate(total=Sum('amount'))['total']
+        return {instance.id: {
+            'id': instance.id,
+            'member_id': instance.member_id,
+            'personal_responsibility': instance.personal_responsibility,
+            'status': instance.status,
+            'bill__due_date': Bill.objects.filter(id=instance.bill_id).values_list('due_date', flat=True).first(),
+            'paid': paid or Decimal('0'),
+        }}
+    record_change([instance.member_id], BillShare.objects.none(), before, create=False)
+
+@receiver(pre_save, sender=PaymentHistory)
+def remember_previous_payment(sender, instance, **kwargs):
+    """Keep the stored row around for the balance delta"""
+    instance._previous_payment = None
+    if instance.pk and not batching():
+        instance._previous_payment = PaymentHistory.objects.filter(pk=instance.pk).values(
+            'bill_share_id', 'amount', 'status'
+        ).first()
+
+@receiver(post_save, sender=PaymentHistory)
+def record_payment_balance(sender, instance, **kwargs):
+    current = {'bill_share_id': instance.bill_share_id, 'amount': instance.amount, 'status': instance.status}
+    record_payment_change(getattr(instance, '_previous_payment', None), current)
+
+@receiver(post_delete, sender=PaymentHistory)
+def record_deleted_payment_balance(sender, instance, **kwargs):
+    previous = {'bill_share_id': instance.bill_share_id, 'amount': instance.amount, 'status': instance.status}
+    record_payment_change(previous, None)
+
+def record_payment_change(previous, current):
+    """Apply a payment write: only COMPLETED payments count as paid"""
+    completed = [
+        (payment['bill_share_id'], Decimal(str(payment['amount'])), sign)
+        for payment, sign in ((previous, 1), (current, -1))
+        if payment is not None and payment['status'] == 'COMPLETED'
+    ]
+    if not completed:
+        return
+    share_ids = {share_id for share_id, _, _ in completed}
+
+    def before(rows):
+        rows = {share_id: dict(row) for share_id, row in rows.items()}
+        for share_id, amount, sign in completed:
+            if share_id in rows:
+                rows[share_id]['paid'] += sign * amount
+        return rows
+    record_change(
+        BillShare.objects.filter(id__in=share_ids).values_list('member_id', flat=True),
+        BillShare.objects.filter(id__in=share_ids), before, create=current is not None
+    )
+
+@receiver(pre_save, sender=Bill)
+def remember_previous_due_date(sender, instance, **kwargs):
+    """Keep the stored due date around for the balance delta"""
+    instance._previous_due_date = None
+    if instance.pk and not batching():
+        instance._previous_due_date = Bill.objects.filter(
+            pk=instance.pk
+        ).values_list('due_date', flat=True).first()
+
+@receiver(post_save, sender=Bill)
+def record_due_date_balances(sender, instance, created, **kwargs):
+    # Due date changes move amounts between outstanding and overdue
+    previous = getattr(instance, '_previous_due_date', None)
+    due_date = Bill._meta.get_field('due_date').to_python(instance.due_date)
+    if created or previous is None or previous == due_date:
+        return
+    record_change(
+        instance.shares.values_list('member_id', flat=True), instance.shares.all(),
+        lambda rows: {
+            share_id: {**row, 'bill__due_date': previous} for share_id, row in rows.items()
+        }
+    )
+
+@receiver([post_save, post_delete], sender=BillShare)
+def update_share_bill_status(sender, instance, **kwargs):
+    schedule_status_update([instance.bill_id])
+
+@receiver([post_save, post_delete], sender=PaymentHistory)
+def update_payment_bill_status(sender, instance, **kwargs):
+    schedule_status_update(
+        BillShare.objects.filter(id=instance.bill_share_id).values_list('bill_id', flat=True)
+    )
+
+@receiver([post_save, post_delete], sender=Dispute)
+def update_dispute_bill_status(sender, instance, **kwargs):
+    schedule_status_update([instance.bill_id])
+
+@receiver(post_delete, sender=Bill)
+def reverse_bill_accumulations(sender, instance, **kwargs):
+    set_postings(accumulator_source(instance.id), {})
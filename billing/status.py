@@ -0,0 +1,100 @@
+# billing/status.py
+import threading
+from contextlib import contextmanager
+from django.db.models import Case, When, Value, Exists, OuterRef, F, CharField
+from .models import Bill, BillShare, PaymentHistory, Dispute
+
+OPEN_DISPUTE_STATUSES = ('OPEN', 'UNDER_REVIEW')
+
+_batch = threading.local()
+
+
+def derived_status():
+    """
+    Bill status as a SQL expression over the bill's shares and disputes
+
+    - DISPUTED: an open dispute or a DISPUTED share
+    - PAID: every share PAID
+    - PARTIAL: some share PAID or some payment COMPLETED
+    - PENDING: split but nothing paid yet
+    - Unsplit bills keep DRAFT / PENDING; other statuses fall back to PENDING
+    """
+    shares = BillShare.objects.filter(bill=OuterRef('pk'))
+    return Case(
+        When(
+            Exists(Dispute.objects.filter(bill=OuterRef('pk'), status__in=OPEN_DISPUTE_STATUSES))
+            | Exists(shares.filter(status='DISPUTED')),
+            then=Value('DISPUTED'),
+        ),
+        When(~Exists(shares), status__in=['DRAFT', 'PENDING'], then=F('status')),
+        When(~Exists(shares), then=Value('PENDING')),
+        When(~Exists(shares.exclude(status='PAID')), then=Value('PAID')),
+        When(
+            Exists(shares.filter(status='PAID'))
+            | Exists(PaymentHistory.objects.filter(bill_share__bill=OuterRef('pk'), status='COMPLETED')),
+            then=Value('PARTIAL'),
+        ),
+        default=Value('PENDING'),
+        output_field=CharField(),
+    )
+
+
+def update_bill_statuses(bills=None):
+    """
+    Recompute Bill.status for a set of bills in one UPDATE statement
+
+    Only rows whose status actually changes are written. Used for a
+    single bill after each share, payment or dispute write, and in bulk
+    (every bill of many accounts) by the update_bill_statuses command.
+
+    Usage Example:
+    --------------
+    update_bill_statuses(Bill.objects.filter(id=bill.id))
+    update_bill_statuses(Bill.objects.filter(primary_account_id__in=[12, 40]))
+
+    :param bills: Bill queryset (default: every bill)
+    :return: Number of bills whose status changed
+    """
+    bills = Bill.objects.all() if bills is None else bills
+    return bills.alias(derived=derived_status()).exclude(
+        status=F('derived')
+    ).update(status=derived_status())
+
+
+def schedule_status_update(bill_ids):
+    """Update bill statuses now, or at the end of the enclosing batched_status_update()"""
+    pending = getattr(_batch, 'bills', None)
+    if pending is None:
+        update_bill_statuses(Bill.objects.filter(id__in=bill_ids))
+    else:
+        pending.update(bill_ids)
+
+
+@contextmanager
+def batched_status_update(bill_ids=()):
+    """
+    Update the status of every bill touched inside the block once, at its end
+
+    Share, payment and dispute writes otherwise update their bill's
+    status per row. Bulk writes send no signals: list their bills in
+    bill_ids.
+
+    Usage Example:
+    --------------
+    with transaction.atomic(), batched_status_update([bill.id]):
+        bill.shares.all().delete()
+        BillShare.objects.bulk_create(shares)
+    """
+    if getattr(_batch, 'bills', None) is not None:
+        # Nested: the outermost block updates
+        _batch.bills.update(bill_ids)
+        yield
+        return
+    _batch.bills = set(bill_ids)
+    try:
+        yield
+        bills = _batch.bills
+    finally:
+        _batch.bills = None
+    if bills:
+        update_bill_statuses(Bill.objects.filter(id__in=bills))
@@ -1,10 +1,40 @@
 # billing/tests/test_models.py
+import csv
+import json
+import random
+import tempfile
+from datetime import timedelta
 from decimal import Decimal
-from django.test import TestCase
+from io import StringIO
+from itertools import islice
+from pathlib import Path
+from unittest import mock
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.management import call_command, CommandError
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
 from django.core.exceptions import ValidationError
+from django.db import connection, transaction, IntegrityError
+from django.test.utils import CaptureQueriesContext
 from accounts.models import User, PrimaryAccount, Member
-from insuranceprofile.models import InsuranceProfile
-from billing.models import Bill, LineItem, BillShare, PaymentHistory, Dispute, CharityRoundUp
+from insuranceprofile.cache import coverage_rules, result_cache
+from insuranceprofile.models import InsuranceProfile, Coverage, AccumulatorEntry
+from insuranceprofile.network_index import network_index
+from billing.models import Bill, LineItem, BillShare, PaymentHistory, Dispute, CharityRoundUp, SplitJob, MemberBalance
+from billing.allocation import allocate, allocate_many, rule_weights, to_cents, from_cents
+from billing.calculators import BillSplitter
+from billing.rules import split_rule_cache
+from insuranceprofile.calculators import InsuranceCalculator
+from insuranceprofile.accumulators import rollover_accumulators
+from billing.jobs import enqueue_split, claim_jobs, run_job
+from billing.importers import BillImporter, read_csv, read_837
+from billing.exporters import export_rows
+from billing.balances import compute_balances
+from billing.remittance import RemittanceReconciler, read_835
+from billing.status import update_bill_statuses
+from billing.fingerprints import flag_duplicates
+from billing.management.commands.split_bills import Command as SplitBillsCommand
 
 class BillModelTest(TestCase):
     """Test cases for the Bill model"""
@@ -312,4 +342,1328 @@ class DisputeModelTest(TestCase):
         
         self.assertIsNotNone(dispute.resolved_at)
 
-   
\ No newline at end of file
+   
+
+class SplitFixtures:
+    """Family with one insured patient and a bill with two line items"""
+
+    def setUp(self):
+        coverage_rules.clear()
+        network_index.clear()
+        result_cache.clear()
+        user = User.objects.create(email="splitter@example.com")
+        self.primary_account = PrimaryAccount.objects.create(
+            user=user,
+            name="Split Family",
+            phone="+1234567890",
+            address="Test Address",
+            split_rules_json={'method': 'EQUAL'}
+        )
+        self.patient = self.add_members(1)[0]
+        policy = InsuranceProfile.objects.create(
+            member=self.patient, provider_name="Plan", policy_number="SPLIT1",
+            effective_date="2023-01-01", expiration_date="2030-12-31",
+            insurance_type="PPO", is_primary=True, deductible=Decimal("100.00"),
+            out_of_pocket_max=Decimal("5000.00")
+        )
+        Coverage.objects.create(
+            insurance_profile=policy, service_type="CPT100",
+            coverage_percentage=Decimal("80.00"), network_tier="OUT"
+        )
+        self.policy = policy
+        self.bill = Bill.objects.create(
+            primary_account=self.primary_account,
+            provider_name="Test Provider",
+            provider_npi="1234567890",
+            total_amount=Decimal("600.00"),
+            service_date="2023-10-01",
+            due_date="2023-11-01"
+        )
+        LineItem.objects.create(
+            bill=self.bill, member=self.patient, procedure_code="CPT100",
+            description="Covered", amount=Decimal("500.00")
+        )
+        LineItem.objects.create(
+            bill=self.bill, procedure_code="CPT200",
+            description="No patient on file", amount=Decimal("100.00")
+        )
+        self.bill.refresh_from_db()
+
+    def add_members(self, count):
+        start = self.primary_account.members.count()
+        return [
+            Member.objects.create(
+                primary_account=self.primary_account,
+                name=f"Member {number}",
+                email=f"member{number}@example.com",
+                relationship="CHILD"
+            )
+            for number in range(start, start + count)
+        ]
+
+
+class BillSplitterTest(SplitFixtures, TestCase):
+    """Test cases for BillSplitter share creation"""
+
+    def policy_accumulated(self):
+        return InsuranceProfile.objects.with_pending_accumulated().get(pk=self.policy.pk).accumulated
+
+    def split_queries(self):
+        result_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            BillSplitter(self.bill).calculate_shares()
+        return len(queries)
+
+    def test_equal_split_with_insurance(self):
+        self.add_members(1)
+        BillSplitter(self.bill).calculate_shares()
+
+        # Covered item: 100 deductible + 80% of 400 covered, 80 left to pay;
+        # the item without a patient is paid in full by the family
+        shares = list(self.bill.shares.all())
+        self.assertEqual(len(shares), 2)
+        for share in shares:
+            self.assertEqual(share.personal_responsibility, Decimal("90.00"))
+            self.assertEqual(share.insurance_covered, Decimal("420.00"))
+
+        covered, uncovered = self.bill.line_items.all()
+        self.assertEqual(covered.insurance_coverage, self.policy)
+        self.assertTrue(covered.covered_service)
+        self.assertIsNone(uncovered.insurance_coverage)
+        self.assertFalse(uncovered.covered_service)
+
+    def test_equal_split_sums_to_total(self):
+        self.add_members(2)
+        BillSplitter(self.bill).calculate_shares()
+        amounts = sorted(
+            self.bill.shares.values_list('personal_responsibility', flat=True), reverse=True
+        )
+        self.assertEqual(amounts, [Decimal("60.00"), Decimal("60.00"), Decimal("60.00")])
+
+        self.primary_account.split_rules_json = {
+            'method': 'PERCENTAGE',
+            'percentages': {str(m.id): p for m, p in zip(self.primary_account.members.all(), [50, 25, 25])}
+        }
+        self.primary_account.save()
+        LineItem.objects.filter(procedure_code="CPT200").update(amount=Decimal("100.01"))
+        self.bill.refresh_from_db()
+        BillSplitter(self.bill).calculate_shares()
+        amounts = sorted(
+            self.bill.shares.values_list('personal_responsibility', flat=True), reverse=True
+        )
+        self.assertEqual(sum(amounts), Decimal("180.01"))
+        self.assertEqual(amounts, [Decimal("90.01"), Decimal("45.00"), Decimal("45.00")])
+
+    def test_resplit_replaces_shares(self):
+        BillSplitter(self.bill).calculate_shares()
+        BillSplitter(self.bill).calculate_shares()
+        self.assertEqual(self.bill.shares.count(), 1)
+
+    def test_query_count_independent_of_family_size(self):
+        self.add_members(2)
+        self.split_queries()
+        small = self.split_queries()
+        self.add_members(30)
+        self.split_queries()
+        self.assertEqual(self.split_queries(), small)
+        self.assertEqual(self.bill.shares.count(), 33)
+
+    def test_replacing_shares_updates_status_once(self):
+        self.add_members(2)
+        BillSplitter(self.bill).calculate_shares()
+        self.add_members(1)
+        small = self.split_queries()
+        self.add_members(30)
+        self.assertEqual(self.split_queries(), small)
+        self.assertEqual(self.bill.shares.count(), 34)
+        self.bill.refresh_from_db()
+        self.assertEqual(self.bill.status, 'PENDING')
+
+    def test_split_posts_applied_amounts_once(self):
+        BillSplitter(self.bill).calculate_shares()
+        # 100 deductible + 20% of the remaining 400
+        self.assertEqual(self.policy_accumulated(), Decimal("180.00"))
+
+        BillSplitter(self.bill).calculate_shares()
+        self.assertEqual(AccumulatorEntry.objects.count(), 1)
+        self.assertEqual(self.bill.shares.get().personal_responsibility, Decimal("180.00"))
+
+        LineItem.objects.filter(procedure_code="CPT100").update(amount=Decimal("600.00"))
+        BillSplitter(self.bill).calculate_shares(incremental=True)
+        self.assertEqual(self.policy_accumulated(), Decimal("200.00"))
+
+    def test_postings_of_past_plan_years_are_left_alone(self):
+        BillSplitter(self.bill).calculate_shares()
+        AccumulatorEntry.objects.update(created_at=timezone.now() - timedelta(days=400))
+        rollover_accumulators([InsuranceProfile.objects.get(pk=self.policy.pk)], timezone.localdate())
+        self.assertEqual(self.policy_accumulated(), Decimal("0.00"))
+
+        # Re-split: counted in the current plan year, as adjudicated
+        LineItem.objects.filter(procedure_code="CPT100").update(amount=Decimal("600.00"))
+        BillSplitter(self.bill).calculate_shares()
+        self.assertEqual(self.policy_accumulated(), Decimal("200.00"))
+
+        self.bill.delete()
+        self.assertEqual(self.policy_accumulated(), Decimal("0.00"))
+        self.assertTrue(AccumulatorEntry.objects.filter(amount=Decimal("180.00")).exists())
+
+    def test_later_bills_see_earlier_postings(self):
+        BillSplitter(self.bill).calculate_shares()
+        bill = Bill.objects.create(
+            primary_account=self.primary_account, provider_name="Test Provider",
+            provider_npi="1234567890", total_amount=Decimal("500.00"),
+            service_date="2023-10-02", due_date="2023-11-01"
+        )
+        LineItem.objects.create(
+            bill=bill, member=self.patient, procedure_code="CPT100",
+            description="Covered", amount=Decimal("500.00")
+        )
+        bill.refresh_from_db()
+        BillSplitter(bill).calculate_shares()
+        # Deductible already met by the first bill: 20% of 500
+        self.assertEqual(bill.shares.get().personal_responsibility, Decimal("100.00"))
+
+        self.bill.delete()
+        self.assertEqual(self.policy_accumulated(), Decimal("100.00"))
+
+    def test_incremental_split_adjudicates_changed_items_only(self):
+        self.add_members(1)
+        BillSplitter(self.bill).calculate_shares()
+        share_ids = set(self.bill.shares.values_list('id', flat=True))
+
+        LineItem.objects.create(
+            bill=self.bill, member=self.patient, procedure_code="CPT100",
+            description="Follow-up", amount=Decimal("200.00")
+        )
+        with mock.patch.object(
+            InsuranceCalculator, 'calculate_many', wraps=InsuranceCalculator.calculate_many
+        ) as calculate_many:
+            BillSplitter(self.bill).calculate_shares(incremental=True)
+        self.assertEqual(len(calculate_many.call_args.args[0]), 1)
+
+        # Shares were updated in place and match a full split
+        incremental = {s.id: s.personal_responsibility for s in self.bill.shares.all()}
+        self.assertEqual(set(incremental), share_ids)
+        result_cache.clear()
+        BillSplitter(self.bill).calculate_shares()
+        self.assertEqual(
+            {s.id: s.personal_responsibility for s in self.bill.shares.all()}, incremental
+        )
+
+    def test_incremental_split_after_edit_and_removal(self):
+        BillSplitter(self.bill).calculate_shares()
+        covered, uncovered = self.bill.line_items.all()
+        covered.amount = Decimal("1000.00")
+        covered.save()
+        uncovered.delete()
+
+        BillSplitter(self.bill).calculate_shares(incremental=True)
+        # 100 deductible + 80% of 900 covered, 180 left to pay
+        share = self.bill.shares.get()
+        self.assertEqual(share.personal_responsibility, Decimal("180.00"))
+        self.assertEqual(share.insurance_covered, Decimal("820.00"))
+
+    def test_failed_split_keeps_existing_shares(self):
+        BillSplitter(self.bill).calculate_shares()
+        self.primary_account.split_rules_json = {'method': 'PERCENTAGE', 'percentages': {'1': 50}}
+        self.primary_account.save()
+        self.bill.refresh_from_db()
+        with self.assertRaises(ValueError):
+            BillSplitter(self.bill).calculate_shares()
+        self.assertEqual(self.bill.shares.count(), 1)
+
+
+class SplitJobTest(TestCase):
+    """Test cases for queued bill splits"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="jobs@example.com")
+        primary_account = PrimaryAccount.objects.create(
+            user=self.user,
+            name="Queue Family",
+            phone="+1234567890",
+            address="Test Address",
+            split_rules_json={'method': 'EQUAL'}
+        )
+        Member.objects.create(
+            primary_account=primary_account,
+            name="Test Member",
+            email="queue@example.com",
+            relationship="CHILD"
+        )
+        self.bill = Bill.objects.create(
+            primary_account=primary_account,
+            provider_name="Test Provider",
+            provider_npi="1234567890",
+            total_amount=Decimal("0.00"),
+            service_date="2023-10-01",
+            due_date="2023-11-01"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_async_split_returns_job(self):
+        url = reverse('bill-split', args=[self.bill.id])
+        response = self.client.post(url + '?async=true')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'QUEUED')
+        self.assertEqual(self.bill.shares.count(), 0)
+
+        # Queuing again while the job waits reuses it
+        again = self.client.post(url + '?async=true')
+        self.assertEqual(again.data['id'], response.data['id'])
+
+        status_url = reverse('split-job-detail', args=[response.data['id']])
+        self.assertEqual(self.client.get(status_url).data['status'], 'QUEUED')
+
+        call_command('split_worker', workers=1, once=True, stdout=StringIO())
+        self.assertEqual(self.client.get(status_url).data['status'], 'SUCCEEDED')
+        self.assertEqual(self.bill.shares.count(), 1)
+
+    def test_claim_marks_running(self):
+        job = enqueue_split(self.bill)
+        claimed = claim_jobs('worker-1', limit=5)
+        self.assertEqual([j.id for j in claimed], [job.id])
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'RUNNING')
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(claim_jobs('worker-2'), [])
+
+    def test_abandoned_job_claimed_again(self):
+        job = enqueue_split(self.bill)
+        claim_jobs('crashed-worker')
+        SplitJob.objects.filter(id=job.id).update(
+            started_at=timezone.now() - timedelta(hours=1)
+        )
+        claimed = claim_jobs('worker-2', lease=600)
+        self.assertEqual(claimed[0].attempts, 2)
+        self.assertEqual(claimed[0].worker, 'worker-2')
+
+    def test_failed_split_recorded(self):
+        self.bill.primary_account.split_rules_json = {'method': 'PERCENTAGE', 'percentages': {}}
+        self.bill.primary_account.save()
+        job = enqueue_split(self.bill)
+        with self.assertLogs('billing.jobs', level='ERROR'):
+            self.assertFalse(run_job(claim_jobs('worker-1')[0]))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertEqual(job.error, "No percentages provided for split")
+
+    def test_other_accounts_cannot_poll(self):
+        job = enqueue_split(self.bill)
+        stranger = APIClient()
+        stranger.force_authenticate(user=User.objects.create(email="other@example.com"))
+        response = stranger.get(reverse('split-job-detail', args=[job.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class AllocationTest(TestCase):
+    """Test cases for the integer-cents allocation kernel"""
+
+    def test_shares_sum_to_total(self):
+        self.assertEqual(allocate(10000, [1, 1, 1]), [3334, 3333, 3333])
+        self.assertEqual(allocate(999, [6000, 4000]), [599, 400])
+        self.assertEqual(allocate(-100, [1, 1, 1]), [-34, -33, -33])
+        self.assertEqual(allocate(5, [0, 1, 0]), [0, 5, 0])
+
+    def test_largest_remainder_wins(self):
+        # Exact shares 3.3, 3.6 and 3.1 cents
+        self.assertEqual(allocate(10, [33, 36, 31]), [3, 4, 3])
+
+    def test_random_totals_always_balance(self):
+        rng = random.Random(14)
+        for _ in range(1000):
+            weights = [rng.randint(0, 10000) for _ in range(rng.randint(1, 8))]
+            weights[0] += 1
+            total = rng.randint(0, 10 ** 9)
+            self.assertEqual(sum(allocate(total, weights)), total)
+
+    def test_allocate_many(self):
+        self.assertEqual(
+            allocate_many([100, 101], [1, 1]), [[50, 50], [51, 50]]
+        )
+
+    def test_all_zero_weights_rejected(self):
+        with self.assertRaises(ValueError):
+            allocate(100, [0, 0])
+
+    def test_rule_weights(self):
+        members = [
+            Member(id=1, relationship='WIFE'),
+            Member(id=2, relationship='CHILD'),
+        ]
+        self.assertEqual(rule_weights({'method': 'EQUAL'}, members), [1, 1])
+        self.assertEqual(rule_weights({}, members), [1, 0])
+        others = [Member(relationship=relationship) for relationship in ('PARENT', 'OTHER', 'PRIMARY')]
+        self.assertEqual(rule_weights({'method': 'DEFAULT'}, others), [1, 0, 1])
+        self.assertEqual(
+            rule_weights({'method': 'PERCENTAGE', 'percentages': {'1': 66.5, '2': '33.5'}}, members),
+            [6650, 3350]
+        )
+        with self.assertRaises(ValueError):
+            rule_weights({'method': 'PERCENTAGE', 'percentages': {'1': 60}}, members)
+        with self.assertRaises(ValueError):
+            rule_weights({'method': 'PERCENTAGE', 'percentages': {'1': 'half', '2': 50}}, members)
+        with self.assertRaises(ValueError):
+            rule_weights({'method': 'PERCENTAGE', 'percentages': {'1': 60, '999': 40}}, members)
+        with self.assertRaises(ValueError):
+            rule_weights({'method': 'PERCENTAGE', 'percentages': [60, 40]}, members)
+
+    def test_conversions(self):
+        self.assertEqual(to_cents(Decimal('12.345')), 1235)
+        self.assertEqual(to_cents('0.1'), 10)
+        self.assertEqual(from_cents(1235), Decimal('12.35'))
+
+
+class SplitBillsCommandTest(TestCase):
+    """Test cases for the split_bills management command"""
+
+    def setUp(self):
+        self.accounts = []
+        for number, rules in enumerate([{'method': 'EQUAL'}, {'method': 'EQUAL'}, {}]):
+            account = PrimaryAccount.objects.create(
+                user=User.objects.create(email=f"bulk{number}@example.com"),
+                name=f"Bulk Family {number}",
+                phone="+1234567890",
+                address="Test Address",
+                split_rules_json=rules
+            )
+            Member.objects.create(
+                primary_account=account,
+                name="Only Child",
+                email=f"bulkchild{number}@example.com",
+                relationship="CHILD"
+            )
+            for _ in range(2):
+                Bill.objects.create(
+                    primary_account=account,
+                    provider_name="Test Provider",
+                    provider_npi="1234567890",
+                    total_amount=Decimal("0.00"),
+                    service_date="2023-10-01",
+                    due_date="2023-11-01"
+                )
+            self.accounts.append(account)
+
+    def test_failures_do_not_abort_run(self):
+        out, err = StringIO(), StringIO()
+        with self.assertLogs('billing.jobs', level='WARNING'):
+            call_command('split_bills', workers=1, chunk_size=1, stdout=out, stderr=err)
+        self.assertEqual(BillShare.objects.count(), 4)
+        self.assertIn("Split 4 bills, 2 failed", out.getvalue())
+        self.assertIn("No adults found for default split", err.getvalue())
+
+    def test_account_and_unsplit_filters(self):
+        call_command('split_bills', workers=1, account=[self.accounts[0].id], stdout=StringIO())
+        self.assertEqual(BillShare.objects.count(), 2)
+        out = StringIO()
+        with self.assertLogs('billing.jobs', level='WARNING'):
+            call_command('split_bills', workers=1, unsplit=True, stdout=out, stderr=StringIO())
+        self.assertIn("Split 2 bills, 2 failed", out.getvalue())
+
+    def test_chunks_keep_accounts_together(self):
+        command = SplitBillsCommand()
+        rows = [(1, 10), (1, 11), (1, 12), (2, 20), (3, 30), (3, 31)]
+        self.assertEqual(
+            command._chunks(rows, 2), [[10, 11, 12], [20, 30, 31]]
+        )
+
+
+
+class SplitBillsParallelTest(TransactionTestCase):
+    """Runs split_bills through the process pool (committed data, real workers)"""
+
+    def setUp(self):
+        if connection.is_in_memory_db():
+            self.skipTest("Worker processes cannot see an in-memory test database")
+        for number in range(2):
+            account = PrimaryAccount.objects.create(
+                user=User.objects.create(email=f"parallel{number}@example.com"),
+                name=f"Parallel Family {number}",
+                phone="+1234567890",
+                address="Test Address",
+                split_rules_json={'method': 'EQUAL'}
+            )
+            Member.objects.create(
+                primary_account=account,
+                name="Partner",
+                email=f"parallelpartner{number}@example.com",
+                relationship="WIFE"
+            )
+            Bill.objects.create(
+                primary_account=account,
+                provider_name="Test Provider",
+                provider_npi="1234567890",
+                total_amount=Decimal("0.00"),
+                service_date="2023-10-01",
+                due_date="2023-11-01"
+            )
+
+    def test_workers_split_every_bill(self):
+        out = StringIO()
+        call_command('split_bills', workers=2, chunk_size=1, stdout=out, stderr=StringIO())
+        self.assertIn("Split 2 bills, 0 failed", out.getvalue())
+        self.assertEqual(BillShare.objects.count(), 2)
+
+class SplitPreviewTest(SplitFixtures, TestCase):
+    """Test cases for the split/preview action"""
+
+    def setUp(self):
+        super().setUp()
+        self.spouse = Member.objects.create(
+            primary_account=self.primary_account,
+            name="Spouse",
+            email="spouse@example.com",
+            relationship="WIFE"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.primary_account.user)
+        self.url = reverse('bill-split-preview', args=[self.bill.id])
+
+    def test_previews_several_rule_sets_without_writes(self):
+        rules = [
+            {'method': 'EQUAL'},
+            {'method': 'PERCENTAGE', 'percentages': {
+                str(self.patient.id): '75', str(self.spouse.id): '25'
+            }},
+            {'method': 'DEFAULT'},
+            {'method': 'PERCENTAGE', 'percentages': {str(self.patient.id): '50'}},
+        ]
+        with mock.patch.object(
+            InsuranceCalculator, 'calculate_many', wraps=InsuranceCalculator.calculate_many
+        ) as calculate_many:
+            response = self.client.post(self.url, {'rules': rules}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calculate_many.call_count, 1)
+
+        self.assertEqual(response.data['total_personal'], Decimal("180.00"))
+        equal, percentage, default, invalid = response.data['previews']
+        self.assertEqual(
+            [s['personal_responsibility'] for s in equal['shares']], ['90.00', '90.00']
+        )
+        self.assertEqual(
+            [s['personal_responsibility'] for s in percentage['shares']], ['135.00', '45.00']
+        )
+        self.assertEqual(default['shares'][0]['member_name'], "Spouse")
+        self.assertEqual(invalid['error'], "Percentages must sum to 100")
+
+        self.assertEqual(self.bill.shares.count(), 0)
+        self.assertFalse(self.bill.line_items.exclude(adjudication_key='').exists())
+
+    def test_preview_matches_full_split_after_coverage_change(self):
+        BillSplitter(self.bill).calculate_shares()
+        coverage = Coverage.objects.get(insurance_profile=self.policy)
+        coverage.coverage_percentage = Decimal("50.00")
+        coverage.save()
+        response = self.client.post(self.url, {}, format='json')
+        # 100 deductible + 50% of the remaining 400, plus the uncovered 100
+        self.assertEqual(response.data['total_personal'], Decimal("300.00"))
+
+        BillSplitter(self.bill).calculate_shares()
+        self.assertEqual(
+            [s['personal_responsibility'] for s in response.data['previews'][0]['shares']],
+            [str(share.personal_responsibility) for share in self.bill.shares.order_by('member_id')]
+        )
+
+    def test_invalid_rules_rejected(self):
+        response = self.client.post(self.url, {'rules': [{'method': 'RANDOM'}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SplitRuleCacheTest(SplitFixtures, TestCase):
+    """Test cases for compiled, cached split rules"""
+
+    def setUp(self):
+        super().setUp()
+        split_rule_cache.clear()
+        self.add_members(1)
+
+    def split_amounts(self):
+        BillSplitter(self.bill).calculate_shares()
+        return sorted(self.bill.shares.values_list('personal_responsibility', flat=True))
+
+    def test_rules_compiled_once(self):
+        with mock.patch('billing.rules.rule_weights', wraps=rule_weights) as parse:
+            for _ in range(3):
+                BillSplitter(self.bill).calculate_shares()
+        self.assertEqual(parse.call_count, 1)
+
+    def test_rule_and_membership_changes_recompile(self):
+        self.assertEqual(self.split_amounts(), [Decimal("90.00"), Decimal("90.00")])
+
+        self.add_members(1)
+        self.assertEqual(self.split_amounts(), [Decimal("60.00")] * 3)
+
+        members = list(self.primary_account.members.all())
+        self.primary_account.split_rules_json = {'method': 'PERCENTAGE', 'percentages': {
+            str(members[0].id): 50, str(members[1].id): 50
+        }}
+        self.primary_account.save()
+        self.bill.refresh_from_db()
+        self.assertEqual(
+            self.split_amounts(), [Decimal("0.00"), Decimal("90.00"), Decimal("90.00")]
+        )
+
+    def test_stale_entry_not_applied(self):
+        self.split_amounts()
+        # A change made without signals (e.g. by another process)
+        PrimaryAccount.objects.filter(id=self.primary_account.id).update(
+            split_rules_json={'method': 'PERCENTAGE', 'percentages': {str(self.patient.id): 100}}
+        )
+        self.bill.refresh_from_db()
+        self.bill.primary_account.refresh_from_db()
+        self.assertEqual(self.split_amounts(), [Decimal("0.00"), Decimal("180.00")])
+
+    def test_relationship_change_recompiles(self):
+        self.primary_account.split_rules_json = {'method': 'DEFAULT'}
+        self.primary_account.save()
+        Member.objects.filter(id=self.patient.id).update(relationship='WIFE')
+        self.bill.refresh_from_db()
+        self.assertEqual(self.split_amounts(), [Decimal("180.00")])
+        # Changed without signals: same member ids, another adult
+        Member.objects.exclude(id=self.patient.id).update(relationship='PARENT')
+        self.bill.refresh_from_db()
+        self.assertEqual(self.split_amounts(), [Decimal("90.00"), Decimal("90.00")])
+
+    def test_invalid_rules_fail_every_split(self):
+        self.primary_account.split_rules_json = {'method': 'PERCENTAGE', 'percentages': {'1': 10}}
+        self.primary_account.save()
+        self.bill.refresh_from_db()
+        with mock.patch('billing.rules.rule_weights', wraps=rule_weights) as parse:
+            for _ in range(2):
+                with self.assertRaisesMessage(ValueError, "Percentages must sum to 100"):
+                    BillSplitter(self.bill).calculate_shares()
+        self.assertEqual(parse.call_count, 1)
+
+
+class BillPayloadFixtures:
+    """Authenticated account and bill creation payloads"""
+
+    def setUp(self):
+        user = User.objects.create(email="create@example.com")
+        self.primary_account = PrimaryAccount.objects.create(
+            user=user,
+            name="Create Family",
+            phone="+1234567890",
+            address="Test Address"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+
+    def payload(self, items):
+        return {
+            'primary_account': self.primary_account.id,
+            'provider_name': "City Hospital",
+            'provider_npi': "1234567890",
+            'total_amount': "5000.00",
+            'service_date': "2023-10-01",
+            'due_date': "2023-11-01",
+            'line_items': [
+                {
+                    'procedure_code': f"CPT{number}",
+                    'description': "Procedure",
+                    'amount': f"{number}.00",
+                }
+                for number in range(1, items + 1)
+            ],
+        }
+
+class BillCreateTest(BillPayloadFixtures, TestCase):
+    """Test cases for creating bills with their line items"""
+
+    def create(self, items):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('bill-list'), self.payload(items), format='json')
+        self.assertEqual(response.status_code, 201)
+        return response, len(queries)
+
+    @override_settings(BILL_LINE_ITEM_BATCH_SIZE=500)
+    def test_line_items_inserted_in_bulk(self):
+        small, small_queries = self.create(3)
+        large, large_queries = self.create(300)
+        # A few INSERTs at most (SQLite caps rows per INSERT by its variable limit)
+        self.assertLessEqual(large_queries, small_queries + 3)
+        self.assertEqual(len(large.data['line_items']), 300)
+        self.assertEqual(LineItem.objects.filter(bill_id=large.data['id']).count(), 300)
+
+    @override_settings(BILL_LINE_ITEM_BATCH_SIZE=100)
+    def test_response_built_from_created_items(self):
+        response, _ = self.create(250)
+        items = response.data['line_items']
+        self.assertTrue(all(item['id'] for item in items))
+        self.assertEqual([item['amount'] for item in items[:2]], ["1.00", "2.00"])
+        self.assertEqual(items[0]['bill'], response.data['id'])
+        self.assertEqual(response.data['shares'], [])
+        self.assertEqual(list(response.data)[:3], ['id', 'line_items', 'shares'])
+
+    def test_failed_insert_rolls_back_bill(self):
+        with mock.patch.object(LineItem.objects, 'bulk_create', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                self.client.post(reverse('bill-list'), self.payload(2), format='json')
+        self.assertFalse(Bill.objects.exists())
+
+
+class BillListTest(TestCase):
+    """Test cases for listing bills"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="list@example.com")
+        self.primary_account = PrimaryAccount.objects.create(
+            user=self.user,
+            name="List Family",
+            phone="+1234567890",
+            address="Test Address"
+        )
+        self.member = Member.objects.create(
+            primary_account=self.primary_account,
+            name="Test Member",
+            email="lister@example.com",
+            relationship="CHILD"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('bill-list')
+
+    def add_bills(self, count, status='PENDING', due_date="2023-11-01"):
+        bills = []
+        for _ in range(count):
+            bill = Bill.objects.create(
+                primary_account=self.primary_account,
+                provider_name="Test Provider",
+                provider_npi="1234567890",
+                total_amount=Decimal("100.00"),
+                service_date="2023-10-01",
+                due_date=due_date,
+                status=status
+            )
+            for code in ("CPT1", "CPT2"):
+                LineItem.objects.create(
+                    bill=bill, procedure_code=code, description="Item", amount=Decimal("50.00")
+                )
+            # Bill status follows its shares and payments
+            share = BillShare.objects.create(
+                bill=bill, member=self.member, original_amount=Decimal("100.00"),
+                insurance_covered=Decimal("0.00"), personal_responsibility=Decimal("100.00"),
+                status='PAID' if status == 'PAID' else 'PENDING'
+            )
+            if status == 'PARTIAL':
+                PaymentHistory.objects.create(
+                    bill_share=share, amount=Decimal("50.00"), payment_method="CARD",
+                    transaction_id="TX", status="COMPLETED"
+                )
+            bills.append(bill)
+        return bills
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_no_queries_per_bill(self):
+        self.add_bills(2)
+        few = self.list_queries()
+        self.add_bills(20)
+        self.assertEqual(self.list_queries(), few)
+
+    def test_nested_line_items_and_shares(self):
+        self.add_bills(1)
+        bill = self.client.get(self.url).data['results'][0]
+        self.assertEqual(len(bill['line_items']), 2)
+        self.assertEqual(bill['shares'][0]['member'], self.member.id)
+
+    def test_cursor_pages_newest_first(self):
+        bills = self.add_bills(5)
+        seen = []
+        url = self.url + '?page_size=2'
+        while url:
+            page = self.client.get(url).data
+            seen.extend(bill['id'] for bill in page['results'])
+            url = page['next']
+        self.assertEqual(seen, [bill.id for bill in reversed(bills)])
+
+    def test_status_and_due_date_filters(self):
+        pending = self.add_bills(1, status='PENDING', due_date="2024-01-15")
+        partial = self.add_bills(1, status='PARTIAL', due_date="2024-02-15")
+        self.add_bills(1, status='PAID', due_date="2024-03-15")
+
+        def ids(query):
+            return {bill['id'] for bill in self.client.get(self.url + query).data['results']}
+
+        self.assertEqual(ids('?status=PENDING,PARTIAL'), {pending[0].id, partial[0].id})
+        self.assertEqual(
+            ids('?due_after=2024-02-01&due_before=2024-03-01'), {partial[0].id}
+        )
+        response = self.client.get(self.url + '?due_after=soon')
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_accounts_hidden(self):
+        self.add_bills(1)
+        stranger = APIClient()
+        stranger.force_authenticate(user=User.objects.create(email="nosy@example.com"))
+        self.assertEqual(stranger.get(self.url).data['results'], [])
+
+
+class ImportBillsTest(SplitFixtures, TestCase):
+    CSV = (
+        "account_id,bill_reference,provider_name,provider_npi,total_amount,"
+        "service_date,due_date,member_id,procedure_code,description,amount\n"
+        "{account},A1,Clinic,1111111111,,2024-01-10,2024-02-10,{member},CPT100,Visit,120.00\n"
+        "{account},A1,Clinic,1111111111,,2024-01-10,2024-02-10,,CPT200,Lab,30.50\n"
+        "{account},A2,Clinic,1111111111,99.00,2024-01-11,2024-02-11,,CPT300,X-ray,99.00\n"
+        "999999,A3,Clinic,1111111111,10.00,2024-01-12,2024-02-12,,CPT300,X-ray,10.00\n"
+        "{account},A4,Clinic,1111111111,10.00,not-a-date,2024-02-12,,CPT300,X-ray,ten\n"
+    )
+    X12 = (
+        "ISA*00*          *00*          *ZZ*SUBMITTER      *ZZ*RECEIVER       "
+        "*240115*1200*^*00501*000000001*0*P*:~"
+        "GS*HC*SUBMITTER*RECEIVER*20240115*1200*1*X*005010X222A1~"
+        "ST*837*0001*005010X222A1~"
+        "HL*1**20*1~NM1*85*2*CITY CLINIC*****XX*2222222222~"
+        "HL*2*1*22*0~NM1*IL*1*DOE*JANE****MI*SPLIT1~"
+        "CLM*C1*150***11:B:1*Y*A*Y*Y~"
+        "LX*1~SV1*HC:CPT100*100*UN*1***1~DTP*472*D8*20240105~"
+        "LX*2~SV1*HC:CPT200:25*50*UN*1***1~NTE*ADD*Follow-up~DTP*472*D8*20240106~"
+        "CLM*C2*75***11:B:1*Y*A*Y*Y~"
+        "LX*1~SV1*HC:CPT300*75*UN*1***1~DTP*472*D8*20240107~"
+        "HL*3*1*22*0~NM1*IL*1*ROE*RICHARD****MI*UNKNOWN~"
+        "CLM*C3*10***11:B:1*Y*A*Y*Y~LX*1~SV1*HC:CPT300*10*UN*1***1~DTP*472*D8*20240108~"
+        "SE*20*0001~GE*1*1~IEA*1*000000001~"
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = Path(self.directory.name) / name
+        path.write_text(content)
+        return path
+
+    def imported(self):
+        return Bill.objects.exclude(id=self.bill.id).order_by('id')
+
+    def test_csv_rows_grouped_into_bills(self):
+        csv_file = StringIO(self.CSV.format(account=self.primary_account.id, member=self.patient.id))
+        rejects = StringIO()
+        importer = BillImporter(chunk_size=2, rejects=rejects)
+        self.assertEqual(importer.run(read_csv(csv_file)), 4)
+
+        first, second = self.imported()
+        self.assertEqual(first.total_amount, Decimal("150.50"))
+        self.assertEqual(first.status, 'PENDING')
+        self.assertEqual(
+            list(first.line_items.order_by('id').values_list('member_id', 'amount')),
+            [(self.patient.id, Decimal("120.00")), (None, Decimal("30.50"))]
+        )
+        self.assertEqual(second.line_items.count(), 1)
+
+        rejected = [json.loads(line) for line in rejects.getvalue().splitlines()]
+        self.assertEqual([reject['reference'] for reject in rejected], ['A3', 'A4'])
+        self.assertEqual(rejected[0]['line'], 5)
+        self.assertIn('service_date', rejected[1]['errors'])
+        self.assertIn('line_items[0].amount', rejected[1]['errors'])
+
+    def test_member_of_another_account_rejected(self):
+        other = PrimaryAccount.objects.create(
+            user=User.objects.create(email="other@example.com"), name="Other",
+            phone="+1234567891", address="Elsewhere"
+        )
+        csv_file = StringIO(self.CSV.format(account=other.id, member=self.patient.id))
+        importer = BillImporter(rejects=StringIO())
+        importer.run(islice(read_csv(csv_file), 1))
+        self.assertEqual(importer.rejected, 1)
+        self.assertFalse(self.imported().exists())
+
+    def test_837_claims(self):
+        # A tiny block size makes segments straddle reads
+        records = list(read_837(StringIO(self.X12), due_days=30, block_size=7))
+        self.assertEqual([record['reference'] for record in records], ['C1', 'C2', 'C3'])
+        self.assertEqual(records[0]['bill']['provider_npi'], '2222222222')
+        self.assertEqual(records[0]['bill']['service_date'], '2024-01-05')
+        self.assertEqual(records[0]['bill']['due_date'], '2024-02-04')
+        self.assertEqual(
+            [(item['procedure_code'], item['description']) for item in records[0]['line_items']],
+            [('CPT100', 'CPT100'), ('CPT200', 'Follow-up')]
+        )
+
+        importer = BillImporter(rejects=StringIO())
+        importer.run(iter(records))
+        self.assertEqual(importer.rejected, 1)
+        bill = self.imported().first()
+        self.assertEqual(bill.primary_account, self.primary_account)
+        self.assertEqual(bill.total_amount, Decimal("150.00"))
+        self.assertEqual(set(bill.line_items.values_list('member_id', flat=True)), {self.patient.id})
+
+    def test_one_transaction_per_account_chunk(self):
+        csv_file = StringIO(self.CSV.format(account=self.primary_account.id, member=self.patient.id))
+        records = list(islice(read_csv(csv_file), 2))
+        with CaptureQueriesContext(connection) as queries:
+            BillImporter().import_chunk(records)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)  # Bills, then line items
+
+    def test_command_resumes_from_checkpoint(self):
+        source = self.write('bills.csv', self.CSV.format(account=self.primary_account.id, member=self.patient.id))
+        checkpoint = Path(self.directory.name) / 'checkpoint.json'
+        checkpoint.write_text(json.dumps({'source': str(source.resolve()), 'records': 1}))
+        rejects = Path(self.directory.name) / 'rejects.jsonl'
+
+        call_command(
+            'import_bills', str(source), chunk_size=1, checkpoint=str(checkpoint),
+            rejects=str(rejects), stdout=StringIO()
+        )
+        self.assertEqual(list(self.imported().values_list('total_amount', flat=True)), [Decimal("99.00")])
+        self.assertEqual(json.loads(checkpoint.read_text())['records'], 4)
+        self.assertEqual(len(rejects.read_text().splitlines()), 2)
+
+    def test_command_refuses_other_files_checkpoint(self):
+        source = self.write('bills.csv', "")
+        checkpoint = self.write('checkpoint.json', json.dumps({'source': '/elsewhere.csv', 'records': 3}))
+        with self.assertRaises(CommandError):
+            call_command('import_bills', str(source), checkpoint=str(checkpoint), stdout=StringIO())
+
+
+class BillingExportTest(TestCase):
+    """Test cases for the streaming exports"""
+
+    def setUp(self):
+        self.user = User.objects.create(email="export@example.com")
+        self.primary_account = PrimaryAccount.objects.create(
+            user=self.user,
+            name="Export Family",
+            phone="+1234567890",
+            address="Test Address"
+        )
+        self.member = Member.objects.create(
+            primary_account=self.primary_account,
+            name="Test Member",
+            email="exporter@example.com",
+            relationship="WIFE"
+        )
+        self.bills = []
+        for status in ('PENDING', 'PAID', 'PENDING'):
+            bill = Bill.objects.create(
+                primary_account=self.primary_account,
+                provider_name="Test Provider",
+                provider_npi="1234567890",
+                total_amount=Decimal("100.00"),
+                service_date="2023-10-01",
+                due_date="2023-11-01",
+                status=status
+            )
+            share = BillShare.objects.create(
+                bill=bill, member=self.member, original_amount=Decimal("100.00"),
+                insurance_covered=Decimal("0.00"), personal_responsibility=Decimal("100.00"),
+                status=status
+            )
+            PaymentHistory.objects.create(
+                bill_share=share, amount=Decimal("25.50"), payment_method="CARD",
+                transaction_id=f"TX{bill.id}", status="COMPLETED"
+            )
+            self.bills.append(bill)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def lines(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_bills_ndjson_resumes_after_cursor(self):
+        url = reverse('bill-export')
+        rows = [json.loads(line) for line in self.lines(self.client.get(url))]
+        self.assertEqual([row['id'] for row in rows], [bill.id for bill in self.bills])
+        self.assertEqual(rows[0]['total_amount'], "100.00")
+
+        rows = [json.loads(line) for line in self.lines(self.client.get(f"{url}?after={rows[0]['id']}"))]
+        self.assertEqual([row['id'] for row in rows], [bill.id for bill in self.bills[1:]])
+
+        rows = self.lines(self.client.get(f"{url}?status=PAID"))
+        self.assertEqual([json.loads(line)['id'] for line in rows], [self.bills[1].id])
+
+    def test_shares_and_payments_csv(self):
+        response = self.client.get(reverse('bill-export-shares') + '?output=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = self.lines(response)
+        self.assertTrue(lines[0].startswith('id,bill_id,member_id'))
+        self.assertEqual(len(lines), 4)
+
+        lines = self.lines(self.client.get(reverse('payment-export') + '?output=csv'))
+        self.assertIn(f",{self.bills[0].id},25.50,CARD,TX{self.bills[0].id},", lines[1])
+
+    def test_invalid_parameters(self):
+        url = reverse('bill-export')
+        self.assertEqual(self.client.get(url + '?output=xml').status_code, 400)
+        self.assertEqual(self.client.get(url + '?after=last').status_code, 400)
+
+    def test_other_accounts_hidden(self):
+        stranger = APIClient()
+        stranger.force_authenticate(user=User.objects.create(email="nosy@example.com"))
+        self.assertEqual(self.lines(stranger.get(reverse('payment-export'))), [])
+
+    def test_rows_fetched_in_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(export_rows('bills', chunk_size=2))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len(queries), 1)  # One query, read in chunks
+
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            'export_billing', 'payments', account=[self.primary_account.id],
+            after=PaymentHistory.objects.order_by('id').first().id,
+            stdout=out, stderr=StringIO()
+        )
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+
+class MemberBalanceTest(SplitFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.share = BillSplitter(self.bill).calculate_shares()[0]
+        self.owed = self.share.personal_responsibility
+
+    def balance(self, member=None):
+        return MemberBalance.objects.get(member=member or self.patient)
+
+    def pay(self, amount, status='COMPLETED'):
+        return PaymentHistory.objects.create(
+            bill_share=self.share, amount=Decimal(amount), payment_method="CARD",
+            transaction_id="TX", status=status
+        )
+
+    def test_split_writes_balance(self):
+        balance = self.balance()
+        self.assertEqual(balance.primary_account, self.primary_account)
+        self.assertEqual(balance.billed, self.owed)
+        self.assertEqual(balance.outstanding, self.owed)
+        self.assertEqual(balance.overdue, self.owed)  # Bill was due in 2023
+
+    def test_payments_update_balance(self):
+        self.pay("50.00")
+        self.pay("500.00", status='PENDING')
+        balance = self.balance()
+        self.assertEqual(balance.paid, Decimal("50.00"))
+        self.assertEqual(balance.outstanding, self.owed - Decimal("50.00"))
+
+        self.pay("9999.00")
+        self.assertEqual(self.balance().outstanding, Decimal("0.00"))
+
+    def test_disputed_share(self):
+        self.share.status = 'DISPUTED'
+        self.share.save()
+        balance = self.balance()
+        self.assertEqual((balance.outstanding, balance.disputed), (Decimal("0.00"), self.owed))
+
+    def test_rolled_back_with_payment(self):
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                self.pay("50.00")
+                raise IntegrityError("payment provider declined")
+        self.assertEqual(self.balance().paid, Decimal("0.00"))
+
+    def test_stale_overdue_refreshed_on_read(self):
+        Bill.objects.filter(id=self.bill.id).update(due_date=timezone.localdate() - timedelta(days=1))
+        MemberBalance.objects.filter(member=self.patient).update(
+            overdue=0, next_due_date=timezone.localdate() - timedelta(days=1)
+        )
+        client = APIClient()
+        client.force_authenticate(user=self.primary_account.user)
+        rows = client.get(reverse('balance-list')).data
+        self.assertEqual(len(rows), self.primary_account.members.count())
+        row = next(row for row in rows if row['member'] == self.patient.id)
+        self.assertEqual(Decimal(row['overdue']), self.owed)
+        self.assertIsNone(row['next_due_date'])
+
+    def test_future_due_date(self):
+        self.bill.due_date = timezone.localdate() + timedelta(days=10)
+        self.bill.save()
+        balance = self.balance()
+        self.assertEqual(balance.overdue, Decimal("0.00"))
+        self.assertEqual(balance.next_due_date, self.bill.due_date)
+
+    def test_resplit_updates_balances_once(self):
+        self.add_members(2)
+        with mock.patch('billing.balances.compute_balances', wraps=compute_balances) as compute, \
+                CaptureQueriesContext(connection) as queries:
+            BillSplitter(self.bill).calculate_shares(incremental=True)
+        self.assertEqual(compute.call_count, 0)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "billing_memberbalance"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            MemberBalance.objects.filter(primary_account=self.primary_account, billed__gt=0).count(), 3
+        )
+
+    def test_payment_applies_delta(self):
+        # Not recomputed: a concurrent write's delta survives this one
+        MemberBalance.objects.filter(member=self.patient).update(paid=1000)
+        with mock.patch('billing.balances.compute_balances', wraps=compute_balances) as compute:
+            payment = self.pay("50.00", status='PENDING')
+            self.assertEqual(self.balance().paid, Decimal("1000.00"))
+            payment.status = 'COMPLETED'
+            payment.save()
+            self.assertEqual(self.balance().paid, Decimal("1050.00"))
+            payment.delete()
+        self.assertEqual(compute.call_count, 0)
+        self.assertEqual(self.balance().paid, Decimal("1000.00"))
+
+    def test_share_moved_and_deleted(self):
+        other = self.add_members(1)[0]
+        self.pay("50.00")
+        self.share.member = other
+        self.share.save()
+        self.assertEqual((self.balance().billed, self.balance().paid), (Decimal("0.00"), Decimal("0.00")))
+        self.assertEqual(self.balance(other).outstanding, self.owed - Decimal("50.00"))
+
+        self.bill.delete()
+        balance = self.balance(other)
+        self.assertEqual((balance.billed, balance.paid, balance.outstanding), (0, 0, 0))
+
+    def test_member_deleted_with_shares(self):
+        self.pay("50.00")
+        self.patient.delete()
+        self.assertFalse(MemberBalance.objects.filter(member_id=self.patient.id).exists())
+
+    def test_rebuild_command(self):
+        MemberBalance.objects.filter(member=self.patient).update(outstanding=1)
+        out, err = StringIO(), StringIO()
+        call_command('rebuild_balances', check=True, stdout=out, stderr=err)
+        self.assertIn(f"member {self.patient.id}", err.getvalue())
+        self.assertEqual(self.balance().outstanding, Decimal("1.00"))
+
+        call_command('rebuild_balances', stdout=StringIO())
+        self.assertEqual(self.balance().outstanding, self.owed)
+        out = StringIO()
+        call_command('rebuild_balances', check=True, stdout=out, stderr=StringIO())
+        self.assertIn("0 balances differ", out.getvalue())
+
+
+class RemittanceTest(SplitFixtures, TestCase):
+    X12 = (
+        "ISA*00*          *00*          *ZZ*PAYER          *ZZ*RECEIVER       "
+        "*240201*1200*^*00501*000000002*0*P*:~"
+        "GS*HP*PAYER*RECEIVER*20240201*1200*2*X*005010X221A1~ST*835*0001~"
+        "BPR*I*155*C*ACH~TRN*1*EFT123*1512345678~"
+        "CLP*TX-A*1*100*100**12*CLAIM1~SVC*HC:CPT100*100*100~"
+        "CLP*TX-B*1*50*45**12*CLAIM2~"
+        "CLP*TX-C*22*-20*-20**12*CLAIM3~"
+        "CLP*TX-D*4*30*0**12*CLAIM4~"
+        "CLP*TX-Z*1*10*10**12*CLAIM5~"
+        "CLP*TX-A*1*100*100**12*CLAIM1~"
+        "CLP*TX-E*1*X*oops**12*CLAIM6~"
+        "SE*12*0001~GE*1*2~IEA*1*000000002~"
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.share = BillSplitter(self.bill).calculate_shares()[0]
+        self.payments = {
+            transaction_id: PaymentHistory.objects.create(
+                bill_share=self.share, amount=Decimal(amount), payment_method="ACH",
+                transaction_id=transaction_id, status=status
+            )
+            for transaction_id, amount, status in (
+                ("TX-A", "100.00", 'PENDING'), ("TX-B", "50.00", 'PENDING'),
+                ("TX-C", "20.00", 'COMPLETED'), ("TX-D", "30.00", 'PENDING'),
+            )
+        }
+
+    def statuses(self):
+        return {
+            payment.transaction_id: payment.status
+            for payment in PaymentHistory.objects.filter(id__in=[p.id for p in self.payments.values()])
+        }
+
+    def test_read_835(self):
+        lines = list(read_835(StringIO(self.X12), block_size=5))
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(lines[0], {
+            'line': 6, 'transaction_id': 'TX-A', 'amount': '100',
+            'status_code': '1', 'trace': 'EFT123'
+        })
+
+    def test_reconcile(self):
+        report = StringIO()
+        reconciler = RemittanceReconciler(chunk_size=3, exceptions=report)
+        counts = reconciler.run(read_835(StringIO(self.X12)))
+        self.assertEqual(self.statuses(), {
+            "TX-A": 'COMPLETED', "TX-B": 'PENDING', "TX-C": 'FAILED', "TX-D": 'FAILED',
+        })
+        self.assertEqual(counts['completed'], 1)
+        rows = list(csv.DictReader(StringIO(report.getvalue())))
+        self.assertEqual(
+            [(row['transaction_id'], row['reason']) for row in rows],
+            [("TX-B", 'amount_mismatch'), ("TX-Z", 'unmatched'),
+             ("TX-A", 'already_completed'), ("TX-E", 'invalid_amount')]
+        )
+        self.assertEqual(rows[0]['payment_id'], str(self.payments["TX-B"].id))
+        self.assertEqual(MemberBalance.objects.get(member=self.patient).paid, Decimal("100.00"))
+
+    def test_share_paid_in_full(self):
+        self.payments["TX-A"].amount = self.share.personal_responsibility - Decimal("20.00")
+        self.payments["TX-A"].save()
+        RemittanceReconciler().reconcile_chunk([{
+            'line': 1, 'transaction_id': 'TX-A', 'amount': str(self.payments["TX-A"].amount),
+            'status_code': '1', 'trace': '',
+        }])
+        self.share.refresh_from_db()
+        self.assertEqual(self.share.status, 'PAID')
+        self.assertEqual(MemberBalance.objects.get(member=self.patient).outstanding, Decimal("0.00"))
+
+    def test_chunk_queries_do_not_grow_with_lines(self):
+        lines = [
+            {'line': n, 'transaction_id': f"TX-{n}", 'amount': '1', 'status_code': '1', 'trace': ''}
+            for n in range(200)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            RemittanceReconciler(dry_run=True).reconcile_chunk(lines)
+        self.assertEqual(len(queries), 1)
+
+    def test_command_dry_run(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'remit.835'
+        path.write_text(self.X12)
+        out, err = StringIO(), StringIO()
+        call_command('reconcile_remittance', str(path), exceptions='-', dry_run=True, stdout=out, stderr=err)
+        self.assertEqual(self.statuses()["TX-A"], 'PENDING')
+        self.assertIn("TX-Z", out.getvalue())
+        self.assertIn("Matched 3 of 7", err.getvalue())
+
+
+class BillStatusTest(SplitFixtures, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_members(1)
+        self.shares = BillSplitter(self.bill).calculate_shares()
+
+    def status(self):
+        self.bill.refresh_from_db()
+        return self.bill.status
+
+    def test_follows_shares_payments_and_disputes(self):
+        self.assertEqual(self.status(), 'PENDING')
+
+        PaymentHistory.objects.create(
+            bill_share=self.shares[0], amount=Decimal("10.00"), payment_method="CARD",
+            transaction_id="TX", status="COMPLETED"
+        )
+        self.assertEqual(self.status(), 'PARTIAL')
+
+        for share in self.shares:
+            share.status = 'PAID'
+            share.save()
+        self.assertEqual(self.status(), 'PAID')
+
+        dispute = Dispute.objects.create(bill=self.bill, initiator=self.patient, reason="Wrong code")
+        self.assertEqual(self.status(), 'DISPUTED')
+        dispute.status = 'RESOLVED'
+        dispute.save()
+        self.assertEqual(self.status(), 'PAID')
+
+    def test_unsplit_bills_keep_their_status(self):
+        bill = Bill.objects.create(
+            primary_account=self.primary_account, provider_name="Test Provider",
+            provider_npi="1234567890", total_amount=Decimal("10.00"),
+            service_date="2023-10-01", due_date="2023-11-01", status='DRAFT'
+        )
+        self.assertEqual(update_bill_statuses(Bill.objects.filter(id=bill.id)), 0)
+        Bill.objects.filter(id=bill.id).update(status='PAID')
+        update_bill_statuses(Bill.objects.filter(id=bill.id))
+        bill.refresh_from_db()
+        self.assertEqual(bill.status, 'PENDING')
+
+    def test_bulk_update_is_one_statement(self):
+        Bill.objects.update(status='DISPUTED')
+        with CaptureQueriesContext(connection) as queries:
+            changed = update_bill_statuses(Bill.objects.filter(primary_account=self.primary_account))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(changed, 1)
+        self.assertEqual(self.status(), 'PENDING')
+
+    def test_command(self):
+        Bill.objects.update(status='PAID')
+        out = StringIO()
+        call_command('update_bill_statuses', account=[self.primary_account.id], stdout=out)
+        self.assertIn("status of 1 bills", out.getvalue())
+        self.assertEqual(self.status(), 'PENDING')
+
+
+class DuplicateBillTest(BillPayloadFixtures, TestCase):
+    """Test cases for flagging re-uploaded bills"""
+
+    def post(self, payload):
+        response = self.client.post(reverse('bill-list'), payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data
+
+    def test_exact_and_near_duplicates(self):
+        original = self.post(self.payload(3))
+        self.assertIsNone(original['duplicate_of'])
+        self.assertEqual(len(original['fingerprint']), 40)
+
+        # Paper copy: other descriptions and item order, same content
+        copy = self.payload(3)
+        copy['line_items'].reverse()
+        for item in copy['line_items']:
+            item['description'] = "Scanned"
+        copy['provider_name'] = "CITY HOSPITAL"
+        copy = self.post(copy)
+        self.assertEqual((copy['duplicate_of'], copy['duplicate_match']), (original['id'], 'EXACT'))
+
+        near = self.payload(3)
+        near['line_items'][0]['procedure_code'] = "CPT9"
+        near = self.post(near)
+        self.assertEqual((near['duplicate_of'], near['duplicate_match']), (original['id'], 'NEAR'))
+
+        other = self.payload(3)
+        other['service_date'] = "2023-10-02"
+        self.assertIsNone(self.post(other)['duplicate_of'])
+
+    def test_other_accounts_bills_are_not_duplicates(self):
+        self.post(self.payload(2))
+        other = PrimaryAccount.objects.create(
+            user=User.objects.create(email="other@example.com"), name="Other",
+            phone="+1234567891", address="Elsewhere"
+        )
+        self.assertEqual(flag_duplicates([(
+            Bill(primary_account=other, provider_npi="1234567890", service_date="2023-10-01",
+                 total_amount=Decimal("5000.00")), []
+        )]), [])
+
+    def test_duplicate_split_needs_force(self):
+        self.post(self.payload(1))
+        copy = self.post(self.payload(1))
+        url = reverse('bill-split', args=[copy['id']])
+        with mock.patch.object(BillSplitter, 'calculate_shares') as calculate:
+            response = self.client.post(url)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.data['duplicate_match'], 'EXACT')
+            calculate.assert_not_called()
+
+            self.client.post(url + '?force=true')
+            calculate.assert_called_once()
+
+    def test_duplicates_within_an_import_chunk(self):
+        csv_file = StringIO(
+            "account_id,bill_reference,provider_name,provider_npi,total_amount,"
+            "service_date,due_date,member_id,procedure_code,description,amount\n"
+            + "".join(
+                f"{self.primary_account.id},{reference},Clinic,1111111111,,2024-01-10,"
+                f"2024-02-10,,CPT100,Visit,{amount}\n"
+                for reference, amount in (("A1", "10.00"), ("A2", "20.00"), ("A3", "10.00"))
+            )
+        )
+        BillImporter().run(read_csv(csv_file))
+        first, second, third = Bill.objects.order_by('id')
+        self.assertIsNone(first.duplicate_of)
+        self.assertIsNone(second.duplicate_of)
+        self.assertEqual((third.duplicate_of, third.duplicate_match), (first, 'EXACT'))
+
+    def test_fingerprint_command(self):
+        bill = Bill.objects.get(id=self.post(self.payload(2))['id'])
+        Bill.objects.update(fingerprint='', match_key='')
+        call_command('fingerprint_bills', stdout=StringIO())
+        fingerprint = Bill.objects.get(id=bill.id).fingerprint
+        self.assertEqual(fingerprint, bill.fingerprint)
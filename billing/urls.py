@@ -1,13 +1,18 @@
 # billing/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BillViewSet, PaymentViewSet, DisputeViewSet, CharityViewSet
+from .views import (
+    BillViewSet, PaymentViewSet, DisputeViewSet, CharityViewSet, SplitJobViewSet,
+    MemberBalanceViewSet
+)
 
 router = DefaultRouter()
 router.register(r'bills', BillViewSet, basename='bill')
 router.register(r'payments', PaymentViewSet, basename='payment')
 router.register(r'disputes', DisputeViewSet, basename='dispute')
 router.register(r'charity', CharityViewSet, basename='charity')
+router.register(r'split-jobs', SplitJobViewSet, basename='split-job')
+router.register(r'balances', MemberBalanceViewSet, basename='balance')
 
 urlpatterns = [
     path('', include(router.urls)),
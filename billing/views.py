@@ -1,30 +1,118 @@
 # billing/views.py
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from .models import Bill, CharityRoundUp, LineItem, BillShare, PaymentHistory, Dispute
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from .models import Bill, CharityRoundUp, LineItem, BillShare, PaymentHistory, Dispute, SplitJob, MemberBalance
 from .serializers import (
     BillSerializer, CharityRoundUpSerializer, LineItemSerializer,
     BillShareSerializer, PaymentSerializer,
-    DisputeSerializer
+    DisputeSerializer, SplitJobSerializer, SplitPreviewSerializer,
+    ProposedShareSerializer, MemberBalanceSerializer
 )
 from .calculators import BillSplitter
+from .jobs import enqueue_split
+from .balances import refresh_stale_balances
+from .pagination import BillCursorPagination
+from .exporters import CONTENT_TYPES, OUTPUTS, export_rows, for_accounts, render
+
+
+def export_response(request, kind, queryset):
+    """
+    Stream an export as CSV or NDJSON with constant memory
+
+    ?output=csv|ndjson (default ndjson) picks the encoding and
+    ?after=<id> resumes after the last row received.
+    """
+    output = request.query_params.get('output', 'ndjson')
+    if output not in OUTPUTS:
+        raise ValidationError({'output': f"Choose one of: {', '.join(OUTPUTS)}."})
+    after = request.query_params.get('after')
+    if after is not None:
+        try:
+            after = int(after)
+        except ValueError:
+            raise ValidationError({'after': "Enter the id of the last row received."})
+
+    rows = export_rows(
+        kind, queryset, after=after,
+        chunk_size=getattr(settings, 'BILLING_EXPORT_CHUNK_SIZE', 2000)
+    )
+    response = StreamingHttpResponse(render(rows, kind, output), content_type=CONTENT_TYPES[output])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{output}"'
+    return response
 
 class BillViewSet(viewsets.ModelViewSet):
+    """
+    Bills of the user's account, newest first
+    
+    Listing is cursor paginated and can be filtered with
+    ?status=PENDING,PARTIAL&due_after=2024-01-01&due_before=2024-03-31
+    """
     serializer_class = BillSerializer
     queryset = Bill.objects.all()
+    pagination_class = BillCursorPagination
 
     def get_queryset(self):
-        return self.queryset.filter(
+        queryset = self.queryset.filter(
             primary_account__user=self.request.user
         )
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.prefetch_related('line_items', 'shares')
+        if self.action == 'list':
+            queryset = self._filter(queryset)
+        return queryset
+
+    def _filter(self, queryset):
+        params = self.request.query_params
+        if params.get('status'):
+            queryset = queryset.filter(status__in=params['status'].split(','))
+        for param, lookup in (('due_after', 'due_date__gte'), ('due_before', 'due_date__lte')):
+            if params.get(param):
+                try:
+                    due = parse_date(params[param])
+                except ValueError:
+                    due = None
+                if due is None:
+                    raise ValidationError({param: "Enter a date in YYYY-MM-DD format."})
+                queryset = queryset.filter(**{lookup: due})
+        return queryset
 
     @action(detail=True, methods=['post'])
     def split(self, request, pk=None):
+        """
+        Split the bill now, or with ?async=true queue it for the
+        split_worker command and answer 202 with the job to poll
+        
+        ?incremental=true only adjudicates line items added or changed
+        since the last split.
+        
+        Bills flagged as a copy of another bill answer 409 Conflict
+        unless ?force=true.
+        """
         bill = self.get_object()
+        if bill.duplicate_of_id and not self._flag(request, 'force'):
+            return Response(
+                {
+                    "error": "This bill looks like a copy of another bill; split with ?force=true to proceed",
+                    "duplicate_of": bill.duplicate_of_id,
+                    "duplicate_match": bill.duplicate_match,
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        incremental = self._flag(request, 'incremental')
+        if self._flag(request, 'async'):
+            job = enqueue_split(bill, incremental=incremental)
+            return Response(
+                SplitJobSerializer(job, context={'request': request}).data,
+                status=status.HTTP_202_ACCEPTED
+            )
         splitter = BillSplitter(bill)
         try:
-            splitter.calculate_shares()
+            splitter.calculate_shares(incremental=incremental)
             return Response(
                 {"status": "Bill split calculated successfully"},
                 status=status.HTTP_200_OK
@@ -35,6 +123,64 @@ class BillViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=True, methods=['post'], url_path='split/preview', url_name='split-preview')
+    def split_preview(self, request, pk=None):
+        """
+        Proposed shares of the bill under one or several split rule sets
+        
+        Nothing is written; line items are adjudicated once for all rule
+        sets, always in full, so the preview matches what a full split
+        would write.
+        """
+        bill = self.get_object()
+        serializer = SplitPreviewSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        rule_sets = serializer.validated_data.get('rules') or [
+            bill.primary_account.split_rules_json or {}
+        ]
+
+        splitter = BillSplitter(bill)
+        try:
+            splitter.adjudicate()
+        except Exception as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        previews = []
+        for rules in rule_sets:
+            preview = {"rules": rules}
+            try:
+                shares = splitter.preview(rules)
+            except ValueError as e:
+                preview["error"] = str(e)
+            else:
+                preview["shares"] = ProposedShareSerializer(shares, many=True).data
+            previews.append(preview)
+        return Response({
+            "total_insurance": splitter.total_insurance,
+            "total_personal": splitter.total_personal,
+            "previews": previews,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Every bill of the account as a stream, oldest first
+        
+        Takes the listing's status / due date filters.
+        """
+        queryset = self._filter(for_accounts('bills', Bill.objects.all(), user=request.user))
+        return export_response(request, 'bills', queryset)
+
+    @action(detail=False, methods=['get'], url_path='shares/export', url_name='export-shares')
+    def export_shares(self, request):
+        """Every bill share of the account as a stream, oldest first"""
+        queryset = for_accounts('shares', BillShare.objects.all(), user=request.user)
+        return export_response(request, 'shares', queryset)
+
+    def _flag(self, request, name):
+        return request.query_params.get(name, '').lower() in ('1', 'true')
+
     @action(detail=True, methods=['post'])
     def add_line_item(self, request, pk=None):
         bill = self.get_object()
@@ -44,6 +190,33 @@ class BillViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class SplitJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Status of queued bill splits, for clients polling after a 202
+    """
+    serializer_class = SplitJobSerializer
+    queryset = SplitJob.objects.all()
+
+    def get_queryset(self):
+        return self.queryset.filter(
+            bill__primary_account__user=self.request.user
+        )
+
+class MemberBalanceViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    What each member of the account owes, one stored row per member
+    
+    Rows whose overdue amount went stale (a due date passed since they
+    were written) are refreshed before being returned.
+    """
+    serializer_class = MemberBalanceSerializer
+    queryset = MemberBalance.objects.select_related('member').order_by('member_id')
+
+    def get_queryset(self):
+        queryset = self.queryset.filter(primary_account__user=self.request.user)
+        refresh_stale_balances(queryset)
+        return queryset
+
 class PaymentViewSet(viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
     queryset = PaymentHistory.objects.all()
@@ -53,6 +226,11 @@ class PaymentViewSet(viewsets.ModelViewSet):
             bill_share__member__primary_account__user=self.request.user
         )
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Every payment of the account as a stream, oldest first"""
+        return export_response(request, 'payments', self.get_queryset())
+
 class DisputeViewSet(viewsets.ModelViewSet):
     serializer_class = DisputeSerializer
     queryset = Dispute.objects.all()
@@ -0,0 +1,52 @@
+# billing/x12.py
+
+
+class X12Reader:
+    """
+    Streams the segments of an X12 interchange (837, 835, ...)
+
+    Separators are read from the fixed-width ISA header, falling back to
+    the usual '*', ':' and '~'. The file is read block by block, so
+    memory use does not depend on its size.
+
+    Usage Example:
+    --------------
+    reader = X12Reader(open('remit.835'))
+    for number, elements in reader:
+        if elements[0] == 'CLP':
+            ...
+    """
+
+    def __init__(self, fileobj, block_size=65536):
+        self.fileobj = fileobj
+        self.block_size = block_size
+        self.head = fileobj.read(106)
+        self.element, self.component, self.terminator = '*', ':', '~'
+        if self.head.startswith('ISA') and len(self.head) == 106:
+            self.element, self.component, self.terminator = self.head[3], self.head[104], self.head[105]
+
+    def __iter__(self):
+        """Yield (segment number, list of elements), numbered from 1"""
+        for number, segment in enumerate(self._segments(), start=1):
+            yield number, [element.strip() for element in segment.split(self.element)]
+
+    def _segments(self):
+        pending = self.head
+        while True:
+            *complete, pending = pending.split(self.terminator)
+            for segment in complete:
+                segment = segment.strip()
+                if segment:
+                    yield segment
+            block = self.fileobj.read(self.block_size)
+            if not block:
+                break
+            pending += block
+        pending = pending.strip()
+        if pending:
+            yield pending
+
+
+def element(elements, index):
+    """Element at index, '' when the segment is shorter"""
+    return elements[index] if index < len(elements) else ''
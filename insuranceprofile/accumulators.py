@@ -0,0 +1,219 @@
+# insurance/accumulators.py
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+from .models import InsuranceProfile, AccumulatorEntry
+from .cache import result_cache
+from .signals import now_and_on_commit
+
+
+def post_accumulation(policy, amount, source=''):
+    """
+    Record an amount applied to a policy's deductible / OOP accumulator
+
+    A plain INSERT: no lock on the InsuranceProfile row is taken, so
+    concurrent postings for the same family don't serialize.
+
+    :param policy: InsuranceProfile the amount counts against
+    :param amount: Decimal amount (negative to reverse an earlier posting)
+    :param source: Free-form reference, e.g. "bill:42"
+    """
+    return AccumulatorEntry.objects.create(
+        insurance_profile=policy, amount=amount, source=source
+    )
+
+
+def post_accumulations(postings):
+    """
+    Bulk variant of post_accumulation
+
+    :param postings: Iterable of (policy, amount, source) tuples
+    """
+    entries = []
+    member_ids = set()
+    for policy, amount, source in postings:
+        entries.append(AccumulatorEntry(
+            insurance_profile=policy, amount=amount, source=source
+        ))
+        member_ids.add(policy.member_id)
+    AccumulatorEntry.objects.bulk_create(entries)
+    # bulk_create sends no post_save, so invalidate cached results here
+    for member_id in member_ids:
+        now_and_on_commit(result_cache.bump, member_id)
+    return entries
+
+
+def posted_amounts(source, counted_only=False):
+    """
+    Net amount posted under a source, per policy
+
+    :param counted_only: Leave out entries from before the policy's current
+                         plan year, which no longer count towards it
+    :return: Dict of policy_id → Decimal (zero nets omitted)
+    """
+    entries = AccumulatorEntry.objects.filter(source=source)
+    if counted_only:
+        entries = entries.filter(created_at__date__gte=Coalesce(
+            'insurance_profile__accumulator_period_start', 'insurance_profile__effective_date'
+        ))
+    totals = entries.order_by().values('insurance_profile_id').annotate(
+        total=Sum('amount')
+    ).values_list('insurance_profile_id', 'total')
+    return {policy_id: total for policy_id, total in totals if total}
+
+
+def set_postings(source, amounts):
+    """
+    Post what brings a source's net postings to the given amounts
+
+    Only the difference to what the source already posted is written, so
+    posting the same amounts again writes nothing, and posting {} reverses
+    the source entirely. Postings from before a policy's current plan year
+    are left alone: they no longer count, so differences are taken against
+    (and written to) the current plan year only. Policies that no longer
+    exist are skipped.
+
+    Usage Example:
+    --------------
+    set_postings("bill:42", {policy.id: Decimal("180.00")})  # split
+    set_postings("bill:42", {})                              # bill deleted
+
+    :param source: Source reference, e.g. "bill:42"
+    :param amounts: Dict of policy_id → Decimal
+    :return: Entries written
+    """
+    posted = posted_amounts(source, counted_only=True)
+    deltas = {
+        policy_id: amounts.get(policy_id, Decimal('0')) - posted.get(policy_id, Decimal('0'))
+        for policy_id in amounts.keys() | posted.keys()
+    }
+    deltas = {policy_id: delta for policy_id, delta in deltas.items() if delta}
+    if not deltas:
+        return []
+    policies = InsuranceProfile.objects.in_bulk(deltas)
+    return post_accumulations(
+        (policies[policy_id], delta, source)
+        for policy_id, delta in deltas.items() if policy_id in policies
+    )
+
+
+def compact_accumulators(batch_size=5000):
+    """
+    Fold pending ledger entries into InsuranceProfile.yearly_accumulated
+
+    Each batch flags its entries compacted and adds their per-policy sum
+    to yearly_accumulated with an F() increment in the same transaction,
+    so yearly_accumulated + pending entries never changes while compacting.
+    If another compactor claimed some of the batch first, the batch is
+    rolled back and retried with fresh rows.
+
+    :return: Number of entries compacted
+    """
+    compacted = 0
+    while True:
+        with transaction.atomic():
+            entries = list(
+                AccumulatorEntry.objects.filter(compacted=False)
+                .order_by('id')
+                .values_list('id', 'insurance_profile_id', 'amount')[:batch_size]
+            )
+            if not entries:
+                return compacted
+
+            claimed = AccumulatorEntry.objects.filter(
+                id__in=[entry_id for entry_id, _, _ in entries],
+                compacted=False
+            ).update(compacted=True)
+            if claimed != len(entries):
+                transaction.set_rollback(True)
+                continue
+
+            totals = defaultdict(Decimal)
+            for _, policy_id, amount in entries:
+                totals[policy_id] += amount
+            for policy_id, delta in totals.items():
+                InsuranceProfile.objects.filter(pk=policy_id).update(
+                    yearly_accumulated=F('yearly_accumulated') + delta
+                )
+        compacted += len(entries)
+
+
+def plan_year_start(effective_date, as_of):
+    """
+    Start of the plan year containing as_of for a policy
+
+    Plan years run from each anniversary of the effective date; a
+    February 29th effective date rolls over on February 28th in common years.
+    """
+    if as_of < effective_date:
+        return effective_date
+    year = as_of.year
+    while True:
+        try:
+            start = effective_date.replace(year=year)
+        except ValueError:
+            start = date(year, 2, 28)
+        if start <= as_of:
+            return start
+        year -= 1
+
+
+def rollover_accumulators(policies, as_of):
+    """
+    Start a new plan year for every policy whose current one has ended
+
+    Rolled policies get yearly_accumulated recomputed from the ledger
+    entries posted since their new plan year began (usually zero), and
+    the pending entries that were read (or predate every new plan year)
+    are flagged compacted. Written with one bulk_update, so the whole
+    chunk costs a handful of queries.
+
+    :param policies: InsuranceProfile instances (id, effective_date and
+                     accumulator_period_start are needed)
+    :param as_of: Date the rollover runs for
+    :return: List of rolled policies
+    """
+    rolled = []
+    for policy in policies:
+        period_start = plan_year_start(policy.effective_date, as_of)
+        current = policy.accumulator_period_start or policy.effective_date
+        if period_start > current:
+            policy.accumulator_period_start = period_start
+            policy.yearly_accumulated = Decimal('0.00')
+            rolled.append(policy)
+    if not rolled:
+        return rolled
+
+    by_id = {policy.id: policy for policy in rolled}
+    earliest_start = min(p.accumulator_period_start for p in rolled)
+    with transaction.atomic():
+        entries = AccumulatorEntry.objects.filter(
+            insurance_profile_id__in=by_id,
+            created_at__date__gte=earliest_start
+        ).values_list('id', 'insurance_profile_id', 'created_at', 'amount')
+        read = []
+        for entry_id, policy_id, created_at, amount in entries:
+            read.append(entry_id)
+            policy = by_id[policy_id]
+            if created_at.date() >= policy.accumulator_period_start:
+                policy.yearly_accumulated += amount
+
+        # Only entries read above (or older than any of them): one committed
+        # meanwhile stays pending instead of being dropped uncounted
+        AccumulatorEntry.objects.filter(
+            insurance_profile_id__in=by_id, compacted=False
+        ).filter(
+            Q(id__in=read) | Q(created_at__date__lt=earliest_start)
+        ).update(compacted=True)
+
+        InsuranceProfile.objects.bulk_update(
+            rolled, ['yearly_accumulated', 'accumulator_period_start']
+        )
+
+    # bulk_update sends no post_save, so invalidate cached results here
+    for member_id in {policy.member_id for policy in rolled}:
+        result_cache.bump(member_id)
+    return rolled
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class InsuranceprofileConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'insuranceprofile'
+
+    def ready(self):
+        from . import signals  # noqa: F401
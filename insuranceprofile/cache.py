@@ -0,0 +1,357 @@
+# insurance/cache.py
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from .models import Coverage
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe least-recently-used mapping
+
+    Used for the process-local lookup caches of the insurance app.
+    A maxsize of 0 disables caching (every get is a miss).
+    on_evict, if given, is called with (key, value) for entries pushed out
+    by the size bound. With a ttl (seconds) entries also expire.
+    """
+
+    def __init__(self, maxsize=1024, on_evict=None, ttl=None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self.ttl = ttl
+        self._data = OrderedDict()  # key → (value, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value, expires_at = self._data[key]
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted_key, (evicted_value, _) = self._data.popitem(last=False)
+                evicted.append((evicted_key, evicted_value))
+        if self.on_evict is not None:
+            for evicted_key, evicted_value in evicted:
+                self.on_evict(evicted_key, evicted_value)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._data.pop(key)[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CoverageRuleTable:
+    """
+    Compiled coverage rules of a single InsuranceProfile
+
+    Indexes the policy's coverages by (service_type, network_tier) and
+    (service_category, network_tier) so the exact → category → GENERAL
+    fallback chain is three dict lookups instead of three queries.
+    """
+
+    def __init__(self, coverages):
+        """
+        :param coverages: Coverage rows of one policy in primary key order
+        """
+        self.by_service_type = {}
+        self.by_category = {}
+        # setdefault keeps the lowest pk, same row .first() would return
+        for coverage in coverages:
+            self.by_service_type.setdefault(
+                (coverage.service_type, coverage.network_tier), coverage
+            )
+            self.by_category.setdefault(
+                (coverage.service_category, coverage.network_tier), coverage
+            )
+
+    def find(self, service_type, network_tier, service_category=None):
+        """Resolve the best coverage for a service, or None"""
+        coverage = self.by_service_type.get((service_type, network_tier))
+        if coverage is None and service_category is not None:
+            coverage = self.by_category.get((service_category, network_tier))
+        if coverage is None:
+            coverage = self.by_category.get(('GENERAL', network_tier))
+        return coverage
+
+
+class CoverageRuleCache:
+    """
+    Caches a compiled CoverageRuleTable per InsuranceProfile
+
+    Lookups go to a process-local LRU first. When a shared cache backend
+    is configured, tables are also stored there under a per-policy version
+    key so that invalidation in one process is seen by all of them.
+    Without a backend, invalidation only reaches the process that saved
+    the change; other processes (web workers, split_worker, split_bills)
+    pick it up when their local table expires after TTL seconds.
+
+    Configured through settings.COVERAGE_RULE_CACHE:
+
+    COVERAGE_RULE_CACHE = {
+        'MAXSIZE': 2048,       # Policies kept per process, 0 disables caching
+        'TTL': 60,             # Seconds a table is used locally before recompiling
+        'BACKEND': 'default',  # Optional alias from settings.CACHES
+        'TIMEOUT': 3600,       # Seconds a table lives in the shared backend
+    }
+    """
+    KEY_PREFIX = 'coverage-rules'
+
+    def __init__(self, maxsize=2048, backend=None, timeout=3600, ttl=60):
+        self._local = LRUCache(maxsize, ttl=ttl)
+        self._backend_alias = backend
+        self.timeout = timeout
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'COVERAGE_RULE_CACHE', {})
+        return cls(
+            maxsize=config.get('MAXSIZE', 2048),
+            backend=config.get('BACKEND'),
+            timeout=config.get('TIMEOUT', 3600),
+            ttl=config.get('TTL', 60)
+        )
+
+    @property
+    def enabled(self):
+        return self._local.maxsize > 0
+
+    @property
+    def backend(self):
+        return caches[self._backend_alias] if self._backend_alias else None
+
+    def get(self, policy_id):
+        """Return the compiled rule table of a policy"""
+        return self.get_many([policy_id])[policy_id]
+
+    def get_many(self, policy_ids):
+        """
+        Return compiled rule tables for several policies
+
+        All misses are compiled from a single Coverage query.
+
+        :param policy_ids: Iterable of InsuranceProfile ids
+        :return: Dict of policy_id → CoverageRuleTable
+        """
+        policy_ids = set(policy_ids)
+        versions = self._versions(policy_ids)
+        tables = {}
+
+        for policy_id in policy_ids:
+            entry = self._local.get(policy_id)
+            if entry is not None and entry[0] == versions[policy_id]:
+                tables[policy_id] = entry[1]
+
+        missing = policy_ids - tables.keys()
+        if missing and self.backend is not None:
+            shared = self.backend.get_many(
+                [self._table_key(pid, versions[pid]) for pid in missing]
+            )
+            for policy_id in list(missing):
+                table = shared.get(self._table_key(policy_id, versions[policy_id]))
+                if table is not None:
+                    tables[policy_id] = table
+                    self._local.set(policy_id, (versions[policy_id], table))
+                    missing.discard(policy_id)
+
+        if missing:
+            compiled = self._compile(missing)
+            for policy_id, table in compiled.items():
+                tables[policy_id] = table
+                self._local.set(policy_id, (versions[policy_id], table))
+            if self.backend is not None:
+                self.backend.set_many({
+                    self._table_key(pid, versions[pid]): table
+                    for pid, table in compiled.items()
+                }, self.timeout)
+
+        return tables
+
+    def invalidate(self, policy_id):
+        """Drop the compiled table of a policy everywhere"""
+        self._local.pop(policy_id)
+        backend = self.backend
+        if backend is not None:
+            version_key = self._version_key(policy_id)
+            # add() is a no-op if the key exists, incr() then bumps it atomically
+            backend.add(version_key, 0, None)
+            backend.incr(version_key)
+
+    def clear(self):
+        """Forget every locally compiled table"""
+        self._local.clear()
+
+    def _compile(self, policy_ids):
+        rows = {policy_id: [] for policy_id in policy_ids}
+        coverages = Coverage.objects.filter(
+            insurance_profile_id__in=policy_ids
+        ).order_by('pk')
+        for coverage in coverages:
+            rows[coverage.insurance_profile_id].append(coverage)
+        return {
+            policy_id: CoverageRuleTable(policy_rows)
+            for policy_id, policy_rows in rows.items()
+        }
+
+    def _versions(self, policy_ids):
+        if self.backend is None:
+            return {policy_id: 0 for policy_id in policy_ids}
+        stored = self.backend.get_many(
+            [self._version_key(pid) for pid in policy_ids]
+        )
+        return {
+            policy_id: stored.get(self._version_key(policy_id), 0)
+            for policy_id in policy_ids
+        }
+
+    def _version_key(self, policy_id):
+        return f"{self.KEY_PREFIX}:{policy_id}:version"
+
+    def _table_key(self, policy_id, version):
+        return f"{self.KEY_PREFIX}:{policy_id}:{version}"
+
+
+class CoverageResultCache:
+    """
+    Memoizes InsuranceCalculator.calculate() results
+
+    Results are keyed on the claim inputs plus a per-member version that
+    is bumped whenever one of the member's policies (including its
+    yearly_accumulated), coverages or network contracts changes, so the
+    process that saved the change never looks a stale entry up again.
+    Entries are evicted by LRU and TTL.
+
+    Versions live in the shared cache backend when one is configured, so
+    a change seen by one process invalidates all of them. Without one,
+    versions are per process: other processes (web workers, split_worker,
+    split_bills) keep serving results up to TTL seconds old. Configure a
+    BACKEND wherever several processes adjudicate.
+
+    Configured through settings.COVERAGE_RESULT_CACHE:
+
+    COVERAGE_RESULT_CACHE = {
+        'MAXSIZE': 10000,      # Results kept per process, 0 disables caching
+        'TTL': 300,            # Seconds a result stays valid
+        'BACKEND': 'default',  # Optional alias from settings.CACHES for versions
+    }
+    """
+    KEY_PREFIX = 'coverage-results'
+
+    def __init__(self, maxsize=10000, ttl=300, backend=None):
+        self._results = LRUCache(maxsize, ttl=ttl)
+        self._versions = {}
+        self._backend_alias = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'COVERAGE_RESULT_CACHE', {})
+        return cls(
+            maxsize=config.get('MAXSIZE', 10000),
+            ttl=config.get('TTL', 300),
+            backend=config.get('BACKEND')
+        )
+
+    @property
+    def enabled(self):
+        return self._results.maxsize > 0
+
+    @property
+    def backend(self):
+        return caches[self._backend_alias] if self._backend_alias else None
+
+    def key_for(self, calculator):
+        """Cache key of a calculator's claim at the member's current version"""
+        return (
+            calculator.member_id,
+            calculator.service_type,
+            calculator.service_category,
+            calculator.provider_npi,
+            calculator.service_date,
+            str(calculator.billed_amount),
+            tuple(sorted(calculator.accumulated_offsets.items())),
+            self.version(calculator.member_id),
+        )
+
+    def get(self, key):
+        """Return a copy of the cached result, or None"""
+        result = self._results.get(key)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return copy.deepcopy(result)
+
+    def set(self, key, result):
+        self._results.set(key, copy.deepcopy(result))
+
+    def version(self, member_id):
+        backend = self.backend
+        if backend is not None:
+            return backend.get(self._version_key(member_id), 0)
+        return self._versions.get(member_id, 0)
+
+    def bump(self, member_id):
+        """Invalidate every cached result of a member"""
+        backend = self.backend
+        if backend is not None:
+            version_key = self._version_key(member_id)
+            backend.add(version_key, 0, None)
+            backend.incr(version_key)
+            return
+        with self._lock:
+            self._versions[member_id] = self._versions.get(member_id, 0) + 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self._results),
+        }
+
+    def clear(self):
+        """Drop all results and reset the metrics"""
+        self._results.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def _version_key(self, member_id):
+        return f"{self.KEY_PREFIX}:{member_id}:version"
+
+
+coverage_rules = CoverageRuleCache.from_settings()
+result_cache = CoverageResultCache.from_settings()
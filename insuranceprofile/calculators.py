@@ -1,9 +1,15 @@
 # insurance/calculators.py
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
 from django.utils import timezone
+from django.db.models import Case, IntegerField, Q, Value, When
 from decimal import Decimal
 from django.core.exceptions import ValidationError
 from accounts.models import Member
 from .models import InsuranceProfile, Coverage, NetworkProvider
+from .cache import CoverageRuleTable, coverage_rules, result_cache
+from .network_index import network_index
+from .tracing import CalculationTrace, emit_trace
 
 class InsuranceCalculator:
     """
@@ -26,9 +32,17 @@ class InsuranceCalculator:
         billed_amount=Decimal("1500.00")
     )
     result = calculator.calculate()
+    
+    Batch Example:
+    --------------
+    results = InsuranceCalculator.calculate_many([
+        {"member_id": 123, "service_type": "MRI", ...},
+        {"member_id": 123, "service_type": "X-Ray", ...},
+    ])
     """
     
-    def __init__(self, member_id, service_type, provider_npi, service_date, billed_amount):
+    def __init__(self, member_id, service_type, provider_npi, service_date, billed_amount,
+                 service_category=None, trace=False, accumulated_offsets=None):
         """
         Initialize calculator with claim details
         
@@ -37,15 +51,131 @@ class InsuranceCalculator:
         :param provider_npi: National Provider Identifier of service provider
         :param service_date: Date of service (YYYY-MM-DD)
         :param billed_amount: Total amount billed for the service
+        :param service_category: Optional Coverage.SERVICE_CATEGORIES value used
+                                 when no coverage matches the service type
+        :param trace: Record query counts, step timings and cache hits of
+                      calculate() in self.trace and emit them to the trace sink
+        :param accumulated_offsets: Dict of policy_id → amount to leave out of
+                                    the policy's accumulator, e.g. what the
+                                    bill being re-split posted itself
         """
         self.member_id = member_id
         self.service_type = service_type
         self.provider_npi = provider_npi
         self.service_date = service_date
         self.billed_amount = billed_amount
+        self.service_category = service_category
         self._member = None  # Will be loaded in validation
         self._policies = None  # Will store ordered policies
         self._provider_network_status = {}  # Cache network status per policy
+        self._prefetched = False  # Set by calculate_many() once batch data is attached
+        self._member_policies = None  # All policies of the member (batch mode)
+        self._coverage_tables = None  # policy_id → CoverageRuleTable (batch mode)
+        self._contracts = None  # npi → NpiContracts, or (policy_id, npi) → NetworkProvider (batch mode)
+        self.accumulated_offsets = accumulated_offsets or {}
+        self.trace = CalculationTrace() if trace else None
+
+    @classmethod
+    def calculate_many(cls, claims, return_exceptions=False):
+        """
+        Calculate coverage for many claims in a fixed number of queries
+        
+        Members, their policies, the candidate coverage rules and network
+        contracts for the whole batch are loaded up front. Every claim then
+        goes through the same deductible/copay/coinsurance/OOP logic as
+        calculate(), entirely in memory.
+        
+        :param claims: Iterable of dicts holding the __init__ keyword arguments
+        :param return_exceptions: Put the ValueError of a failing claim in its
+                                  slot instead of raising it
+        :return: List of calculate() results in input order
+        """
+        calculators = [cls(**claim) for claim in claims]
+        results = [None] * len(calculators)
+
+        # Claims already in the result cache need no batch data at all
+        pending = []
+        for position, calculator in enumerate(calculators):
+            cache_key = result_cache.key_for(calculator) if result_cache.enabled else None
+            cached = result_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                results[position] = cached
+            else:
+                pending.append((position, cache_key))
+
+        if pending:
+            cls._prefetch([calculators[position] for position, _ in pending])
+
+        for position, cache_key in pending:
+            try:
+                results[position] = calculators[position]._calculate(cache_key)
+            except ValueError as e:
+                if not return_exceptions:
+                    raise
+                results[position] = e
+        return results
+
+    @staticmethod
+    def _prefetch(calculators):
+        """
+        Load everything a batch of calculators needs with at most four queries
+        
+        1. Members
+        2. Their insurance policies (active or not, validation needs both)
+        3. Coverage rule tables not yet in the rule cache (or, with the
+           cache disabled, coverages matching any service in the batch)
+        4. Network contracts for any provider NPI in the batch not yet in
+           the network contract index
+        """
+        member_ids = {c.member_id for c in calculators}
+        service_types = {c.service_type for c in calculators}
+        categories = {c.service_category for c in calculators}
+        categories = (categories - {None}) | {'GENERAL'}
+        npis = {c.provider_npi for c in calculators}
+
+        members = Member.objects.in_bulk(member_ids)
+
+        policies_by_member = defaultdict(list)
+        policy_ids = []
+        policies = InsuranceProfile.objects.with_pending_accumulated().filter(
+            member_id__in=member_ids
+        )
+        for policy in policies:
+            policies_by_member[policy.member_id].append(policy)
+            policy_ids.append(policy.id)
+
+        if coverage_rules.enabled:
+            coverage_tables = coverage_rules.get_many(policy_ids)
+        else:
+            coverage_rows = defaultdict(list)
+            coverages = Coverage.objects.filter(
+                Q(service_type__in=service_types) | Q(service_category__in=categories),
+                insurance_profile_id__in=policy_ids
+            ).order_by('pk')
+            for coverage in coverages:
+                coverage_rows[coverage.insurance_profile_id].append(coverage)
+            coverage_tables = {
+                policy_id: CoverageRuleTable(coverage_rows.get(policy_id, []))
+                for policy_id in policy_ids
+            }
+
+        if network_index.enabled:
+            contracts = network_index.load(npis)
+        else:
+            contracts = {
+                (contract.insurance_profile_id, contract.provider_npi): contract
+                for contract in NetworkProvider.objects.filter(
+                    insurance_profile_id__in=policy_ids,
+                    provider_npi__in=npis
+                )
+            }
+
+        for calculator in calculators:
+            calculator._prefetched = True
+            calculator._member = members.get(calculator.member_id)
+            calculator._member_policies = policies_by_member.get(calculator.member_id, [])
+            calculator._coverage_tables = coverage_tables
+            calculator._contracts = contracts
 
     def calculate(self):
         """
@@ -60,13 +190,32 @@ class InsuranceCalculator:
             
         Raises:
             ValueError: If invalid input or no active policies
+        
+        Results are memoized in result_cache until the member's
+        policies, coverages or network contracts change.
         """
-        self._validate_inputs()
+        with self._tracing():
+            cache_key = result_cache.key_for(self) if result_cache.enabled else None
+            if cache_key is not None:
+                cached = result_cache.get(cache_key)
+                if self.trace:
+                    self.trace.record_cache('result', cached is not None)
+                if cached is not None:
+                    return cached
+            return self._calculate(cache_key)
+
+    def _calculate(self, cache_key=None):
+        """Run the calculation, storing the result under cache_key if given"""
+        with self._step('validate_inputs'):
+            self._validate_inputs()
         coverage_results = []
         remaining_amount = self.billed_amount
         
+        with self._step('get_ordered_policies'):
+            policies = list(self._get_ordered_policies())
+
         # Process policies in priority order (primary first)
-        for policy in self._get_ordered_policies():
+        for policy in policies:
             if remaining_amount <= 0:
                 break
                 
@@ -74,11 +223,14 @@ class InsuranceCalculator:
             coverage_results.append(policy_coverage)
             remaining_amount -= policy_coverage['total_covered']
             
-        return {
+        result = {
             'total_billed': self.billed_amount,
             'coverages': coverage_results,
             'patient_responsibility': remaining_amount
         }
+        if cache_key is not None:
+            result_cache.set(cache_key, result)
+        return result
 
     def _get_ordered_policies(self):
         """
@@ -88,7 +240,18 @@ class InsuranceCalculator:
         
         Filters policies active on service date
         """
-        return self._member.insurance_profiles.filter(
+        if self._prefetched:
+            active = [
+                policy for policy in self._member_policies
+                if policy.effective_date <= self.service_date <= policy.expiration_date
+            ]
+            return sorted(
+                active,
+                key=lambda policy: (policy.is_primary, policy.effective_date),
+                reverse=True
+            )
+
+        return self._member.insurance_profiles.with_pending_accumulated().filter(
             effective_date__lte=self.service_date,
             expiration_date__gte=self.service_date
         ).order_by('-is_primary', '-effective_date')
@@ -103,20 +266,30 @@ class InsuranceCalculator:
         - OOP max reached
         - No matching coverage rules
         """
-        network_status = self._get_network_status(policy)
-        coverage = self._find_best_coverage(policy, network_status)
+        with self._step('get_network_status'):
+            network_status = self._get_network_status(policy)
+        with self._step('find_best_coverage'):
+            coverage = self._find_best_coverage(policy, network_status)
         
         if not coverage:
             return self._empty_coverage_result(policy)
 
+        with self._step('math'):
+            return self._apply_cost_sharing(policy, coverage, network_status, remaining_amount)
+
+    def _apply_cost_sharing(self, policy, coverage, network_status, remaining_amount):
+        """
+        Apply deductible, copay, coinsurance and OOP max of a resolved coverage
+        """
         # Initialize calculation variables
+        accumulated = self._accumulated(policy)
         deductible_applied = Decimal('0.00')
         copay_applied = Decimal('0.00')
         coinsurance_applied = Decimal('0.00')
         patient_responsibility = Decimal('0.00')
 
         # 1. Apply Deductible
-        deductible_available = max(policy.deductible - policy.yearly_accumulated, 0)
+        deductible_available = max(policy.deductible - accumulated, 0)
         deductible_applied = min(deductible_available, remaining_amount)
         remaining_after_deductible = remaining_amount - deductible_applied
 
@@ -134,10 +307,10 @@ class InsuranceCalculator:
             patient_share = remaining_after_copay - insurance_share
             
             # 4. Apply Out-of-Pocket Max
-            potential_total = policy.yearly_accumulated + deductible_applied + patient_share
+            potential_total = accumulated + deductible_applied + patient_share
             if potential_total > policy.out_of_pocket_max:
                 patient_share = max(policy.out_of_pocket_max - 
-                                   policy.yearly_accumulated - 
+                                   accumulated - 
                                    deductible_applied, 0)
                 insurance_share = remaining_after_copay - patient_share
             
@@ -158,7 +331,7 @@ class InsuranceCalculator:
             'patient_responsibility': patient_responsibility,
             'total_covered': total_covered,
             'remaining_deductible': max(policy.deductible - 
-                                      (policy.yearly_accumulated + 
+                                      (accumulated + 
                                        deductible_applied), 0)
         }
 
@@ -174,33 +347,48 @@ class InsuranceCalculator:
         Fallback to "Diagnostic Services" category → 
         Fallback to General coverage
         """
-        # Exact service type match
-        coverage = Coverage.objects.filter(
+        if self._prefetched:
+            return self._coverage_tables[policy.id].find(
+                self.service_type, network_status, self.service_category
+            )
+        if coverage_rules.enabled:
+            return coverage_rules.get(policy.id).find(
+                self.service_type, network_status, self.service_category
+            )
+
+        # Single query: rank every candidate by fallback level, best first
+        levels = [When(service_type=self.service_type, then=Value(0))]
+        candidates = Q(service_type=self.service_type) | Q(service_category='GENERAL')
+        if self.service_category is not None:
+            levels.append(When(service_category=self.service_category, then=Value(1)))
+            candidates |= Q(service_category=self.service_category)
+        return Coverage.objects.filter(
+            candidates,
             insurance_profile=policy,
-            service_type=self.service_type,
             network_tier=network_status
-        ).first()
-
-        # Category match (if service_category provided)
-        if not coverage and hasattr(self, 'service_category'):
-            coverage = Coverage.objects.filter(
-                insurance_profile=policy,
-                service_category=self.service_category,
-                network_tier=network_status
-            ).first()
-
-        # General coverage fallback
-        if not coverage:
-            coverage = Coverage.objects.filter(
-                insurance_profile=policy,
-                service_category='GENERAL',
-                network_tier=network_status
-            ).first()
-
-        return coverage
+        ).annotate(
+            fallback_level=Case(*levels, default=Value(2), output_field=IntegerField())
+        ).order_by('fallback_level', 'pk').first()
 
     def _get_network_status(self, policy):
         """Determine if provider is in-network for this policy"""
+        if policy.id not in self._provider_network_status and self._prefetched:
+            if network_index.enabled:
+                status = self._contracts[self.provider_npi].status(policy.id, self.service_date)
+            else:
+                contract = self._contracts.get((policy.id, self.provider_npi))
+                in_window = (
+                    contract is not None and
+                    contract.contract_start <= self.service_date <= contract.contract_end
+                )
+                status = contract.network_status if in_window else 'OUT'
+            self._provider_network_status[policy.id] = status
+
+        if policy.id not in self._provider_network_status and network_index.enabled:
+            self._provider_network_status[policy.id] = network_index.status(
+                self.provider_npi, policy.id, self.service_date
+            )
+
         if policy.id not in self._provider_network_status:
             network_provider = NetworkProvider.objects.filter(
                 insurance_profile=policy,
@@ -216,12 +404,18 @@ class InsuranceCalculator:
 
     def _validate_inputs(self):
         """Ensure valid calculation parameters"""
-        try:
-            self._member = Member.objects.get(id=self.member_id)
-        except Member.DoesNotExist:
-            raise ValueError("Member does not exist")
+        if self._prefetched:
+            if self._member is None:
+                raise ValueError("Member does not exist")
+            has_policies = bool(self._member_policies)
+        else:
+            try:
+                self._member = Member.objects.get(id=self.member_id)
+            except Member.DoesNotExist:
+                raise ValueError("Member does not exist")
+            has_policies = self._member.insurance_profiles.exists()
 
-        if not self._member.insurance_profiles.exists():
+        if not has_policies:
             raise ValueError("Member has no active insurance policies")
             
         if self.service_date > timezone.now().date():
@@ -230,6 +424,21 @@ class InsuranceCalculator:
         if self.billed_amount <= 0:
             raise ValueError("Billed amount must be positive")
 
+    def _tracing(self):
+        """Capture queries for the trace and emit it when done"""
+        if self.trace is None:
+            return nullcontext()
+        return self._traced()
+
+    @contextmanager
+    def _traced(self):
+        with self.trace.capture():
+            yield
+        emit_trace(self.trace, self)
+
+    def _step(self, name):
+        return self.trace.step(name) if self.trace is not None else nullcontext()
+
     def _empty_coverage_result(self, policy):
         """Return default result when no coverage found"""
         return {
@@ -241,5 +450,9 @@ class InsuranceCalculator:
             'coinsurance_applied': Decimal('0.00'),
             'patient_responsibility': Decimal('0.00'),
             'total_covered': Decimal('0.00'),
-            'remaining_deductible': policy.deductible - policy.yearly_accumulated
-        }
\ No newline at end of file
+            'remaining_deductible': policy.deductible - self._accumulated(policy)
+        }
+
+    def _accumulated(self, policy):
+        """Policy's accumulated amount, less this claim's offset"""
+        return policy.accumulated - self.accumulated_offsets.get(policy.id, 0)
\ No newline at end of file
@@ -0,0 +1,21 @@
+# insurance/management/commands/compact_accumulators.py
+import time
+from django.core.management.base import BaseCommand
+from insuranceprofile.accumulators import compact_accumulators
+
+
+class Command(BaseCommand):
+    help = "Fold pending accumulator ledger entries into yearly_accumulated"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Ledger entries compacted per transaction"
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        compacted = compact_accumulators(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted {compacted} ledger entries in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,133 @@
+# insurance/management/commands/rollover_accumulators.py
+import json
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from insuranceprofile.models import InsuranceProfile
+from insuranceprofile.accumulators import rollover_accumulators
+
+
+class Command(BaseCommand):
+    """
+    Roll deductible / OOP accumulators over at plan-year boundaries
+
+    Walks InsuranceProfile by primary key in chunks (keyset iteration, no
+    OFFSET) and resets every policy whose plan year ended, one bulk_update
+    per chunk. Safe to re-run: policies already in their current plan
+    year are left alone.
+
+    Usage Example:
+    --------------
+    # Whole table, resumable
+    python manage.py rollover_accumulators --checkpoint /var/run/rollover.json
+
+    # Four workers in parallel over disjoint ID ranges
+    python manage.py rollover_accumulators --partitions 4
+    python manage.py rollover_accumulators --start-id 0 --end-id 250000 --checkpoint part0.json
+    ...
+    """
+    help = "Reset yearly_accumulated for policies whose plan year has ended"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--as-of', help="Date to roll over for (YYYY-MM-DD, default today)"
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help="Policies read and written per transaction"
+        )
+        parser.add_argument(
+            '--start-id', type=int, default=0,
+            help="Only process policies with id greater than this"
+        )
+        parser.add_argument(
+            '--end-id', type=int,
+            help="Only process policies with id up to and including this"
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help="JSON file recording the last processed id, resumed from if present"
+        )
+        parser.add_argument(
+            '--partitions', type=int,
+            help="Print --start-id/--end-id ranges for this many parallel runs and exit"
+        )
+
+    def handle(self, *args, **options):
+        if options['partitions']:
+            self._print_partitions(options['partitions'])
+            return
+
+        as_of = parse_date(options['as_of']) if options['as_of'] else timezone.now().date()
+        if as_of is None:
+            raise CommandError("--as-of must be a date in YYYY-MM-DD format")
+
+        checkpoint = Path(options['checkpoint']) if options['checkpoint'] else None
+        last_id = self._load_checkpoint(checkpoint, as_of, options['start_id'])
+
+        policies = InsuranceProfile.objects.order_by('id').only(
+            'id', 'member_id', 'effective_date',
+            'accumulator_period_start', 'yearly_accumulated'
+        )
+        if options['end_id'] is not None:
+            policies = policies.filter(id__lte=options['end_id'])
+
+        started = time.monotonic()
+        processed = rolled = 0
+        while True:
+            chunk = list(policies.filter(id__gt=last_id)[:options['chunk_size']])
+            if not chunk:
+                break
+
+            rolled += len(rollover_accumulators(chunk, as_of))
+            processed += len(chunk)
+            last_id = chunk[-1].id
+            self._save_checkpoint(checkpoint, as_of, last_id)
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"up to id {last_id}: {processed} checked, {rolled} rolled over "
+                f"({processed / elapsed if elapsed else 0:.0f} policies/s)"
+            )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled over {rolled} of {processed} policies as of {as_of} "
+            f"in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.0f} policies/s)"
+        ))
+
+    def _print_partitions(self, partitions):
+        ids = InsuranceProfile.objects.order_by('id').values_list('id', flat=True)
+        lowest, highest = ids.first(), ids.last()
+        if lowest is None:
+            self.stdout.write("No insurance profiles")
+            return
+        step = max((highest - lowest + 1) // partitions, 1)
+        start = lowest - 1
+        for partition in range(partitions):
+            end = highest if partition == partitions - 1 else start + step
+            self.stdout.write(f"--start-id {start} --end-id {end}")
+            start = end
+            if start >= highest:
+                break
+
+    def _load_checkpoint(self, checkpoint, as_of, start_id):
+        if checkpoint is None or not checkpoint.exists():
+            return start_id
+        state = json.loads(checkpoint.read_text())
+        if state.get('as_of') != as_of.isoformat():
+            raise CommandError(
+                f"Checkpoint {checkpoint} is for {state.get('as_of')}, not {as_of}"
+            )
+        self.stdout.write(f"Resuming after id {state['last_id']}")
+        return max(state['last_id'], start_id)
+
+    def _save_checkpoint(self, checkpoint, as_of, last_id):
+        if checkpoint is None:
+            return
+        # Write then rename so a crash never leaves a truncated checkpoint
+        temporary = checkpoint.with_suffix(checkpoint.suffix + '.tmp')
+        temporary.write_text(json.dumps({'as_of': as_of.isoformat(), 'last_id': last_id}))
+        temporary.replace(checkpoint)
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insuranceprofile', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='networkprovider',
+            index=models.Index(fields=['provider_npi', 'insurance_profile', 'contract_start', 'contract_end'], name='netprov_npi_window_idx'),
+        ),
+    ]
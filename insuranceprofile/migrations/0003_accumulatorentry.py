@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insuranceprofile', '0002_networkprovider_netprov_npi_window_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccumulatorEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('source', models.CharField(blank=True, max_length=100)),
+                ('compacted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('insurance_profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accumulator_entries', to='insuranceprofile.insuranceprofile')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('compacted', False)), fields=['insurance_profile'], name='accum_entry_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insuranceprofile', '0003_accumulatorentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='insuranceprofile',
+            name='accumulator_period_start',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
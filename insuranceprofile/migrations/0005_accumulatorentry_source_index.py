@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insuranceprofile', '0004_insuranceprofile_accumulator_period_start'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='accumulatorentry',
+            index=models.Index(fields=['source'], name='accum_entry_source_idx'),
+        ),
+    ]
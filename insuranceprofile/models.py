@@ -1,8 +1,31 @@
 # insurance/models.py
+from decimal import Decimal
 from django.db import models
+from django.db.models import OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from accounts.models import Member
 from django.core.validators import MinValueValidator,MaxValueValidator
 
+class InsuranceProfileQuerySet(models.QuerySet):
+    def with_pending_accumulated(self):
+        """
+        Annotate pending_accumulated: ledger entries not compacted yet
+        
+        Read in the same statement as yearly_accumulated, so the two add
+        up to a consistent snapshot of the accumulator.
+        """
+        pending = AccumulatorEntry.objects.filter(
+            insurance_profile=OuterRef('pk'),
+            compacted=False
+        ).values('insurance_profile').annotate(total=Sum('amount')).values('total')
+        return self.annotate(
+            pending_accumulated=Coalesce(
+                Subquery(pending),
+                Value(Decimal('0.00')),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2)
+            )
+        )
+
 class InsuranceProfile(models.Model):
     """
     Represents an insurance policy for a member
@@ -32,7 +55,13 @@ class InsuranceProfile(models.Model):
         max_digits=10, 
         decimal_places=2,
         default=0
-    )
+    )  # Compacted running total, see AccumulatorEntry
+    accumulator_period_start = models.DateField(
+        null=True,
+        blank=True
+    )  # Plan year yearly_accumulated belongs to, set by rollover_accumulators
+
+    objects = InsuranceProfileQuerySet.as_manager()
 
     class Meta:
         unique_together = ('member', 'policy_number')
@@ -41,6 +70,53 @@ class InsuranceProfile(models.Model):
     def __str__(self):
         return f"{self.provider_name} ({self.get_insurance_type_display()})"
 
+    @property
+    def accumulated(self):
+        """
+        Amount accumulated towards deductible and OOP max this plan year
+        
+        Compacted total plus pending ledger entries. Uses the
+        pending_accumulated annotation when present, otherwise queries.
+        """
+        pending = getattr(self, 'pending_accumulated', None)
+        if pending is None:
+            pending = self.accumulator_entries.filter(compacted=False).aggregate(
+                total=Sum('amount')
+            )['total'] or Decimal('0.00')
+        return self.yearly_accumulated + pending
+
+class AccumulatorEntry(models.Model):
+    """
+    Append-only posting against an InsuranceProfile's yearly accumulator
+    
+    Posting only ever inserts, so concurrent bill splits for one family
+    never wait on the InsuranceProfile row. Entries are folded into
+    yearly_accumulated by compact_accumulators and flagged compacted.
+    Bill splits post under source "bill:<id>" (see set_postings).
+    """
+    insurance_profile = models.ForeignKey(
+        InsuranceProfile,
+        on_delete=models.CASCADE,
+        related_name='accumulator_entries'
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    source = models.CharField(max_length=100, blank=True)  # e.g. "bill:42"
+    compacted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['insurance_profile'],
+                condition=Q(compacted=False),
+                name='accum_entry_pending_idx'
+            ),
+            models.Index(fields=['source'], name='accum_entry_source_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.amount} → {self.insurance_profile_id}"
+
 # insurance/models.py
 class Coverage(models.Model):
     SERVICE_CATEGORIES = [
@@ -107,6 +183,13 @@ class NetworkProvider(models.Model):
 
     class Meta:
         unique_together = ('insurance_profile', 'provider_npi')
+        indexes = [
+            # Serves NPI lookups across plans for the network contract index
+            models.Index(
+                fields=['provider_npi', 'insurance_profile', 'contract_start', 'contract_end'],
+                name='netprov_npi_window_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.provider_npi} ({self.get_network_status_display()})"
\ No newline at end of file
@@ -0,0 +1,198 @@
+# insurance/network_index.py
+import bisect
+import threading
+import time
+from django.conf import settings
+from .models import NetworkProvider
+from .cache import LRUCache
+
+
+class NpiContracts:
+    """
+    Contract windows of one provider NPI across all insurance policies
+
+    Windows are kept per policy sorted by contract_start, so the contract
+    covering a date is found with one bisect. Windows of the same policy
+    never overlap (a policy holds at most one contract per NPI).
+
+    Instances are never modified once built: readers use them without a
+    lock, so changes produce a new instance (see replaced()) that is
+    swapped into the index.
+    """
+
+    def __init__(self, contracts=(), loaded_at=None):
+        """
+        :param contracts: (contract_id, policy_id, start, end, status) rows
+        :param loaded_at: time.monotonic() of the database read (default now)
+        """
+        self.loaded_at = time.monotonic() if loaded_at is None else loaded_at
+        self._starts = {}   # policy_id → [contract_start, ...]
+        self._windows = {}  # policy_id → [(start, end, status, contract_id), ...]
+        for contract in contracts:
+            self._add(*contract)
+
+    def _add(self, contract_id, policy_id, start, end, status):
+        starts = self._starts.setdefault(policy_id, [])
+        windows = self._windows.setdefault(policy_id, [])
+        position = bisect.bisect_right(starts, start)
+        starts.insert(position, start)
+        windows.insert(position, (start, end, status, contract_id))
+
+    def replaced(self, contract_id, contract=None):
+        """
+        Copy without contract_id, plus contract (a row as in __init__) if given
+
+        Keeps loaded_at: the copy is no fresher than the rows it came from.
+        """
+        rows = [
+            (window[3], policy_id, window[0], window[1], window[2])
+            for policy_id, windows in self._windows.items()
+            for window in windows
+            if window[3] != contract_id
+        ]
+        if contract is not None:
+            rows.append(contract)
+        return NpiContracts(rows, loaded_at=self.loaded_at)
+
+    def contract_ids(self):
+        return [window[3] for windows in self._windows.values() for window in windows]
+
+    def status(self, policy_id, service_date):
+        """Network status of the contract covering service_date, 'OUT' if none"""
+        starts = self._starts.get(policy_id)
+        if not starts:
+            return 'OUT'
+        position = bisect.bisect_right(starts, service_date) - 1
+        if position < 0:
+            return 'OUT'
+        start, end, status, contract_id = self._windows[policy_id][position]
+        return status if service_date <= end else 'OUT'
+
+
+class NetworkContractIndex:
+    """
+    In-memory interval index answering "in or out of network on date D"
+
+    NPIs are loaded lazily on first lookup (one indexed query for any
+    number of NPIs) and kept in a bounded LRU. Saves and deletes of
+    NetworkProvider rows swap in a rebuilt entry for their NPI; the TTL
+    bounds how stale an NPI loaded in another process can get.
+
+    Configured through settings.NETWORK_CONTRACT_INDEX:
+
+    NETWORK_CONTRACT_INDEX = {
+        'MAXSIZE': 100000,  # NPIs kept per process, 0 disables the index
+        'TTL': 300,         # Seconds before a loaded NPI is re-read
+    }
+
+    Usage Example:
+    --------------
+    network_index.status("1234567890", policy.id, date(2024, 3, 15))
+    network_index.status_many(["1234567890", "1098765432"], policy.id, date(2024, 3, 15))
+    """
+
+    def __init__(self, maxsize=100000, ttl=300):
+        self.ttl = ttl
+        self._npis = LRUCache(maxsize, on_evict=self._forget)
+        self._contract_npis = {}  # contract_id → npi, for refresh/discard
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        config = getattr(settings, 'NETWORK_CONTRACT_INDEX', {})
+        return cls(
+            maxsize=config.get('MAXSIZE', 100000),
+            ttl=config.get('TTL', 300)
+        )
+
+    @property
+    def enabled(self):
+        return self._npis.maxsize > 0
+
+    def status(self, npi, policy_id, service_date):
+        """Return 'IN' or 'OUT' for a provider under a policy on a date"""
+        return self.load([npi])[npi].status(policy_id, service_date)
+
+    def status_many(self, npis, policy_id, service_date):
+        """
+        Bulk variant of status() for many providers at once
+
+        :return: Dict of npi → 'IN' / 'OUT'
+        """
+        contracts = self.load(npis)
+        return {
+            npi: contracts[npi].status(policy_id, service_date)
+            for npi in set(npis)
+        }
+
+    def load(self, npis):
+        """
+        Make sure the given NPIs are indexed, loading misses in one query
+
+        :return: Dict of npi → NpiContracts
+        """
+        loaded = {}
+        expired_before = time.monotonic() - self.ttl if self.ttl else None
+        for npi in set(npis):
+            entry = self._npis.get(npi)
+            if entry is not None and (expired_before is None or entry.loaded_at >= expired_before):
+                loaded[npi] = entry
+
+        missing = set(npis) - loaded.keys()
+        if missing:
+            rows = {npi: [] for npi in missing}
+            contracts = NetworkProvider.objects.filter(
+                provider_npi__in=missing
+            ).values_list(
+                'id', 'provider_npi', 'insurance_profile_id',
+                'contract_start', 'contract_end', 'network_status'
+            )
+            for contract_id, npi, policy_id, start, end, status in contracts:
+                rows[npi].append((contract_id, policy_id, start, end, status))
+
+            with self._lock:
+                for npi, npi_rows in rows.items():
+                    entry = NpiContracts(npi_rows)
+                    for row in npi_rows:
+                        self._contract_npis[row[0]] = npi
+                    loaded[npi] = entry
+                    self._npis.set(npi, entry)
+        return loaded
+
+    def refresh(self, contract):
+        """Apply a saved NetworkProvider row to the index"""
+        with self._lock:
+            self._discard(contract.id)
+            entry = self._npis.get(contract.provider_npi)
+            if entry is not None:
+                # Instances saved with ISO strings still hold them after save()
+                to_date = NetworkProvider._meta.get_field('contract_start').to_python
+                self._npis.set(contract.provider_npi, entry.replaced(contract.id, (
+                    contract.id, contract.insurance_profile_id,
+                    to_date(contract.contract_start), to_date(contract.contract_end),
+                    contract.network_status
+                )))
+                self._contract_npis[contract.id] = contract.provider_npi
+
+    def discard(self, contract):
+        """Remove a deleted NetworkProvider row from the index"""
+        with self._lock:
+            self._discard(contract.id)
+
+    def clear(self):
+        with self._lock:
+            self._npis.clear()
+            self._contract_npis.clear()
+
+    def _discard(self, contract_id):
+        npi = self._contract_npis.pop(contract_id, None)
+        entry = self._npis.get(npi) if npi is not None else None
+        if entry is not None:
+            self._npis.set(npi, entry.replaced(contract_id))
+
+    def _forget(self, npi, entry):
+        for contract_id in entry.contract_ids():
+            self._contract_npis.pop(contract_id, None)
+
+
+network_index = NetworkContractIndex.from_settings()
@@ -1,5 +1,6 @@
 # insurance/serializers.py
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
 from accounts.models import Member
 from .models import InsuranceProfile, Coverage, NetworkProvider
@@ -43,20 +44,72 @@ class InsuranceProfileSerializer(serializers.ModelSerializer):
             )
         return data
 
+class CoverageCalculationListSerializer(serializers.ListSerializer):
+    """
+    Validates a batch of claims item by item
+    
+    Unlike the default ListSerializer an invalid claim doesn't reject the
+    whole batch: validated_data holds, in input order, either the claim's
+    validated dict or the ValidationError raised for it. Member ids of the
+    batch are checked with a single query.
+    """
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: ["Expected a list of claims."]
+            })
+        if not data:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: ["At least one claim is required."]
+            })
+        if self.max_length is not None and len(data) > self.max_length:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    f"Ensure this batch has no more than {self.max_length} claims."
+                ]
+            })
+
+        member_ids = set()
+        for item in data:
+            try:
+                member_ids.add(int(item.get('member_id')))
+            except (AttributeError, TypeError, ValueError):
+                continue
+        self.child.context['member_ids'] = set(
+            Member.objects.filter(id__in=member_ids).values_list('id', flat=True)
+        )
+
+        items = []
+        for item in data:
+            try:
+                items.append(self.child.run_validation(item))
+            except serializers.ValidationError as exc:
+                items.append(exc)
+        return items
+
 class CoverageCalculationSerializer(serializers.Serializer):
     member_id = serializers.IntegerField()
     billed_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
-    service_type = serializers.ChoiceField(
-        max_lenght=255
+    service_type = serializers.CharField(
+        max_length=255
     )
-    service_category=serializers.CharField(
-        choices=Coverage.service_category,
+    service_category=serializers.ChoiceField(
+        choices=Coverage.SERVICE_CATEGORIES,
         required=False
     )
     provider_npi = serializers.CharField(max_length=15)
     service_date = serializers.DateField()
 
+    class Meta:
+        list_serializer_class = CoverageCalculationListSerializer
+
     def validate_member_id(self, value):
-        if not Member.objects.filter(id=value).exists():
+        # Batch validation preloads the ids of existing members
+        member_ids = self.context.get('member_ids')
+        if member_ids is not None:
+            exists = value in member_ids
+        else:
+            exists = Member.objects.filter(id=value).exists()
+        if not exists:
             raise serializers.ValidationError("Member does not exist")
         return value
\ No newline at end of file
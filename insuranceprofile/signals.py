@@ -1,12 +1,24 @@
 # insurance/signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import Coverage
+from .models import InsuranceProfile, Coverage, NetworkProvider, AccumulatorEntry
+from .cache import coverage_rules, result_cache
+from .network_index import network_index
 from notifications.models import Notification
 
+@receiver(pre_save, sender=Coverage)
+def remember_previous_coverage(sender, instance, **kwargs):
+    """Keep the stored percentage around for the change notification"""
+    if instance.pk:
+        instance._previous_coverage_percentage = Coverage.objects.filter(
+            pk=instance.pk
+        ).values_list('coverage_percentage', flat=True).first()
+
 @receiver(post_save, sender=Coverage)
 def notify_coverage_change(sender, instance, created, **kwargs):
     if not created:
+        old_value = getattr(instance, '_previous_coverage_percentage', None)
         Notification.objects.create(
             member=instance.insurance_profile.member,
             notification_type='INSURANCE',
@@ -14,6 +26,48 @@ def notify_coverage_change(sender, instance, created, **kwargs):
             priority='MEDIUM',
             metadata={
                 'coverage_id': instance.id,
-                'old_value': instance.tracker.previous('coverage_percentage')
+                'old_value': str(old_value) if old_value is not None else None
             }
-        )
\ No newline at end of file
+        )
+
+def now_and_on_commit(func, *args):
+    """
+    Run a cache invalidation now and again once the transaction commits
+
+    The first run keeps reads inside the writing transaction fresh; the
+    second drops anything a concurrent reader compiled from the old rows
+    while the write was still uncommitted.
+    """
+    func(*args)
+    transaction.on_commit(lambda: func(*args))
+
+@receiver([post_save, post_delete], sender=Coverage)
+def invalidate_coverage_rules(sender, instance, **kwargs):
+    now_and_on_commit(coverage_rules.invalidate, instance.insurance_profile_id)
+
+@receiver([post_save, post_delete], sender=InsuranceProfile)
+def invalidate_profile_coverage_rules(sender, instance, **kwargs):
+    now_and_on_commit(coverage_rules.invalidate, instance.id)
+
+@receiver([post_save, post_delete], sender=InsuranceProfile)
+def bump_member_results(sender, instance, **kwargs):
+    now_and_on_commit(result_cache.bump, instance.member_id)
+
+@receiver([post_save, post_delete], sender=Coverage)
+@receiver([post_save, post_delete], sender=NetworkProvider)
+@receiver([post_save, post_delete], sender=AccumulatorEntry)
+def bump_policy_member_results(sender, instance, **kwargs):
+    # The policy may already be gone when this runs as part of its cascade
+    member_id = InsuranceProfile.objects.filter(
+        pk=instance.insurance_profile_id
+    ).values_list('member_id', flat=True).first()
+    if member_id is not None:
+        now_and_on_commit(result_cache.bump, member_id)
+
+@receiver(post_save, sender=NetworkProvider)
+def refresh_network_index(sender, instance, **kwargs):
+    network_index.refresh(instance)
+
+@receiver(post_delete, sender=NetworkProvider)
+def discard_from_network_index(sender, instance, **kwargs):
+    network_index.discard(instance)
@@ -1,9 +1,30 @@
 # insurance/tests.py
-from django.test import TestCase
+import json
+import tempfile
+import time
+import unittest
+from datetime import date
+from unittest import mock
+from io import StringIO
+from pathlib import Path
+from decimal import Decimal, ROUND_HALF_UP, ROUND_HALF_DOWN
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
-from accounts.models import Member
-from .models import InsuranceProfile, Coverage, NetworkProvider
+from accounts.models import User, PrimaryAccount, Member
+from .models import InsuranceProfile, Coverage, NetworkProvider, AccumulatorEntry
+from .accumulators import (
+    post_accumulation, post_accumulations, compact_accumulators, plan_year_start,
+    posted_amounts, set_postings
+)
+from .calculators import InsuranceCalculator
+from .cache import CoverageRuleCache, CoverageRuleTable, CoverageResultCache, coverage_rules, result_cache
+from .network_index import NetworkContractIndex, network_index
+from .vectorized import np, price_points, to_cents, from_cents
 
 class InsuranceProfileModelTest(TestCase):
     def setUp(self):
@@ -182,4 +203,780 @@ class NetworkProviderModelTest(TestCase):
     def test_network_provider_str(self):
         provider = NetworkProvider.objects.create(**self.network_provider_data)
         expected_str = f"{provider.provider_npi} (In-Network)"
-        self.assertEqual(str(provider), expected_str)
\ No newline at end of file
+        self.assertEqual(str(provider), expected_str)
+
+
+class InsuranceCalculatorBatchTest(TestCase):
+    def setUp(self):
+        coverage_rules.clear()
+        network_index.clear()
+        result_cache.clear()
+        user = User.objects.create(email='family@example.com')
+        account = PrimaryAccount.objects.create(
+            user=user, name='Test Family', phone='+1234567890', address='Test Address'
+        )
+        self.member = Member.objects.create(
+            primary_account=account, name='Jane', email='jane@example.com', relationship='WIFE'
+        )
+        self.primary = InsuranceProfile.objects.create(
+            member=self.member, provider_name='Primary Plan', policy_number='P1',
+            effective_date='2024-01-01', expiration_date='2030-12-31',
+            insurance_type='PPO', is_primary=True,
+            deductible=Decimal('500.00'), out_of_pocket_max=Decimal('3000.00'),
+            yearly_accumulated=Decimal('200.00'),
+        )
+        self.secondary = InsuranceProfile.objects.create(
+            member=self.member, provider_name='Secondary Plan', policy_number='S1',
+            effective_date='2024-01-01', expiration_date='2030-12-31',
+            insurance_type='HMO', is_primary=False,
+            deductible=Decimal('100.00'), out_of_pocket_max=Decimal('1000.00'),
+        )
+        Coverage.objects.create(
+            insurance_profile=self.primary, service_type='MRI', service_category='DIAGNOSTIC',
+            coverage_percentage=Decimal('80.00'), copay_amount=Decimal('25.00'), network_tier='IN'
+        )
+        Coverage.objects.create(
+            insurance_profile=self.primary, service_type='Office Visit', service_category='GENERAL',
+            coverage_percentage=Decimal('70.00'), network_tier='IN'
+        )
+        Coverage.objects.create(
+            insurance_profile=self.secondary, service_type='Anything', service_category='GENERAL',
+            coverage_percentage=Decimal('50.00'), network_tier='OUT'
+        )
+        NetworkProvider.objects.create(
+            insurance_profile=self.primary, provider_npi='1234567890', network_status='IN',
+            contract_start='2024-01-01', contract_end='2030-12-31'
+        )
+
+    def claim(self, **overrides):
+        claim = {
+            'member_id': self.member.id,
+            'service_type': 'MRI',
+            'provider_npi': '1234567890',
+            'service_date': date(2025, 3, 15),
+            'billed_amount': Decimal('1500.00'),
+        }
+        claim.update(overrides)
+        return claim
+
+    def test_matches_single_claim_path(self):
+        claims = [
+            self.claim(),
+            self.claim(service_type='Blood Panel', billed_amount=Decimal('320.00')),
+            self.claim(provider_npi='9999999999', billed_amount=Decimal('80.00')),
+            self.claim(service_date=date(2023, 6, 1)),
+        ]
+        expected = [InsuranceCalculator(**claim).calculate() for claim in claims]
+        result_cache.clear()
+        self.assertEqual(InsuranceCalculator.calculate_many(claims), expected)
+
+    def test_fixed_number_of_queries(self):
+        claims = [
+            self.claim(billed_amount=Decimal(amount))
+            for amount in range(100, 6100, 100)
+        ]
+        with self.assertNumQueries(4):
+            results = InsuranceCalculator.calculate_many(claims)
+        self.assertEqual(len(results), 60)
+
+    def test_return_exceptions_keeps_input_order(self):
+        claims = [self.claim(), self.claim(member_id=0), self.claim(billed_amount=Decimal('0'))]
+        with self.assertRaises(ValueError):
+            InsuranceCalculator.calculate_many(claims)
+
+        results = InsuranceCalculator.calculate_many(claims, return_exceptions=True)
+        self.assertEqual(results[0]['total_billed'], Decimal('1500.00'))
+        self.assertEqual(str(results[1]), 'Member does not exist')
+        self.assertEqual(str(results[2]), 'Billed amount must be positive')
+
+    def test_empty_batch(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(InsuranceCalculator.calculate_many([]), [])
+
+    def test_service_category_fallback(self):
+        Coverage.objects.create(
+            insurance_profile=self.primary, service_type='CT Scan', service_category='DIAGNOSTIC',
+            coverage_percentage=Decimal('90.00'), network_tier='IN'
+        )
+        claim = self.claim(service_type='PET Scan', billed_amount=Decimal('1000.00'))
+        general = InsuranceCalculator(**claim).calculate()
+        diagnostic = InsuranceCalculator(**claim, service_category='DIAGNOSTIC').calculate()
+        # 700 left after the deductible: 70% under GENERAL, 80% after the
+        # $25 copay under the first DIAGNOSTIC rule (MRI)
+        self.assertEqual(general['coverages'][0]['coinsurance_applied'], Decimal('490.00'))
+        self.assertEqual(diagnostic['coverages'][0]['coinsurance_applied'], Decimal('540.00'))
+
+        result_cache.clear()
+        batch = InsuranceCalculator.calculate_many([
+            claim, dict(claim, service_category='DIAGNOSTIC')
+        ])
+        self.assertEqual(batch, [general, diagnostic])
+
+    def test_uncached_fallback_is_one_query_per_policy(self):
+        calculator = InsuranceCalculator(
+            **self.claim(service_type='PET Scan'), service_category='EMERGENCY'
+        )
+        with mock.patch('insuranceprofile.calculators.coverage_rules', CoverageRuleCache(maxsize=0)):
+            with self.assertNumQueries(1):
+                coverage = calculator._find_best_coverage(self.primary, 'IN')
+            self.assertEqual(coverage.service_type, 'Office Visit')
+
+            calculator.service_type = 'MRI'
+            with self.assertNumQueries(1):
+                coverage = calculator._find_best_coverage(self.primary, 'IN')
+            self.assertEqual(coverage.service_type, 'MRI')
+
+
+class CoverageRuleCacheTest(TestCase):
+    def setUp(self):
+        coverage_rules.clear()
+        network_index.clear()
+        result_cache.clear()
+        user = User.objects.create(email='rules@example.com')
+        account = PrimaryAccount.objects.create(
+            user=user, name='Rules Family', phone='+1234567890', address='Test Address'
+        )
+        member = Member.objects.create(
+            primary_account=account, name='Sam', email='sam@example.com', relationship='CHILD'
+        )
+        self.policy = InsuranceProfile.objects.create(
+            member=member, provider_name='Plan', policy_number='R1',
+            effective_date='2024-01-01', expiration_date='2030-12-31',
+            insurance_type='PPO', deductible=Decimal('500.00'),
+            out_of_pocket_max=Decimal('3000.00'),
+        )
+        self.mri = Coverage.objects.create(
+            insurance_profile=self.policy, service_type='MRI', service_category='DIAGNOSTIC',
+            coverage_percentage=Decimal('80.00'), network_tier='IN'
+        )
+        self.general = Coverage.objects.create(
+            insurance_profile=self.policy, service_type='Office Visit', service_category='GENERAL',
+            coverage_percentage=Decimal('60.00'), network_tier='IN'
+        )
+
+    def test_fallback_lookups_without_sql(self):
+        coverage_rules.get(self.policy.id)
+        with self.assertNumQueries(0):
+            table = coverage_rules.get(self.policy.id)
+            self.assertEqual(table.find('MRI', 'IN'), self.mri)
+            self.assertEqual(table.find('CT Scan', 'IN', 'DIAGNOSTIC'), self.mri)
+            self.assertEqual(table.find('CT Scan', 'IN'), self.general)
+            self.assertIsNone(table.find('MRI', 'OUT'))
+
+    def test_coverage_save_invalidates_table(self):
+        coverage_rules.get(self.policy.id)
+        self.mri.coverage_percentage = Decimal('90.00')
+        self.mri.save()
+        table = coverage_rules.get(self.policy.id)
+        self.assertEqual(table.find('MRI', 'IN').coverage_percentage, Decimal('90.00'))
+
+    def test_coverage_delete_invalidates_table(self):
+        coverage_rules.get(self.policy.id)
+        self.mri.delete()
+        self.assertEqual(coverage_rules.get(self.policy.id).find('MRI', 'IN'), self.general)
+
+    def test_invalidated_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mri.coverage_percentage = Decimal('90.00')
+            self.mri.save()
+            # A concurrent reader compiling before the commit
+            coverage_rules._local.set(self.policy.id, (0, CoverageRuleTable([])))
+        table = coverage_rules.get(self.policy.id)
+        self.assertEqual(table.find('MRI', 'IN').coverage_percentage, Decimal('90.00'))
+
+    def test_local_tables_expire(self):
+        cache = CoverageRuleCache(ttl=60)
+        cache.get(self.policy.id)
+        # Changed by another process: no signal reaches this cache
+        Coverage.objects.filter(pk=self.mri.pk).update(coverage_percentage=Decimal('90.00'))
+        self.assertEqual(cache.get(self.policy.id).find('MRI', 'IN').coverage_percentage, Decimal('80.00'))
+        with mock.patch('insuranceprofile.cache.time.monotonic', return_value=time.monotonic() + 61):
+            table = cache.get(self.policy.id)
+        self.assertEqual(table.find('MRI', 'IN').coverage_percentage, Decimal('90.00'))
+
+    def test_lru_is_bounded(self):
+        cache = CoverageRuleCache(maxsize=1)
+        other = InsuranceProfile.objects.create(
+            member=self.policy.member, provider_name='Other', policy_number='R2',
+            effective_date='2024-01-01', expiration_date='2030-12-31',
+            insurance_type='HMO', deductible=Decimal('100.00'),
+            out_of_pocket_max=Decimal('1000.00'),
+        )
+        cache.get(self.policy.id)
+        cache.get(other.id)
+        with self.assertNumQueries(1):
+            cache.get(self.policy.id)
+
+    def test_calculator_uses_compiled_table(self):
+        calculator = InsuranceCalculator(
+            member_id=self.policy.member_id, service_type='MRI',
+            provider_npi='1234567890', service_date=date(2025, 3, 15),
+            billed_amount=Decimal('100.00'),
+        )
+        calculator.calculate()
+        calculator = InsuranceCalculator(
+            member_id=self.policy.member_id, service_type='CT Scan',
+            provider_npi='1234567890', service_date=date(2025, 3, 15),
+            billed_amount=Decimal('100.00'),
+        )
+        # Member, exists, policies: coverage and network lookups are in memory
+        with self.assertNumQueries(3):
+            calculator.calculate()
+
+
+class NetworkContractIndexTest(TestCase):
+    def setUp(self):
+        network_index.clear()
+        user = User.objects.create(email='network@example.com')
+        account = PrimaryAccount.objects.create(
+            user=user, name='Network Family', phone='+1234567890', address='Test Address'
+        )
+        member = Member.objects.create(
+            primary_account=account, name='Alex', email='alex@example.com', relationship='OTHER'
+        )
+        self.policy = InsuranceProfile.objects.create(
+            member=member, provider_name='Plan', policy_number='N1',
+            effective_date='2024-01-01', expiration_date='2030-12-31',
+            insurance_type='PPO', deductible=Decimal('500.00'),
+            out_of_pocket_max=Decimal('3000.00'),
+        )
+        self.contract = NetworkProvider.objects.create(
+            insurance_profile=self.policy, provider_npi='1234567890', network_status='IN',
+            contract_start='2024-01-01', contract_end='2024-12-31'
+        )
+        NetworkProvider.objects.create(
+            insurance_profile=self.policy, provider_npi='1098765432', network_status='IN',
+            contract_start='2025-01-01', contract_end='2025-12-31'
+        )
+
+    def test_status_inside_and_outside_contract_window(self):
+        self.assertEqual(network_index.status('1234567890', self.policy.id, date(2024, 6, 1)), 'IN')
+        with self.assertNumQueries(0):
+            self.assertEqual(network_index.status('1234567890', self.policy.id, date(2025, 6, 1)), 'OUT')
+            self.assertEqual(network_index.status('1234567890', self.policy.id, date(2023, 6, 1)), 'OUT')
+            self.assertEqual(network_index.status('1234567890', 0, date(2024, 6, 1)), 'OUT')
+
+    def test_status_many_loads_all_npis_in_one_query(self):
+        with self.assertNumQueries(1):
+            statuses = network_index.status_many(
+                ['1234567890', '1098765432', '5555555555'], self.policy.id, date(2025, 3, 1)
+            )
+        self.assertEqual(statuses, {'1234567890': 'OUT', '1098765432': 'IN', '5555555555': 'OUT'})
+
+    def test_saves_and_deletes_refresh_loaded_npis(self):
+        network_index.status('1234567890', self.policy.id, date(2024, 6, 1))
+        self.contract.contract_end = '2025-12-31'
+        self.contract.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(network_index.status('1234567890', self.policy.id, date(2025, 6, 1)), 'IN')
+        self.contract.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(network_index.status('1234567890', self.policy.id, date(2024, 6, 1)), 'OUT')
+
+    def test_saves_swap_in_new_entries(self):
+        before = network_index.load(['1234567890'])['1234567890']
+        self.contract.network_status = 'OUT'
+        self.contract.save()
+        self.assertEqual(before.status(self.policy.id, date(2024, 6, 1)), 'IN')
+        self.assertEqual(network_index.status('1234567890', self.policy.id, date(2024, 6, 1)), 'OUT')
+
+    def test_expired_npis_are_reloaded(self):
+        index = NetworkContractIndex(ttl=-1)
+        index.status('1234567890', self.policy.id, date(2024, 6, 1))
+        with self.assertNumQueries(1):
+            index.status('1234567890', self.policy.id, date(2024, 6, 1))
+
+
+class CoverageCalculationBatchViewTest(TestCase):
+    def setUp(self):
+        coverage_rules.clear()
+        network_index.clear()
+        result_cache.clear()
+        user = User.objects.create(email='batch@example.com')
+        account = PrimaryAccount.objects.create(
+            user=user, name='Batch Family', phone='+1234567890', address='Test Address'
+        )
+        self.member = Member.objects.create(
+            primary_account=account, name='Kim', email='kim@example.com', relationship='WIFE'
+        )
+        policy = InsuranceProfile.objects.create(
+            member=self.member, provider_name='Plan', policy_number='B1',
+            effective_date='2024-01-01', expiration_date='2030-12-31',
+            insurance_type='PPO', is_primary=True, deductible=Decimal('100.00'),
+            out_of_pocket_max=Decimal('3000.00'),
+        )
+        Coverage.objects.create(
+            insurance_profile=policy, service_type='Office Visit', service_category='GENERAL',
+            coverage_percentage=Decimal('80.00'), network_tier='OUT'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+        self.url = reverse('calculate-coverage-batch')
+
+    def claim(self, **overrides):
+        claim = {
+            'member_id': self.member.id,
+            'billed_amount': '300.00',
+            'service_type': 'Office Visit',
+            'provider_npi': '1234567890',
+            'service_date': '2025-03-15',
+        }
+        claim.update(overrides)
+        return claim
+
+    def test_per_item_results_in_input_order(self):
+        response = self.client.post(self.url, [
+            self.claim(),
+            self.claim(member_id=0),
+            self.claim(service_date='2099-01-01'),
+            self.claim(billed_amount='100.00'),
+        ], format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['status'] for item in response.data],
+            ['ok', 'invalid', 'error', 'ok']
+        )
+        self.assertEqual(response.data[0]['result']['patient_responsibility'], Decimal('40.00'))
+        self.assertIn('member_id', response.data[1]['errors'])
+        self.assertEqual(response.data[2]['error'], 'Service date cannot be in the future')
+        self.assertEqual(response.data[3]['result']['total_billed'], Decimal('100.00'))
+
+    @override_settings(COVERAGE_BATCH_MAX_SIZE=2)
+    def test_batch_size_is_capped(self):
+        response = self.client.post(self.url, [self.claim()] * 3, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_non_list_body(self):
+        response = self.client.post(self.url, self.claim(), format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class VectorizedPricingTest(TestCase):
+    def setUp(self):
+        coverage_rules.clear()
+        result_cache.clear()
+        user = User.objects.create(email='whatif@example.com')
+        account = PrimaryAccount.objects.create(
+            user=user, name='What-if Family', phone='+1234567890', address='Test Address'
+        )
+        member = Member.objects.create(
+            primary_account=account, name='Lee', email='lee@example.com', relationship='WIFE'
+        )
+        self.policy = InsuranceProfile.objects.create(
+            member=member, provider_name='Plan', policy_number='V1',
+            effective_date='2024-01-01', expiration_date='2030-12-31',
+            insurance_type='HDHP', deductible=Decimal('1500.00'),
+            out_of_pocket_max=Decimal('4000.00'),
+        )
+        self.amounts = [Decimal(cents) / 100 for cents in range(1, 900001, 7919)]
+        self.levels = [Decimal('0.00'), Decimal('730.55'), Decimal('1500.00'), Decimal('3999.99')]
+
+    def scalar(self, coverage, amount, accumulated):
+        self.policy.yearly_accumulated = accumulated
+        calculator = InsuranceCalculator(
+            member_id=self.policy.member_id, service_type=coverage.service_type,
+            provider_npi='1234567890', service_date=date(2025, 3, 15),
+            billed_amount=amount,
+        )
+        calculator._provider_network_status[self.policy.id] = coverage.network_tier
+        return calculator._calculate_policy_coverage(self.policy, amount)
+
+    def assert_matches_scalar(self, coverage):
+        for level in self.levels:
+            points = price_points(
+                self.policy, coverage, to_cents(self.amounts),
+                accumulated=to_cents([level])[0]
+            )
+            points = {key: from_cents(values) for key, values in points.items()}
+            for index, amount in enumerate(self.amounts):
+                expected = self.scalar(coverage, amount, level)
+                for key in ('deductible_applied', 'copay_applied', 'coinsurance_applied',
+                            'total_covered', 'remaining_deductible'):
+                    self.assertEqual(
+                        points[key][index],
+                        Decimal(expected[key]).quantize(Decimal('0.01'), ROUND_HALF_UP),
+                        (key, amount, level)
+                    )
+                self.assertEqual(
+                    points['patient_responsibility'][index],
+                    Decimal(expected['patient_responsibility']).quantize(Decimal('0.01'), ROUND_HALF_DOWN),
+                    (amount, level)
+                )
+
+    def test_coinsurance_and_copay_match_scalar_path(self):
+        self.assert_matches_scalar(Coverage.objects.create(
+            insurance_profile=self.policy, service_type='MRI', coverage_percentage=Decimal('72.50'),
+            copay_amount=Decimal('35.00'), network_tier='IN'
+        ))
+
+    def test_copay_only_matches_scalar_path(self):
+        self.assert_matches_scalar(Coverage.objects.create(
+            insurance_profile=self.policy, service_type='Rx', coverage_percentage=None,
+            copay_amount=Decimal('15.00'), network_tier='IN'
+        ))
+
+    def test_accumulator_array_per_point(self):
+        coverage = Coverage.objects.create(
+            insurance_profile=self.policy, service_type='MRI', coverage_percentage=Decimal('80.00'),
+            network_tier='IN'
+        )
+        points = price_points(
+            self.policy, coverage, to_cents(['1000.00'] * 3),
+            accumulated=to_cents(['0.00', '1500.00', '4000.00'])
+        )
+        self.assertEqual(list(points['patient_responsibility']), [0, 20000, 0])
+        self.assertEqual(list(points['deductible_applied']), [100000, 0, 0])
+
+
+class CoverageResultCacheTest(TestCase):
+    def setUp(self):
+        coverage_rules.clear()
+        network_index.clear()
+        result_cache.clear()
+        user = User.objects.create(email='memo@example.com')
+        account = PrimaryAccount.objects.create(
+            user=user, name='Memo Family', phone='+1234567890', address='Test Address'
+        )
+        self.member = Member.objects.create(
+            primary_account=account, name='Pat', email='pat@example.com', relationship='WIFE'
+        )
+        self.policy = InsuranceProfile.objects.create(
+            member=self.member, provider_name='Plan', policy_number='M1',
+            effective_date='2024-01-01', expiration_date='2030-12-31',
+            insurance_type='PPO', is_primary=True, deductible=Decimal('500.00'),
+            out_of_pocket_max=Decimal('3000.00'),
+        )
+        self.coverage = Coverage.objects.create(
+            insurance_profile=self.policy, service_type='MRI', coverage_percentage=Decimal('80.00'),
+            network_tier='OUT'
+        )
+        self.claim = {
+            'member_id': self.member.id,
+            'service_type': 'MRI',
+            'provider_npi': '1234567890',
+            'service_date': date(2025, 3, 15),
+            'billed_amount': Decimal('1000.00'),
+        }
+
+    def test_repeated_estimate_skips_database(self):
+        first = InsuranceCalculator(**self.claim).calculate()
+        with self.assertNumQueries(0):
+            second = InsuranceCalculator(**self.claim).calculate()
+        self.assertEqual(first, second)
+        self.assertEqual(result_cache.stats()['hits'], 1)
+        self.assertEqual(result_cache.stats()['misses'], 1)
+
+    def test_cached_results_are_copies(self):
+        InsuranceCalculator(**self.claim).calculate()['coverages'].clear()
+        self.assertEqual(len(InsuranceCalculator(**self.claim).calculate()['coverages']), 1)
+
+    def test_accumulator_change_invalidates(self):
+        before = InsuranceCalculator(**self.claim).calculate()
+        self.policy.yearly_accumulated = Decimal('500.00')
+        self.policy.save()
+        after = InsuranceCalculator(**self.claim).calculate()
+        self.assertEqual(before['coverages'][0]['deductible_applied'], Decimal('500.00'))
+        self.assertEqual(after['coverages'][0]['deductible_applied'], Decimal('0.00'))
+
+    def test_coverage_and_contract_changes_invalidate(self):
+        InsuranceCalculator(**self.claim).calculate()
+        self.coverage.coverage_percentage = Decimal('50.00')
+        self.coverage.save()
+        result = InsuranceCalculator(**self.claim).calculate()
+        self.assertEqual(result['coverages'][0]['coinsurance_applied'], Decimal('250.00'))
+
+        NetworkProvider.objects.create(
+            insurance_profile=self.policy, provider_npi='1234567890', network_status='IN',
+            contract_start='2024-01-01', contract_end='2030-12-31'
+        )
+        InsuranceCalculator(**self.claim).calculate()
+        self.assertEqual(result_cache.stats()['hits'], 0)
+
+    def test_bumped_again_on_commit(self):
+        calculator = InsuranceCalculator(**self.claim)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.coverage.coverage_percentage = Decimal('50.00')
+            self.coverage.save()
+            # A concurrent reader caching the old result under the new version
+            stale = InsuranceCalculator(**self.claim).calculate()
+            stale['coverages'][0]['coinsurance_applied'] = Decimal('160.00')
+            result_cache.set(result_cache.key_for(calculator), stale)
+        result = InsuranceCalculator(**self.claim).calculate()
+        self.assertEqual(result['coverages'][0]['coinsurance_applied'], Decimal('250.00'))
+
+    def test_batch_served_from_cache(self):
+        InsuranceCalculator.calculate_many([self.claim])
+        with self.assertNumQueries(0):
+            InsuranceCalculator.calculate_many([self.claim, self.claim])
+
+    def test_entries_expire(self):
+        cache = CoverageResultCache(ttl=-1)
+        cache.set(('key',), {'total_billed': Decimal('1.00')})
+        self.assertIsNone(cache.get(('key',)))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+
+traced_calculations = []
+
+
+def collect_trace(trace, calculator):
+    traced_calculations.append((trace, calculator.member_id))
+
+
+class CalculationTraceTest(TestCase):
+    def setUp(self):
+        coverage_rules.clear()
+        network_index.clear()
+        result_cache.clear()
+        traced_calculations.clear()
+        self.user = User.objects.create(email='trace@example.com')
+        account = PrimaryAccount.objects.create(
+            user=self.user, name='Trace Family', phone='+1234567890', address='Test Address'
+        )
+        self.member = Member.objects.create(
+            primary_account=account, name='Lee', email='lee@example.com', relationship='WIFE'
+        )
+        policy = InsuranceProfile.objects.create(
+            member=self.member, provider_name='Plan', policy_number='T1',
+            effective_date='2024-01-01', expiration_date='2030-12-31',
+            insurance_type='PPO', is_primary=True, deductible=Decimal('500.00'),
+            out_of_pocket_max=Decimal('3000.00'),
+        )
+        Coverage.objects.create(
+            insurance_profile=policy, service_type='MRI', coverage_percentage=Decimal('80.00'),
+            network_tier='OUT'
+        )
+        self.claim = {
+            'member_id': self.member.id,
+            'service_type': 'MRI',
+            'provider_npi': '1234567890',
+            'service_date': date(2025, 3, 15),
+            'billed_amount': Decimal('1000.00'),
+        }
+
+    def test_trace_counts_queries_steps_and_cache_hits(self):
+        calculator = InsuranceCalculator(**self.claim, trace=True)
+        result = calculator.calculate()
+        trace = calculator.trace.as_dict()
+
+        self.assertGreater(trace['queries'], 0)
+        self.assertEqual(
+            sum(step['queries'] for step in trace['steps'].values()), trace['queries']
+        )
+        self.assertEqual(trace['steps']['math']['calls'], 1)
+        self.assertEqual(trace['steps']['math']['queries'], 0)
+        self.assertEqual(trace['cache_misses'], {
+            'result': 1, 'coverage_rules': 1, 'network_index': 1
+        })
+        self.assertEqual(result['coverages'][0]['deductible_applied'], Decimal('500.00'))
+
+        # Rule and network caches are warm now, only the policies are read
+        result_cache.clear()
+        calculator = InsuranceCalculator(**self.claim, trace=True)
+        calculator.calculate()
+        trace = calculator.trace.as_dict()
+        self.assertEqual(trace['cache_hits']['coverage_rules'], 1)
+        self.assertEqual(trace['cache_hits']['network_index'], 1)
+
+        calculator = InsuranceCalculator(**self.claim, trace=True)
+        calculator.calculate()
+        trace = calculator.trace.as_dict()
+        self.assertEqual(trace['queries'], 0)
+        self.assertEqual(trace['cache_hits'], {'result': 1})
+
+    def test_untraced_calculation_has_no_trace(self):
+        calculator = InsuranceCalculator(**self.claim)
+        calculator.calculate()
+        self.assertIsNone(calculator.trace)
+
+    @override_settings(COVERAGE_TRACE_SINK='insuranceprofile.tests.collect_trace')
+    def test_trace_sent_to_configured_sink(self):
+        InsuranceCalculator(**self.claim).calculate()
+        self.assertEqual(traced_calculations, [])
+        InsuranceCalculator(**self.claim, trace=True).calculate()
+        self.assertEqual(len(traced_calculations), 1)
+        self.assertEqual(traced_calculations[0][1], self.member.id)
+
+    @override_settings(COVERAGE_TRACE_SINK='insuranceprofile.tests.missing_sink')
+    def test_broken_sink_does_not_break_calculation(self):
+        with self.assertLogs('insuranceprofile.tracing', level='ERROR'):
+            result = InsuranceCalculator(**self.claim, trace=True).calculate()
+        self.assertEqual(result['total_billed'], Decimal('1000.00'))
+
+    def test_view_debug_flag(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = reverse('calculate-coverage')
+        claim = dict(self.claim, billed_amount='1000.00', service_date='2025-03-15')
+
+        response = client.post(url + '?debug=true', claim, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('trace', response.data)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = client.post(url + '?debug=true', claim, format='json')
+        self.assertIn('steps', response.data['trace'])
+
+
+class AccumulatorLedgerTest(TestCase):
+    def setUp(self):
+        coverage_rules.clear()
+        network_index.clear()
+        result_cache.clear()
+        user = User.objects.create(email='ledger@example.com')
+        account = PrimaryAccount.objects.create(
+            user=user, name='Ledger Family', phone='+1234567890', address='Test Address'
+        )
+        self.member = Member.objects.create(
+            primary_account=account, name='Robin', email='robin@example.com', relationship='WIFE'
+        )
+        self.policy = InsuranceProfile.objects.create(
+            member=self.member, provider_name='Plan', policy_number='L1',
+            effective_date='2024-01-01', expiration_date='2030-12-31',
+            insurance_type='HDHP', is_primary=True, deductible=Decimal('1000.00'),
+            out_of_pocket_max=Decimal('3000.00'), yearly_accumulated=Decimal('100.00'),
+        )
+        Coverage.objects.create(
+            insurance_profile=self.policy, service_type='MRI', coverage_percentage=Decimal('80.00'),
+            network_tier='OUT'
+        )
+
+    def calculate(self):
+        return InsuranceCalculator(
+            member_id=self.member.id, service_type='MRI', provider_npi='1234567890',
+            service_date=date(2025, 3, 15), billed_amount=Decimal('2000.00'),
+        ).calculate()
+
+    def test_postings_count_before_compaction(self):
+        post_accumulation(self.policy, Decimal('250.00'), source='bill:1')
+        post_accumulations([(self.policy, Decimal('150.00'), 'bill:2')])
+
+        profile = InsuranceProfile.objects.with_pending_accumulated().get(pk=self.policy.pk)
+        self.assertEqual(profile.yearly_accumulated, Decimal('100.00'))
+        self.assertEqual(profile.accumulated, Decimal('500.00'))
+        self.assertEqual(
+            self.calculate()['coverages'][0]['deductible_applied'], Decimal('500.00')
+        )
+
+    def test_compaction_keeps_total(self):
+        post_accumulation(self.policy, Decimal('250.00'))
+        post_accumulation(self.policy, Decimal('-50.00'))
+        self.assertEqual(compact_accumulators(batch_size=1), 2)
+        self.assertEqual(compact_accumulators(), 0)
+
+        profile = InsuranceProfile.objects.with_pending_accumulated().get(pk=self.policy.pk)
+        self.assertEqual(profile.yearly_accumulated, Decimal('300.00'))
+        self.assertEqual(profile.pending_accumulated, Decimal('0.00'))
+        self.assertFalse(AccumulatorEntry.objects.filter(compacted=False).exists())
+
+    def test_postings_invalidate_cached_results(self):
+        before = self.calculate()
+        post_accumulations([(self.policy, Decimal('900.00'), 'bill:3')])
+        after = self.calculate()
+        self.assertEqual(before['coverages'][0]['deductible_applied'], Decimal('900.00'))
+        self.assertEqual(after['coverages'][0]['deductible_applied'], Decimal('0.00'))
+
+
+    def test_set_postings_writes_differences_only(self):
+        set_postings('bill:4', {self.policy.id: Decimal('180.00')})
+        self.assertEqual(set_postings('bill:4', {self.policy.id: Decimal('180.00')}), [])
+        set_postings('bill:4', {self.policy.id: Decimal('200.00')})
+        self.assertEqual(AccumulatorEntry.objects.filter(source='bill:4').count(), 2)
+        self.assertEqual(posted_amounts('bill:4'), {self.policy.id: Decimal('200.00')})
+
+        compact_accumulators()
+        set_postings('bill:4', {})
+        self.assertEqual(posted_amounts('bill:4'), {})
+        profile = InsuranceProfile.objects.with_pending_accumulated().get(pk=self.policy.pk)
+        self.assertEqual(profile.accumulated, Decimal('100.00'))
+
+class AccumulatorRolloverTest(TestCase):
+    def setUp(self):
+        user = User.objects.create(email='rollover@example.com')
+        account = PrimaryAccount.objects.create(
+            user=user, name='Rollover Family', phone='+1234567890', address='Test Address'
+        )
+        member = Member.objects.create(
+            primary_account=account, name='Jo', email='jo@example.com', relationship='WIFE'
+        )
+        self.policies = [
+            InsuranceProfile.objects.create(
+                member=member, provider_name='Plan', policy_number=f'Y{number}',
+                effective_date=effective_date, expiration_date='2030-12-31',
+                insurance_type='PPO', deductible=Decimal('500.00'),
+                out_of_pocket_max=Decimal('3000.00'), yearly_accumulated=Decimal('400.00'),
+            )
+            for number, effective_date in enumerate(
+                [date(2024, 1, 1), date(2024, 7, 1), date(2025, 1, 1)]
+            )
+        ]
+
+    def rollover(self, *args):
+        call_command('rollover_accumulators', *args, stdout=StringIO())
+        return [
+            InsuranceProfile.objects.get(pk=policy.pk).yearly_accumulated
+            for policy in self.policies
+        ]
+
+    def test_plan_year_start(self):
+        self.assertEqual(plan_year_start(date(2024, 7, 1), date(2025, 6, 30)), date(2024, 7, 1))
+        self.assertEqual(plan_year_start(date(2024, 7, 1), date(2025, 7, 1)), date(2025, 7, 1))
+        self.assertEqual(plan_year_start(date(2024, 2, 29), date(2025, 3, 1)), date(2025, 2, 28))
+        self.assertEqual(plan_year_start(date(2024, 2, 29), date(2028, 2, 29)), date(2028, 2, 29))
+
+    def test_resets_only_ended_plan_years_and_is_idempotent(self):
+        self.assertEqual(
+            self.rollover('--as-of', '2025-03-01', '--chunk-size', '2'),
+            [Decimal('0.00'), Decimal('400.00'), Decimal('400.00')]
+        )
+        InsuranceProfile.objects.filter(pk=self.policies[0].pk).update(
+            yearly_accumulated=Decimal('50.00')
+        )
+        self.assertEqual(
+            self.rollover('--as-of', '2025-03-01'),
+            [Decimal('50.00'), Decimal('400.00'), Decimal('400.00')]
+        )
+
+    def test_keeps_postings_of_the_new_plan_year(self):
+        post_accumulation(self.policies[0], Decimal('75.00'))
+        self.rollover('--as-of', timezone.now().date().isoformat())
+        profile = InsuranceProfile.objects.with_pending_accumulated().get(pk=self.policies[0].pk)
+        self.assertEqual(profile.accumulated, Decimal('75.00'))
+
+    def test_entries_committed_during_rollover_stay_pending(self):
+        filter_entries = AccumulatorEntry.objects.filter
+        calls = []
+
+        def filter_then_post(*args, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                # Another process posts right after the entries were read
+                post_accumulation(self.policies[0], Decimal('25.00'))
+            return filter_entries(*args, **kwargs)
+
+        with mock.patch.object(AccumulatorEntry.objects, 'filter', side_effect=filter_then_post):
+            self.rollover('--as-of', timezone.now().date().isoformat())
+        profile = InsuranceProfile.objects.with_pending_accumulated().get(pk=self.policies[0].pk)
+        self.assertEqual(profile.accumulated, Decimal('25.00'))
+
+    def test_id_range_and_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = Path(directory) / 'rollover.json'
+            self.assertEqual(
+                self.rollover(
+                    '--as-of', '2026-08-01', '--end-id', str(self.policies[1].pk),
+                    '--checkpoint', str(checkpoint)
+                ),
+                [Decimal('0.00'), Decimal('0.00'), Decimal('400.00')]
+            )
+            state = json.loads(checkpoint.read_text())
+            self.assertEqual(state['last_id'], self.policies[1].pk)
+
+            # Resuming the same run only touches what's left
+            self.assertEqual(
+                self.rollover('--as-of', '2026-08-01', '--checkpoint', str(checkpoint)),
+                [Decimal('0.00'), Decimal('0.00'), Decimal('0.00')]
+            )
@@ -1,7 +1,11 @@
 # insurance/urls.py
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import InsuranceProfileViewSet, CoverageCalculationView
+from .views import (
+    InsuranceProfileViewSet,
+    CoverageCalculationView,
+    CoverageCalculationBatchView
+)
 
 router = DefaultRouter()
 router.register(r'profiles', InsuranceProfileViewSet,
@@ -10,4 +14,6 @@ router.register(r'profiles', InsuranceProfileViewSet,
 urlpatterns = [
     path('calculate-coverage/', CoverageCalculationView.as_view(),
           name='calculate-coverage'),
+    path('calculate-coverage/batch/', CoverageCalculationBatchView.as_view(),
+          name='calculate-coverage-batch'),
 ] + router.urls
\ No newline at end of file
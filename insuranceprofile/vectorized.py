@@ -0,0 +1,128 @@
+# insurance/vectorized.py
+from decimal import Decimal, ROUND_HALF_UP
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is only needed for what-if pricing
+    np = None
+
+CENT = Decimal('0.01')
+
+
+def to_cents(amounts):
+    """
+    Convert money amounts (Decimal, str, int or float) to an int64 cents array
+
+    Values are rounded half up to the cent the same way Decimal fields are.
+    """
+    _require_numpy()
+    return np.array(
+        [int(Decimal(str(amount)).quantize(CENT, ROUND_HALF_UP) * 100) for amount in amounts],
+        dtype=np.int64
+    )
+
+
+def from_cents(cents):
+    """Convert a cents array back to a list of Decimals"""
+    return [Decimal(int(value)) / 100 for value in cents]
+
+
+def price_points(policy, coverage, billed_amounts, accumulated=None):
+    """
+    Vectorized version of InsuranceCalculator._calculate_policy_coverage
+
+    Runs the deductible → copay → coinsurance → out-of-pocket max steps for
+    many price points of one resolved policy and coverage rule at once, in
+    integer cents. Coinsurance is rounded half up to the cent, so results
+    match the scalar path quantized to the cent (the patient's share of an
+    exact half cent rounds down).
+
+    Usage Example:
+    --------------
+    coverage = coverage_rules.get(policy.id).find("MRI", "IN")
+    points = price_points(
+        policy, coverage,
+        billed_amounts=to_cents(amounts),
+        accumulated=to_cents(accumulator_levels)
+    )
+    points['patient_responsibility']  # int64 cents, one per price point
+
+    :param policy: InsuranceProfile providing deductible and out_of_pocket_max
+    :param coverage: Coverage rule for the service, or None if nothing matches
+    :param billed_amounts: Amounts in cents (array-like of ints)
+    :param accumulated: Accumulator levels in cents, per point or one value;
+                        defaults to the policy's current accumulated amount
+    :return: Dict of int64 cents arrays keyed like the scalar result
+    """
+    _require_numpy()
+    billed = np.asarray(billed_amounts, dtype=np.int64)
+    if accumulated is None:
+        accumulated = _cents(policy.accumulated)
+    accumulated = np.broadcast_to(np.asarray(accumulated, dtype=np.int64), billed.shape)
+    deductible = _cents(policy.deductible)
+    out_of_pocket_max = _cents(policy.out_of_pocket_max)
+    zeros = np.zeros_like(billed)
+
+    if coverage is None:
+        return {
+            'deductible_applied': zeros,
+            'copay_applied': zeros.copy(),
+            'coinsurance_applied': zeros.copy(),
+            'patient_responsibility': zeros.copy(),
+            'total_covered': zeros.copy(),
+            'remaining_deductible': deductible - accumulated,
+        }
+
+    # 1. Apply Deductible
+    deductible_available = np.maximum(deductible - accumulated, 0)
+    deductible_applied = np.minimum(deductible_available, billed)
+    remaining_after_deductible = billed - deductible_applied
+
+    # 2. Apply Copay
+    copay = _cents(coverage.copay_amount or 0)
+    if copay > 0:
+        copay_applied = np.minimum(copay, remaining_after_deductible)
+    else:
+        copay_applied = zeros.copy()
+    remaining_after_copay = remaining_after_deductible - copay_applied
+
+    # 3. Apply Coinsurance (percentage kept in hundredths of a percent)
+    percentage = int((coverage.coverage_percentage or 0) * 100)
+    has_coinsurance = (remaining_after_copay > 0) & (percentage > 0)
+    insurance_share = (remaining_after_copay * percentage + 5000) // 10000
+    patient_share = remaining_after_copay - insurance_share
+
+    # 4. Apply Out-of-Pocket Max
+    over_max = accumulated + deductible_applied + patient_share > out_of_pocket_max
+    patient_share = np.where(
+        over_max,
+        np.maximum(out_of_pocket_max - accumulated - deductible_applied, 0),
+        patient_share
+    )
+    insurance_share = remaining_after_copay - patient_share
+
+    coinsurance_applied = np.where(has_coinsurance, insurance_share, 0)
+    patient_responsibility = copay_applied + np.where(
+        has_coinsurance, patient_share, remaining_after_copay
+    )
+
+    return {
+        'deductible_applied': deductible_applied,
+        'copay_applied': copay_applied,
+        'coinsurance_applied': coinsurance_applied,
+        'patient_responsibility': patient_responsibility,
+        'total_covered': deductible_applied + coinsurance_applied,
+        'remaining_deductible': np.maximum(
+            deductible - (accumulated + deductible_applied), 0
+        ),
+    }
+
+
+def _cents(amount):
+    return int(Decimal(str(amount)).quantize(CENT, ROUND_HALF_UP) * 100)
+
+
+def _require_numpy():
+    if np is None:
+        raise ImproperlyConfigured("NumPy is required for vectorized pricing")
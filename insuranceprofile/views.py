@@ -3,6 +3,7 @@ from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import action
+from django.conf import settings
 from django.db import transaction
 from .models import InsuranceProfile, Coverage, NetworkProvider
 from .serializers import (
@@ -38,24 +39,88 @@ class InsuranceProfileViewSet(viewsets.ModelViewSet):
 class CoverageCalculationView(APIView):
     """
     Calculate insurance coverage for a medical service
+    
+    With ?debug=true (DEBUG mode or staff users only) the response also
+    carries a "trace" entry with the query count, per-step timings and
+    cache hits of the calculation.
     """
     def post(self, request):
         serializer = CoverageCalculationSerializer(data=request.data)
         if serializer.is_valid():
+            debug = self._debug_requested(request)
             calculator = InsuranceCalculator(
                 member_id=serializer.validated_data['member_id'],
                 service_type=serializer.validated_data['service_type'],
                 provider_npi=serializer.validated_data['provider_npi'],
                 service_date=serializer.validated_data['service_date'],
-                billed_amount=serializer.validated_data['billed_amount']
+                billed_amount=serializer.validated_data['billed_amount'],
+                service_category=serializer.validated_data.get('service_category'),
+                trace=debug
             )
             
             try:
                 result = calculator.calculate()
+                if debug:
+                    result['trace'] = calculator.trace.as_dict()
                 return Response(result, status=status.HTTP_200_OK)
             except Exception as e:
                 return Response(
                     {'error': str(e)},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def _debug_requested(self, request):
+        if request.query_params.get('debug', '').lower() not in ('1', 'true'):
+            return False
+        return settings.DEBUG or request.user.is_staff
+
+class CoverageCalculationBatchView(APIView):
+    """
+    Calculate insurance coverage for many medical services in one request
+    
+    Accepts a list of claims shaped like CoverageCalculationView's input
+    and answers with one entry per claim, in input order:
+    - {"status": "ok", "result": {...}}
+    - {"status": "invalid", "errors": {...}} for claims failing validation
+    - {"status": "error", "error": "..."} for claims the calculator rejects
+    
+    Batch size is capped by settings.COVERAGE_BATCH_MAX_SIZE.
+    """
+    def post(self, request):
+        serializer = CoverageCalculationSerializer(
+            data=request.data,
+            many=True,
+            max_length=getattr(settings, 'COVERAGE_BATCH_MAX_SIZE', 100)
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        items = serializer.validated_data
+        claims = [item for item in items if isinstance(item, dict)]
+        results = iter(InsuranceCalculator.calculate_many(
+            [
+                {
+                    'member_id': claim['member_id'],
+                    'service_type': claim['service_type'],
+                    'provider_npi': claim['provider_npi'],
+                    'service_date': claim['service_date'],
+                    'billed_amount': claim['billed_amount'],
+                    'service_category': claim.get('service_category'),
+                }
+                for claim in claims
+            ],
+            return_exceptions=True
+        ))
+
+        response = []
+        for item in items:
+            if not isinstance(item, dict):
+                response.append({'status': 'invalid', 'errors': item.detail})
+                continue
+            result = next(results)
+            if isinstance(result, Exception):
+                response.append({'status': 'error', 'error': str(result)})
+            else:
+                response.append({'status': 'ok', 'result': result})
+        return Response(response, status=status.HTTP_200_OK)
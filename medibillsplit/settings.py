@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'accounts',
     'insuranceprofile',
+    'billing',
     'notifications'
 
 ]
@@ -80,6 +81,45 @@ SIMPLE_JWT = {
 }
 
 
+# Compiled per-policy coverage rules used by InsuranceCalculator
+COVERAGE_RULE_CACHE = {
+    'MAXSIZE': 2048,     # Policies kept per process, 0 disables the cache
+    'TTL': 60,           # Seconds before a process recompiles a table it holds
+    'BACKEND': None,     # Alias from CACHES to share tables between processes
+    'TIMEOUT': 3600,     # Seconds a table lives in the shared backend
+}
+
+# In-memory NPI → contract window index used for network status lookups
+NETWORK_CONTRACT_INDEX = {
+    'MAXSIZE': 100000,   # NPIs kept per process, 0 disables the index
+    'TTL': 300,          # Seconds before a loaded NPI is re-read
+}
+
+# Memoized InsuranceCalculator results, invalidated per member on changes
+COVERAGE_RESULT_CACHE = {
+    'MAXSIZE': 10000,    # Results kept per process, 0 disables the cache
+    'TTL': 300,          # Seconds a result stays valid (and may be stale without BACKEND)
+    'BACKEND': None,     # Alias from CACHES to share invalidation between processes
+}
+
+# Largest number of claims accepted by calculate-coverage/batch/
+COVERAGE_BATCH_MAX_SIZE = 100
+
+# Receives the trace of calculations run with trace=True (or ?debug=true)
+COVERAGE_TRACE_SINK = 'insuranceprofile.tracing.log_trace'
+
+# Rows per INSERT when creating a bill's line items
+BILL_LINE_ITEM_BATCH_SIZE = 500
+
+# Rows fetched per database round trip by the CSV / NDJSON exports
+BILLING_EXPORT_CHUNK_SIZE = 2000
+
+# Compiled PrimaryAccount split rules used by BillSplitter
+SPLIT_RULE_CACHE = {
+    'MAXSIZE': 10000,    # Accounts kept per process, 0 disables the cache
+}
+
+
 AUTH_USER_MODEL = 'accounts.User'
 
 ROOT_URLCONF = 'medibillsplit.urls'
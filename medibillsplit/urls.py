@@ -20,5 +20,7 @@ from django.urls import path,include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/accounts/',include('accounts.urls'))
+    path('api/accounts/',include('accounts.urls')),
+    path('api/insurance/',include('insuranceprofile.urls')),
+    path('api/billing/',include('billing.urls'))
 ]